@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of escape selection for util.action_to_str.
+
+Compares the greedy util.find_non_substr against util.shortest_non_substr
+on typical and adversarial inputs, then times action_to_str on a large
+ported comment.
+
+    $ python bench/escape_bench.py
+"""
+
+import itertools
+import random
+import sys
+import timeit
+
+sys.path.insert(0, ".")
+
+from tinman import prockey
+from tinman import util
+
+def every_letter_pair():
+    return " ".join("".join(p) for p in itertools.product(util.ESC_ALPHABET, repeat=2))
+
+def inputs():
+    rand = random.Random(1234)
+    yield "english text", " ".join(rand.choice(["the", "steem", "blockchain", "testnet", "witness", "vote"]) for i in range(200000))
+    yield "all letters", util.ESC_ALPHABET * 20000
+    yield "letter runs", "".join(c * 5000 for c in util.ESC_ALPHABET)
+    yield "one long run", util.ESC_ALPHABET + "a" * 1000000
+    yield "letter pairs", every_letter_pair() * 20
+    yield "random letters", "".join(rand.choice(util.ESC_ALPHABET) for i in range(1000000))
+
+def bench(name, fn, s, number=3):
+    elapsed = min(timeit.repeat(lambda : fn(s, util.ESC_ALPHABET), number=1, repeat=number))
+    result = fn(s, util.ESC_ALPHABET)
+    print("  %-22s %10.4f s  esc=%r" % (name, elapsed, result))
+
+def main():
+    for name, s in inputs():
+        print("%s (%d chars)" % (name, len(s)))
+        bench("find_non_substr", util.find_non_substr, s)
+        bench("shortest_non_substr", util.shortest_non_substr, s)
+
+    keydb = prockey.ProceduralKeyDatabase()
+    body = "".join(c * 5000 for c in util.ESC_ALPHABET)
+    action = ["submit_transaction", {"tx" : {"operations" : [{"type" : "comment_operation", "value" : {
+        "author" : "alice", "permlink" : "runs", "body" : body}}],
+        "wif_sigs" : [keydb.get_privkey("porter")]}}]
+    elapsed = min(timeit.repeat(lambda : util.action_to_str([action[0], dict(action[1])]), number=1, repeat=3))
+    print("action_to_str on %d char comment: %.4f s" % (len(body), elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the submit stage of `tinman mirror`: how long a busy source
+block takes to be broadcast to a testnet with the given HTTP round trip,
+by number of submitters, against the block interval it has to fit in.
+
+    $ python bench/mirror_bench.py [OPERATIONS [LATENCY_MS]]
+"""
+
+import sys
+import threading
+import time
+
+sys.path.insert(0, ".")
+
+from tinman import mirror
+from tinman import oprules
+from tinman import prockey
+from tinman import submit
+
+START = mirror.parse_time("2019-01-01T00:00:00")
+
+def timestamp(t):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t))
+
+class Api(object):
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+class Node(object):
+    """ A node of the given blocks, each broadcast taking latency seconds and producing a block """
+
+    def __init__(self, blocks=(), latency=0):
+        self.blocks = list(blocks)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.block_api = Api(get_block=self.get_block)
+        self.database_api = Api(get_dynamic_global_properties=self.get_dynamic_global_properties)
+        self.network_broadcast_api = Api(broadcast_transaction=self.broadcast_transaction)
+
+    def get_block(self, block_num):
+        with self.lock:
+            if 1 <= block_num <= len(self.blocks):
+                return {"block" : self.blocks[block_num - 1]}
+        return {}
+
+    def get_dynamic_global_properties(self, a=None):
+        with self.lock:
+            return {"head_block_number" : len(self.blocks), "head_block_id" : "00" * 20, "time" : timestamp(START)}
+
+    def broadcast_transaction(self, trx):
+        time.sleep(self.latency)
+        with self.lock:
+            self.blocks.append({"timestamp" : timestamp(START + 6), "transactions" : [trx]})
+
+class Signer(object):
+    def __init__(self):
+        self.count = 0
+
+    def sign_transaction(self, tx, wif):
+        self.count += 1
+        return {"result" : {"sig" : "%s-%d" % (wif, self.count)}}
+
+class Resolver(object):
+    def get_privkey(self, seed):
+        return "5" + seed
+
+def mirror_block(operations, latency, submitters):
+    vote = {"type" : "vote_operation", "value" : {"voter" : "alice", "author" : "bob", "permlink" : "p", "weight" : 100}}
+    block = {"timestamp" : timestamp(START + 3), "transactions" : [{"operations" : [vote]}] * operations}
+    conf = {"transaction_signer" : "tnman", "ported_operations" : [{"type" : "vote_operation", "roles" : ["posting"]}]}
+    rules = oprules.OperationRules(conf, prockey.ProceduralKeyDatabase())
+    target = Node(latency=latency)
+    m = mirror.Mirror(Node([block]), target, target, rules, Resolver(), Signer(), 1, 2, submitters=submitters)
+    start = time.time()
+    m.run(report_interval=3600)
+    return time.time() - start
+
+def main(argv):
+    operations = int(argv[1]) if len(argv) > 1 else 300
+    latency = float(argv[2]) / 1000 if len(argv) > 2 else 0.05
+    print("%d operations, %.0f ms per broadcast, %d s block interval" % (operations, latency * 1000, submit.STEEM_BLOCK_INTERVAL))
+    for submitters in (1, 4, 16, 32):
+        elapsed = mirror_block(operations, latency, submitters)
+        print("%3d submitters  %6.2f s  %s" % (submitters, elapsed, "ok" if elapsed < submit.STEEM_BLOCK_INTERVAL else "behind"))
+
+if __name__ == "__main__":
+    main(sys.argv)
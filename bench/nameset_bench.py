@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Memory and lookup benchmark of nameset.NameSet against a Python set, on
+synthetic account names at roughly mainnet scale.
+
+    $ python bench/nameset_bench.py [count]
+"""
+
+import random
+import string
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, ".")
+
+from tinman import nameset
+
+def account_names(count):
+    rand = random.Random(1234)
+    alphabet = string.ascii_lowercase + string.digits + "-."
+    names = set()
+    while len(names) < count:
+        names.add(rand.choice(string.ascii_lowercase) + "".join(rand.choice(alphabet) for i in range(rand.randrange(2, 15))))
+    return sorted(names)
+
+def measure(name, build, names, probes):
+    # Names are split out of one string while traced, so that (as in txgen)
+    # the set also pays for the name objects it keeps alive
+    blob = "\n".join(names)
+    tracemalloc.start()
+    result = build(blob.split("\n"))
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    elapsed = min(timeit.repeat(lambda : sum(1 for p in probes if p in result), number=1, repeat=3))
+    print("  %-8s %8.1f MB (peak %8.1f MB)  %8.0f ns/lookup" % (name, size / 2**20, peak / 2**20, 1e9 * elapsed / len(probes)))
+    return result
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 1300000
+    names = account_names(count)
+    rand = random.Random(5678)
+    probes = rand.sample(names, 50000) + ["x" + rand.choice(names) for i in range(50000)]
+    print("%d names, %d lookups" % (count, len(probes)))
+    measure("set", set, names, probes)
+    measure("NameSet", nameset.NameSet, names, probes)
+
+if __name__ == "__main__":
+    main(sys.argv)
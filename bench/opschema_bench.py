@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the schema-compiled operation transformers of prefixsub and
+amountsub against the generic walks they replace, on a gatling stream.
+
+    $ tinman gatling -f 25066272 -t 25067272 -o gatling.actions
+    $ python bench/opschema_bench.py gatling.actions
+
+Without an argument, the gatling capture in test/test-backfill.actions is
+used.
+"""
+
+import copy
+import json
+import sys
+import time
+
+sys.path.insert(0, ".")
+
+from tinman import amountsub
+from tinman import prefixsub
+
+def read_operations(path):
+    ops = []
+    with open(path, "r") as f:
+        for line in f:
+            act, act_args = json.loads(line)
+            if act == "submit_transaction" and act_args["tx"]:
+                ops.extend(act_args["tx"]["operations"])
+    return ops
+
+def measure(name, transform, ops, repeat):
+    best = None
+    for i in range(repeat):
+        batch = copy.deepcopy(ops)
+        start = time.perf_counter()
+        for op in batch:
+            transform(op)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print("  %-20s %8.2f us/op" % (name, 1e6 * best / len(ops)))
+    return best
+
+def main(argv):
+    path = argv[1] if len(argv) > 1 else "test/test-backfill.actions"
+    ops = read_operations(path)
+    # Small captures are repeated for stable timings
+    ops = ops * max(1, 20000 // max(1, len(ops)))
+    types = {}
+    for op in ops:
+        types[op["type"]] = types.get(op["type"], 0) + 1
+    print("%d operations from %s" % (len(ops), path))
+    for op_type, count in sorted(types.items(), key=lambda e : -e[1])[:10]:
+        print("  %-40s %d" % (op_type, count))
+
+    transform_operation = amountsub.operation_transformer(0.001)
+    print("amountsub")
+    generic = measure("generic", lambda op : amountsub.transform_amounts(op["value"], 0.001), ops, 5)
+    compiled = measure("schema", transform_operation, ops, 5)
+    print("  speedup %.1fx" % (generic / compiled))
+
+    print("prefixsub")
+    generic = measure("generic", lambda op : prefixsub.transform_prefix(op["value"]), ops, 5)
+    compiled = measure("schema", prefixsub.transform_operation, ops, 5)
+    print("  speedup %.1fx" % (generic / compiled))
+
+if __name__ == "__main__":
+    main(sys.argv)
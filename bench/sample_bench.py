@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Time and peak memory of `tinman sample` against the implementation it
+replaced (four passes over a file, and `json.load` of stdin), on a synthetic
+snapshot built from the accounts of test/test-snapshot.json.
+
+Each run is a child process, its peak RSS is read from `os.wait4`.
+
+    $ python bench/sample_bench.py [count]
+"""
+
+import copy
+import heapq
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, ".")
+
+from tinman import __version__
+from tinman import sample
+
+SAMPLE_SIZE = 2000
+
+def legacy_file(path, outfile):
+    """ The file path of sample.main before the single pass """
+    try:
+        import ijson.backends.yajl2_cffi as ijson
+    except ImportError:
+        import ijson
+
+    infile = open(path, "rb")
+    account_balances = {}
+    snapshot = {
+      "metadata": {"snapshot:semver": __version__},
+      "dynamic_global_properties": {"total_vesting_fund_steem": {}},
+      "accounts": [],
+      "witnesses": []
+    }
+    for prefix, event, value in ijson.parse(infile):
+        if prefix == "metadata.snapshot:origin_api":
+            snapshot["metadata"]["snapshot:origin_api"] = value
+            break
+    fund = snapshot["dynamic_global_properties"]["total_vesting_fund_steem"]
+    infile.seek(0)
+    for prefix, event, value in ijson.parse(infile):
+        if prefix == "dynamic_global_properties.total_vesting_fund_steem.amount":
+            fund["amount"] = value
+        elif prefix == "dynamic_global_properties.total_vesting_fund_steem.precision":
+            fund["precision"] = value
+        elif prefix == "dynamic_global_properties.total_vesting_fund_steem.nai":
+            fund["nai"] = value
+        if len(fund.keys()) > 2:
+            break
+    infile.seek(0)
+    for a in ijson.items(infile, "accounts.item"):
+        account_balances[a["name"]] = a["balance"]["amount"]
+    top_accounts = heapq.nlargest(SAMPLE_SIZE, account_balances, key=lambda a : int(account_balances[a]))
+    infile.seek(0)
+    for a in ijson.items(infile, "accounts.item"):
+        if len(snapshot["accounts"]) >= len(top_accounts):
+            break
+        if a["name"] in top_accounts:
+            snapshot["accounts"].append(a)
+    infile.close()
+    json.dump(snapshot, outfile, separators=(",", ":"))
+
+def legacy_stdin(outfile):
+    """ The stdin path of sample.main before the single pass """
+    snapshot = json.load(sys.stdin)
+    snapshot["witnesses"] = []
+    snapshot["accounts"] = heapq.nlargest(SAMPLE_SIZE, snapshot["accounts"], key=lambda a : int(a["balance"]["amount"]))
+    json.dump(snapshot, outfile, separators=(",", ":"))
+
+def child(mode, path):
+    with open(os.devnull, "w") as outfile:
+        sys.stderr = outfile
+        if mode == "legacy file":
+            legacy_file(path, outfile)
+        elif mode == "legacy stdin":
+            legacy_stdin(outfile)
+        else:
+            sys.stdout = outfile
+            sample.main(["sample", "-i", path if mode == "file" else "-", "-o", "-", "--size", str(SAMPLE_SIZE)])
+
+def write_snapshot(path, count):
+    with open("test/test-snapshot.json", "r") as f:
+        template = json.load(f)
+    rand = random.Random(1234)
+    with open(path, "w") as f:
+        f.write('{"metadata":%s,"dynamic_global_properties":%s,"accounts":[' % (
+            json.dumps(template["metadata"]), json.dumps(template["dynamic_global_properties"])))
+        for i in range(count):
+            a = copy.deepcopy(template["accounts"][i % len(template["accounts"])])
+            a["name"] = "account-%08d" % i
+            a["balance"]["amount"] = str(rand.randrange(10**9))
+            if i > 0:
+                f.write(",")
+            f.write(json.dumps(a, separators=(",", ":")))
+        f.write('],"witnesses":%s}' % json.dumps(template["witnesses"]))
+
+def measure(mode, path):
+    with open(path, "rb") as stdin:
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, __file__, "--child", mode, path], stdin=stdin)
+        pid, status, rusage = os.wait4(proc.pid, 0)
+        elapsed = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    if proc.returncode != 0:
+        raise RuntimeError("%s failed with status %d" % (mode, proc.returncode))
+    # ru_maxrss is in kilobytes on Linux
+    print("  %-14s %8.2f s  peak RSS %8.1f MB" % (mode, elapsed, rusage.ru_maxrss / 1024))
+
+def main(argv):
+    if len(argv) > 3 and argv[1] == "--child":
+        child(argv[2], argv[3])
+        return
+    count = int(argv[1]) if len(argv) > 1 else 200000
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "snapshot.json")
+        write_snapshot(path, count)
+        print("%d accounts, %.1f MB, sample of %d" % (count, os.path.getsize(path) / 2**20, SAMPLE_SIZE))
+        for mode in ("legacy file", "file", "legacy stdin", "stdin"):
+            measure(mode, path)
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of Serializer (and Deserializer) on large ported
+transactions: many small operations, operations heavy in fixed-width
+fields, and a comment larger than the initial buffer.
+
+    $ python bench/serializer_bench.py
+"""
+
+import sys
+import timeit
+
+sys.path.insert(0, ".")
+
+from simple_steem_client.serializer import Serializer, Deserializer
+
+KEY = "STM6LLegbAgLAy28EHrffBVuANFWcFgmqRMW13wBmTExqFE9SCkg4"
+
+def authority(n):
+    return {"weight_threshold" : 1, "account_auths" : [["acct%d" % i, 1] for i in range(n)], "key_auths" : [[KEY, 1]] * n}
+
+def transaction(operations):
+    return {
+        "ref_block_num" : 1234,
+        "ref_block_prefix" : 567890,
+        "expiration" : "2019-01-01T12:34:56",
+        "operations" : operations,
+        "extensions" : [],
+        "signatures" : ["1f" + "ef" * 64],
+    }
+
+def transactions():
+    vote = ["vote", {"voter" : "alice", "author" : "bob", "permlink" : "a-permlink", "weight" : 10000}]
+    yield "1000 votes", transaction([vote] * 1000)
+    order = ["limit_order_create", {"owner" : "alice", "orderid" : 4000000000, "amount_to_sell" : "1000.000 STEEM",
+        "min_to_receive" : "5.000 SBD", "fill_or_kill" : False, "expiration" : "2019-01-02T00:00:00"}]
+    yield "1000 limit orders", transaction([order] * 1000)
+    create = ["account_create", {"fee" : "3.000 STEEM", "creator" : "alice", "new_account_name" : "bob",
+        "owner" : authority(10), "active" : authority(10), "posting" : authority(10), "memo_key" : KEY, "json_metadata" : "{}"}]
+    yield "100 account creates", transaction([create] * 100)
+    comment = ["comment", {"parent_author" : "", "parent_permlink" : "steem", "author" : "alice", "permlink" : "long",
+        "title" : "Long", "body" : "x" * 1000000, "json_metadata" : "{}"}]
+    yield "1 MB comment", transaction([comment])
+
+def serialize(trx):
+    s = Serializer()
+    s.signed_transaction(trx)
+    return s.flush()
+
+def main():
+    for name, trx in transactions():
+        try:
+            data = serialize(trx)
+        except Exception as e:
+            print("%-20s serialize failed: %r" % (name, e))
+            continue
+        serialize_time = min(timeit.repeat(lambda : serialize(trx), number=5, repeat=3)) / 5
+        deserialize_time = min(timeit.repeat(lambda : Deserializer(data).signed_transaction(), number=5, repeat=3)) / 5
+        print("%-20s %8d bytes  serialize %8.2f ms  deserialize %8.2f ms" % (name, len(data), serialize_time * 1000, deserialize_time * 1000))
+
+if __name__ == "__main__":
+    main()
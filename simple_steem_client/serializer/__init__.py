@@ -1 +1,2 @@
-from simple_steem_client.serializer.serializer import Serializer, twos
+from simple_steem_client.serializer.serializer import Serializer, twos, transaction_id, block_id, NAI_SYMBOLS, TESTNET_NAI_SYMBOLS
+from simple_steem_client.serializer.deserializer import Deserializer
@@ -0,0 +1,242 @@
+from simple_steem_client.serializer.operation_variants import operation_variants
+from simple_steem_client.serializer.serializer import ArgumentError, Serializer, public_key_to_str
+from simple_steem_client.serializer.serializer import ASSET_NAIS, OPERATION_SUFFIX, hash_block_id, hash_transaction_id
+
+import struct
+import time
+import types
+
+_UINT8 = struct.Struct("<B")
+_UINT16 = struct.Struct("<H")
+_UINT32 = struct.Struct("<I")
+_UINT64 = struct.Struct("<Q")
+_INT8 = struct.Struct("<b")
+_INT16 = struct.Struct("<h")
+_INT32 = struct.Struct("<i")
+_INT64 = struct.Struct("<q")
+_BINARY64 = struct.Struct("<d")
+_ASSET = struct.Struct("<qB7s")
+
+class Deserializer:
+  """Converts sequences of bytes in the STEEM binary format back into dicts.
+
+  The Deserializer mirrors `Serializer`: it has a method of the same name for every type, and
+  composite types (such as `authority`, `price` or operations) are decoded by running their
+  `Serializer` definitions against it.  Values are decoded in the form the Serializer takes, or
+  with `appbase`, in the form of the appbase API (`{"type": "vote_operation", "value": ...}`
+  operations, `{"amount", "precision", "nai"}` assets, and blocks with their `block_id` and
+  `transaction_ids`), which the Serializer also takes.
+
+  Bytes are read from a `memoryview` of data, without copying it: ids are hashed straight from it.
+
+  Example usage:
+
+  >>> s = Serializer()
+  >>> s.asset("1.000 STEEM")
+  16
+  >>> Deserializer(s.flush()).asset()
+  '1.000 STEEM'
+  """
+  def __init__(self, data, pos=0, appbase=False, key_prefix="STM"):
+    self._data = memoryview(data)
+    self._pos = pos
+    self.appbase = appbase
+    self.key_prefix = key_prefix
+
+  @property
+  def pos(self):
+    return self._pos
+
+  def _get_deserializer_fn(self, deserializer_def):
+    assert(type(deserializer_def) in (types.FunctionType, str, tuple))
+    if type(deserializer_def) is types.FunctionType:
+      return lambda: deserializer_def(self, None)
+    elif type(deserializer_def) is str:
+      fn = getattr(self, deserializer_def, None)
+      if fn is not None:
+        return fn
+      # Composite types are decoded by their serializer definition
+      serializer_fn = getattr(Serializer, deserializer_def)
+      return lambda value=None: serializer_fn(self, value)
+    elif type(deserializer_def) is tuple:
+      return lambda: self.fields(None, deserializer_def)
+
+  def _read(self, size):
+    start = self._pos
+    end = start + size
+    if end > len(self._data):
+      raise ArgumentError("Unexpected end of data at %d" % (start,))
+    self._pos = end
+    return self._data[start:end]
+
+  def _unpack(self, fmt):
+    value = fmt.unpack_from(self._data, self._pos)[0]
+    self._pos += fmt.size
+    return value
+
+  def uint8(self, value=None):
+    return self._unpack(_UINT8)
+
+  def uint16(self, value=None):
+    return self._unpack(_UINT16)
+
+  def uint32(self, value=None):
+    return self._unpack(_UINT32)
+
+  def uint64(self, value=None):
+    return self._unpack(_UINT64)
+
+  def int8(self, value=None):
+    return self._unpack(_INT8)
+
+  def int16(self, value=None):
+    return self._unpack(_INT16)
+
+  def int32(self, value=None):
+    return self._unpack(_INT32)
+
+  def int64(self, value=None):
+    return self._unpack(_INT64)
+
+  def binary64(self, value=None):
+    return self._unpack(_BINARY64)
+
+  def uvarint(self, value=None):
+    result = 0
+    shift = 0
+    while True:
+      b = self._data[self._pos]
+      self._pos += 1
+      result |= (b & 0x7f) << shift
+      if b < 0x80:
+        return result
+      shift += 7
+
+  def svarint(self, value=None):
+    v = self.uvarint()
+    return (v >> 1) ^ -(v & 1)
+
+  def boolean(self, value=None):
+    return self.uint8() != 0
+
+  def raw_bytes(self, value=None):
+    raise ArgumentError("raw_bytes has no length, it cannot be deserialized")
+
+  def hex_string(self, value=None):
+    raise ArgumentError("hex_string has no length, it cannot be deserialized")
+
+  def string(self, value=None):
+    return str(self._read(self.uvarint()), "utf8")
+
+  def ripemd160(self, value=None):
+    return self._read(20).hex()
+
+  def sha256(self, value=None):
+    return self._read(32).hex()
+
+  def signature(self, value=None):
+    return self._read(65).hex()
+
+  def binary(self, value=None):
+    return self._read(self.uvarint()).hex()
+
+  def version(self, value=None):
+    v = self.uint32()
+    return "%d.%d.%d" % (v >> 24, (v >> 16) & 0xff, v & 0xffff)
+
+  def time_point_sec(self, value=None):
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(self.uint32()))
+
+  def array(self, value, itemtype):
+    item_deserializer = self._get_deserializer_fn(itemtype)
+    return [item_deserializer() for i in range(self.uvarint())]
+
+  def map(self, value, keytype, valuetype):
+    """Deserializes an FC map as a list of [key, value] pairs, as the API returns them."""
+    key_deserializer = self._get_deserializer_fn(keytype)
+    value_deserializer = self._get_deserializer_fn(valuetype)
+    result = []
+    for i in range(self.uvarint()):
+      k = key_deserializer()
+      result.append([k, value_deserializer()])
+    return result
+
+  def optional(self, value, underlyingtype):
+    if self.uint8() == 0:
+      return None
+    return self._get_deserializer_fn(underlyingtype)()
+
+  def field(self, value, name, fieldtype):
+    return self._get_deserializer_fn(fieldtype)()
+
+  def fields(self, value, pairs):
+    result = {}
+    for (name, fieldtype) in pairs:
+      result[name] = self._get_deserializer_fn(fieldtype)()
+    return result
+
+  def public_key(self, value=None):
+    return public_key_to_str(bytes(self._read(33)), self.key_prefix)
+
+  def static_variant(self, value, variants):
+    i = self.uvarint()
+    if i >= len(variants):
+      raise ArgumentError("Unknown type for static variant (selector: %d)" % (i,))
+    variant_name, variant_def = variants[i]
+    variant_value = self._get_deserializer_fn(variant_def)()
+    if self.appbase:
+      return {"type" : variant_name, "value" : variant_value}
+    return [variant_name, variant_value]
+
+  def extensions(self, value, variants):
+    return self.array(value, lambda s, v: s.static_variant(v, variants))
+
+  def void(self, value=None):
+    return None
+
+  def asset(self, value=None):
+    amount, prec, symbol = _ASSET.unpack_from(self._data, self._pos)
+    self._pos += _ASSET.size
+    symbol = symbol.rstrip(b"\0").decode("utf8")
+    if self.appbase:
+      if symbol not in ASSET_NAIS:
+        raise ArgumentError("Unknown asset symbol: %s" % (symbol,))
+      return {"amount" : str(amount), "precision" : prec, "nai" : ASSET_NAIS[symbol]}
+    if prec == 0:
+      return "%d %s" % (amount, symbol)
+    sign = "-" if amount < 0 else ""
+    whole, frac = divmod(abs(amount), 10**prec)
+    return "%s%d.%0*d %s" % (sign, whole, prec, frac, symbol)
+
+  def operation(self, value=None):
+    op = self.static_variant(value, operation_variants)
+    if self.appbase:
+      op["type"] += OPERATION_SUFFIX
+    return op
+
+  def transaction(self, value=None):
+    return self.fields(value, Serializer._transaction_fields)
+
+  def signed_transaction(self, value=None):
+    return self.fields(value, Serializer._signed_transaction_fields)
+
+  def _signed_transaction_with_id(self, value=None):
+    start = self._pos
+    trx = self.transaction(value)
+    trx_id = hash_transaction_id(self._data[start:self._pos])
+    trx["signatures"] = self.array(value, "signature")
+    return trx, trx_id
+
+  def signed_block(self, value=None):
+    start = self._pos
+    block = self._get_deserializer_fn("signed_block_header")()
+    if not self.appbase:
+      block["transactions"] = self.array(value, "signed_transaction")
+      return block
+    block_num = int(block["previous"][0:8], 16) + 1
+    block_id = hash_block_id(self._data[start:self._pos], block_num)
+    pairs = self.array(value, lambda s, v: s._signed_transaction_with_id(v))
+    block["transactions"] = [trx for trx, trx_id in pairs]
+    block["block_id"] = block_id
+    block["transaction_ids"] = [trx_id for trx, trx_id in pairs]
+    return block
@@ -3,6 +3,11 @@ def comment_options_extensions(s, v):
     ( "beneficiaries", lambda s2, v2: s2.array(v2, "beneficiary") ),
   ))
 
+def future_extensions(s, v):
+  return s.extensions(v, (
+    ( "void_t", "void" ),
+  ))
+
 operation_variants = (
   (
     "vote",
@@ -90,9 +95,19 @@ operation_variants = (
     (("account", "string"), ("witness", "string"), ("approve", "boolean"))
   ),
   ("account_witness_proxy", (("account", "string"), ("proxy", "string"))),
+  (
+    "pow",
+    (
+      ("worker_account", "string"),
+      ("block_id", "ripemd160"),
+      ("nonce", "uint64"),
+      ("work", "pow"),
+      ("props", "chain_properties")
+    )
+  ),
   (
     "custom",
-    (("required_auths", lambda s, v: s.array(v, "string")), ("id", "uint32"), ("data", "raw_bytes"))
+    (("required_auths", lambda s, v: s.array(v, "string")), ("id", "uint16"), ("data", "binary"))
   ),
   (
     "report_over_production",
@@ -118,7 +133,7 @@ operation_variants = (
       ("author", "string"),
       ("permlink", "string"),
       ("max_accepted_payout", "asset"),
-      ("percent_steem_dollars", "uint32"),
+      ("percent_steem_dollars", "uint16"),
       ("allow_votes", "boolean"),
       ("allow_curation_rewards", "boolean"),
       ("extensions", comment_options_extensions)
@@ -129,7 +144,7 @@ operation_variants = (
     (
       ("from_account", "string"),
       ("to_account", "string"),
-      ("percent", "uint32"),
+      ("percent", "uint16"),
       ("auto_vest", "boolean")
     )
   ),
@@ -145,21 +160,33 @@ operation_variants = (
     )
   ),
   (
-    "challenge_authority",
+    "claim_account",
     (
-      ("challenger", "string"),
-      ("challenged", "string"),
-      ("require_owner", "boolean")
+      ("creator", "string"),
+      ("fee", "asset"),
+      ("extensions", future_extensions)
+    )
+  ),
+  (
+    "create_claimed_account",
+    (
+      ("creator", "string"),
+      ("new_account_name", "string"),
+      ("owner", "authority"),
+      ("active", "authority"),
+      ("posting", "authority"),
+      ("memo_key", "public_key"),
+      ("json_metadata", "string"),
+      ("extensions", future_extensions)
     )
   ),
-  ("prove_authority", (("challenged", "string"), ("require_owner", "boolean"))),
   (
     "request_account_recovery",
     (
       ("recovery_account", "string"),
       ("account_to_recover", "string"),
       ("new_owner_authority", "authority"),
-      ("extensions", lambda s, v: s.array(v, "void"))
+      ("extensions", future_extensions)
     )
   ),
   (
@@ -168,7 +195,7 @@ operation_variants = (
       ("account_to_recover", "string"),
       ("new_owner_authority", "authority"),
       ("recent_owner_authority", "authority"),
-      ("extensions", lambda s, v: s.array(v, "void"))
+      ("extensions", future_extensions)
     )
   ),
   (
@@ -176,7 +203,7 @@ operation_variants = (
     (
       ("account_to_recover", "string"),
       ("new_recovery_account", "string"),
-      ("extensions", lambda s, v: s.array(v, "void"))
+      ("extensions", future_extensions)
     )
   ),
   (
@@ -184,14 +211,14 @@ operation_variants = (
     (
       ("from", "string"),
       ("to", "string"),
-      ("agent", "string"),
-      ("escrow_id", "uint32"),
       ("sbd_amount", "asset"),
       ("steem_amount", "asset"),
+      ("escrow_id", "uint32"),
+      ("agent", "string"),
       ("fee", "asset"),
+      ("json_meta", "string"),
       ("ratification_deadline", "time_point_sec"),
-      ("escrow_expiration", "time_point_sec"),
-      ("json_metadata", "string")
+      ("escrow_expiration", "time_point_sec")
     )
   ),
   (
@@ -217,6 +244,14 @@ operation_variants = (
       ("steem_amount", "asset")
     )
   ),
+  (
+    "pow2",
+    (
+      ("work", "pow2_work"),
+      ("new_owner_key", lambda s, v: s.optional(v, "public_key")),
+      ("props", "chain_properties")
+    )
+  ),
   (
     "escrow_approve",
     (
@@ -247,14 +282,14 @@ operation_variants = (
     (("from", "string"), ("request_id", "uint32"))
   ),
   (
-    "custom_bytes",
+    "custom_binary",
     (
       ("required_owner_auths", lambda s, v: s.array(v, "string")),
       ("required_active_auths", lambda s, v: s.array(v, "string")),
       ("required_posting_auths", lambda s, v: s.array(v, "string")),
       ("required_auths", lambda s, v: s.array(v, "authority")),
       ("id", "string"),
-      ("data", "raw_bytes")
+      ("data", "binary")
     )
   ),
   ("decline_voting_rights", (("account", "string"), ("decline", "boolean"))),
@@ -303,7 +338,58 @@ operation_variants = (
       ("posting", "authority"),
       ("memo_key", "public_key"),
       ("json_metadata", "string"),
-      ("extensions", lambda s, v: s.array(v, "void"))
+      ("extensions", future_extensions)
+    )
+  ),
+  (
+    "witness_set_properties",
+    (
+      ("owner", "string"),
+      ("props", lambda s, v: s.map(v, "string", "binary")),
+      ("extensions", future_extensions)
+    )
+  ),
+  (
+    "account_update2",
+    (
+      ("account", "string"),
+      ("owner", lambda s, v: s.optional(v, "authority")),
+      ("active", lambda s, v: s.optional(v, "authority")),
+      ("posting", lambda s, v: s.optional(v, "authority")),
+      ("memo_key", lambda s, v: s.optional(v, "public_key")),
+      ("json_metadata", "string"),
+      ("posting_json_metadata", "string"),
+      ("extensions", future_extensions)
+    )
+  ),
+  (
+    "create_proposal",
+    (
+      ("creator", "string"),
+      ("receiver", "string"),
+      ("start_date", "time_point_sec"),
+      ("end_date", "time_point_sec"),
+      ("daily_pay", "asset"),
+      ("subject", "string"),
+      ("permlink", "string"),
+      ("extensions", future_extensions)
+    )
+  ),
+  (
+    "update_proposal_votes",
+    (
+      ("voter", "string"),
+      ("proposal_ids", lambda s, v: s.array(v, "int64")),
+      ("approve", "boolean"),
+      ("extensions", future_extensions)
+    )
+  ),
+  (
+    "remove_proposal",
+    (
+      ("proposal_owner", "string"),
+      ("proposal_ids", lambda s, v: s.array(v, "int64")),
+      ("extensions", future_extensions)
     )
   )
 )
@@ -1,11 +1,13 @@
-from simple_steem_client.serializer.operation_variants import operation_variants
+from simple_steem_client.serializer.operation_variants import operation_variants, future_extensions
 
-import math
+import functools
+import hashlib
 import time
 import datetime
 import calendar
 import types
 import re
+import struct
 
 NIF_FLOAT_64 = 0xfff0000000000000
 INF_FLOAT_64 = 0x7ff0000000000000
@@ -18,6 +20,49 @@ UINT64_MAX   = 0xFFFFFFFFFFFFFFFF
 
 BINARY64_RANGE = 2**53
 
+_UINT8 = struct.Struct("<B")
+_UINT16 = struct.Struct("<H")
+_UINT32 = struct.Struct("<I")
+_UINT64 = struct.Struct("<Q")
+_INT8 = struct.Struct("<b")
+_INT16 = struct.Struct("<h")
+_INT32 = struct.Struct("<i")
+_INT64 = struct.Struct("<q")
+_BINARY64 = struct.Struct("<d")
+_ASSET = struct.Struct("<QB7s")
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+_operation_selectors = {name : (i, variant_def) for i, (name, variant_def) in enumerate(operation_variants)}
+
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+PUBLIC_KEY_PREFIXES = ("STM", "TST")
+
+ASSET_NAIS = {
+  "STEEM" : "@@000000021",
+  "SBD" : "@@000000013",
+  "VESTS" : "@@000000037",
+  "TESTS" : "@@000000021",
+  "TBD" : "@@000000013",
+}
+
+# Testnet symbols share the NAIs of mainnet, so the symbols an appbase asset
+# is serialized with depend on the chain
+NAI_SYMBOLS = {
+  "@@000000021" : "STEEM",
+  "@@000000013" : "SBD",
+  "@@000000037" : "VESTS",
+}
+
+TESTNET_NAI_SYMBOLS = {
+  "@@000000021" : "TESTS",
+  "@@000000013" : "TBD",
+  "@@000000037" : "VESTS",
+}
+
+OPERATION_SUFFIX = "_operation"
+
 class ArgumentError(Exception):
     pass
 
@@ -45,6 +90,72 @@ def twos(v, width):
   elif width == 8:
     return UINT64_MAX-abs_v+1
 
+def base58_encode(data):
+  """Encodes bytes in base58, as public keys are."""
+  n = int.from_bytes(data, "big")
+  result = []
+  while n > 0:
+    n, r = divmod(n, 58)
+    result.append(BASE58_ALPHABET[r])
+  pad = len(data) - len(data.lstrip(b"\0"))
+  return BASE58_ALPHABET[0] * pad + "".join(reversed(result))
+
+def base58_decode(s):
+  """Decodes a base58 string into bytes."""
+  n = 0
+  for c in s:
+    n = n * 58 + BASE58_ALPHABET.index(c)
+  pad = len(s) - len(s.lstrip(BASE58_ALPHABET[0]))
+  return b"\0" * pad + n.to_bytes((n.bit_length() + 7) // 8, "big")
+
+def public_key_checksum(key):
+  """The 4-byte checksum of public key strings, the start of the key's RIPEMD-160."""
+  return hashlib.new("ripemd160", bytes(key)).digest()[:4]
+
+# Blocks and ported transactions use few keys, many times, so conversions are cached
+@functools.lru_cache(maxsize=4096)
+def public_key_to_str(key, prefix="STM"):
+  """Converts a 33-byte compressed public key to its string form, such as STM...."""
+  return prefix + base58_encode(bytes(key) + public_key_checksum(key))
+
+@functools.lru_cache(maxsize=4096)
+def public_key_from_str(value):
+  """Converts the string form of a public key to its 33 bytes, checking its checksum."""
+  for prefix in PUBLIC_KEY_PREFIXES:
+    if value.startswith(prefix):
+      data = base58_decode(value[len(prefix):])
+      key, checksum = data[:-4], data[-4:]
+      if len(key) != 33 or public_key_checksum(key) != checksum:
+        raise ArgumentError("Invalid public key: %s" % (value,))
+      return key
+  raise ArgumentError("Unknown public key prefix: %s" % (value,))
+
+def hash_transaction_id(data):
+  """Returns the id of a transaction from its serialization (without signatures)."""
+  return hashlib.sha256(data).digest()[:20].hex()
+
+def hash_block_id(data, block_num):
+  """Returns the id of a block from the serialization of its signed header.
+
+  The first 4 bytes of the id are the block number (big-endian), the rest a SHA-224 of the header.
+  """
+  return (struct.pack(">I", block_num) + hashlib.sha224(data).digest()[4:20]).hex()
+
+def transaction_id(value, nai_symbols=NAI_SYMBOLS):
+  """Returns the id of a transaction, as the API lists it in `transaction_ids`.
+
+  Appbase assets are serialized with the symbols of `nai_symbols` (`TESTNET_NAI_SYMBOLS` on a testnet).
+  """
+  s = Serializer(nai_symbols=nai_symbols)
+  s.transaction(value)
+  return hash_transaction_id(s.flush())
+
+def block_id(value, nai_symbols=NAI_SYMBOLS):
+  """Returns the id of a block (the `previous` of the next one)."""
+  s = Serializer(nai_symbols=nai_symbols)
+  s.signed_block_header(value)
+  return hash_block_id(s.flush(), int(value["previous"][0:8], 16) + 1)
+
 class Serializer:
   """Converts dicts and objects into sequences of bytes as required by the STEEM blockchain.
 
@@ -56,10 +167,28 @@ class Serializer:
     - Variable-width integers follow Google's base-128 "varint" serialization.
     - Variable-length sequences such as text strings, arrays, and maps are prefixed with a varint
       indicating their length.
+
+  The output buffer starts at `size` bytes and doubles whenever it would overflow.  Appbase
+  assets are serialized with the symbols of `nai_symbols`, `TESTNET_NAI_SYMBOLS` for a testnet.
   """
-  def __init__(self, size=65536):
+  def __init__(self, size=65536, nai_symbols=NAI_SYMBOLS):
     self._data = bytearray(size)
+    self.nai_symbols = nai_symbols
     self._pos = 0
+    self._serializer_fns = {}
+
+  def _reserve(self, size):
+    end = self._pos + size
+    if end > len(self._data):
+      self._data.extend(bytes(max(end, 2 * len(self._data)) - len(self._data)))
+
+  def _pack(self, fmt, value):
+    pos = self._pos
+    if pos + fmt.size > len(self._data):
+      self._reserve(fmt.size)
+    fmt.pack_into(self._data, pos, value)
+    self._pos = pos + fmt.size
+    return fmt.size
 
   def _get_prop(self, value, prop):
     if type(value) is dict:
@@ -69,68 +198,58 @@ class Serializer:
 
   def _get_serializer_fn(self, serializer_def):
     assert(type(serializer_def) in (types.FunctionType, str, tuple))
-    if type(serializer_def) is types.FunctionType:
+    if type(serializer_def) is str:
+      # Only names are cached: lambdas (and tuples holding them) are often created anew for each value
+      fn = self._serializer_fns.get(serializer_def)
+      if fn is None:
+        fn = self._serializer_fns[serializer_def] = getattr(self, serializer_def)
+      return fn
+    elif type(serializer_def) is types.FunctionType:
       return lambda v: serializer_def(self, v)
-    elif type(serializer_def) is str:
-      return getattr(self, serializer_def)
     elif type(serializer_def) is tuple:
       return lambda v: self.fields(v, serializer_def)
 
   def _write_byte(self, value):
-    self._data[self._pos] = value
-    self._pos += 1
-    return 1
+    return self._pack(_UINT8, value)
 
   def uint8(self, value):
-    return self._write_byte(value)
+    return self._pack(_UINT8, value)
 
   def uint16(self, value):
-    return self.uint8(value & 0xff) + self.uint8((value >> 8) & 0xff) 
+    return self._pack(_UINT16, value & UINT16_MAX)
 
   def uint32(self, value):
-    return self.uint16(value & 0xffff) + self.uint16((value >> 16) & 0xffff) 
+    return self._pack(_UINT32, value & UINT32_MAX)
 
   def uint64(self, value):
-    return self.uint32(value & 0xffffffff) + self.uint32((value >> 32) & 0xffffffff)
+    return self._pack(_UINT64, value & UINT64_MAX)
 
   def int8(self, value):
-    return self.uint8(twos(value, 1))
+    return self._pack(_INT8, value)
 
   def int16(self, value):
-    return self.uint16(twos(value, 2))
+    return self._pack(_INT16, value)
 
   def int32(self, value):
-    return self.uint32(twos(value, 4))
+    return self._pack(_INT32, value)
 
   def int64(self, value):
-    return self.uint64(twos(value, 8)) 
-
-  def binary64(self, value): 
-    if math.isinf(value) and value < 0:
-      encoded_value = NIF_FLOAT_64
-    elif math.isinf(value):
-      encoded_value = INF_FLOAT_64
-    elif math.isnan(value):
-      encoded_value = NAN_FLOAT_64
-    else:
-      # frontmost bit: sign, next 11 bits: exponent, next 52 bits: mantissa
-      (mantissa_frac, exponent) = math.frexp(value)
-      mantissa = int(abs(mantissa_frac) * BINARY64_RANGE)
-      sign = 1 if value < 0 else 0
-      # convert exponent offset to IEEE-754 standard
-      exponent += 1022
-      encoded_value = (sign << 63) | ((exponent & 0x7ff) << 52) | (mantissa & 0xfffffffffffff)
-    return self.uint64(encoded_value)
+    return self._pack(_INT64, value)
+
+  def binary64(self, value):
+    # IEEE-754, as struct packs it (including infinities and NaN)
+    return self._pack(_BINARY64, value)
 
   def uvarint(self, value):
     assert(value >= 0)
-    count = 0
+    if value < 0x80:
+      return self._pack(_UINT8, value)
+    encoded = bytearray()
     while value > 127:
-      self._write_byte(0x80 | (value & 0x7f))
+      encoded.append(0x80 | (value & 0x7f))
       value = value >> 7
-      count += 1 
-    self._write_byte(value & 0x7f)
-    return count + 1
+    encoded.append(value)
+    return self.raw_bytes(encoded)
 
   def svarint(self, value):
     return self.uvarint((value << 1) ^ (value >> 63))
@@ -142,6 +261,7 @@ class Serializer:
 
   def raw_bytes(self, value):
     l = len(value)
+    self._reserve(l)
     self._data[self._pos:self._pos+l] = value
     self._pos += l
     return l
@@ -150,12 +270,42 @@ class Serializer:
     return self.raw_bytes(bytes(value, "utf8"))
 
   def string(self, value):
-    return self.uvarint(len(value)) + self.raw_string(value)
+    # The length is that of the utf8 encoding, not of the characters
+    data = bytes(value, "utf8")
+    return self.uvarint(len(data)) + self.raw_bytes(data)
 
   def hex_string(self, value):
     return self.raw_bytes(bytes.fromhex(value))
 
+  def ripemd160(self, value):
+    return self.hex_string(value)
+
+  def sha256(self, value):
+    return self.hex_string(value)
+
+  def signature(self, value):
+    return self.hex_string(value)
+
+  def binary(self, value):
+    """Serializes a variable-length byte sequence, given as a hex string."""
+    data = bytes.fromhex(value)
+    return self.uvarint(len(data)) + self.raw_bytes(data)
+
+  def version(self, value):
+    """Serializes a version string such as 0.19.2."""
+    major, minor, patch = (int(part) for part in value.split("."))
+    return self.uint32((major << 24) | (minor << 16) | patch)
+
+  _re_time_point_sec = re.compile(r"^([0-9]{4})-([0-9]{2})-([0-9]{2})T([0-9]{2}):([0-9]{2}):([0-9]{2})$")
+
   def time_point_sec(self, value):
+    if type(value) is str:
+      # Parses the usual form directly, as strptime is slow
+      m = self._re_time_point_sec.match(value)
+      if m is not None:
+        # datetime checks the ranges of the parts
+        t = datetime.datetime(*(int(part) for part in m.groups())) - _EPOCH
+        return self.uint32(t.days * 86400 + t.seconds)
     if type(value) is time.struct_time:
       return self.uint32(calendar.timegm(value))
     elif type(value) is datetime.datetime:
@@ -205,7 +355,15 @@ class Serializer:
     return self._get_serializer_fn(fieldtype)(field_val)
 
   def fields(self, value, pairs):
-    return sum([ self.field(value, name, fieldtype) for (name, fieldtype) in pairs ])
+    get_serializer_fn = self._get_serializer_fn
+    if type(value) is dict:
+      get_prop = value.get
+    else:
+      get_prop = lambda prop: getattr(value, prop, None)
+    bytes_written = 0
+    for (name, fieldtype) in pairs:
+      bytes_written += get_serializer_fn(fieldtype)(get_prop(name))
+    return bytes_written
 
   def public_key(self, value):
     """Serializes a public key.
@@ -213,14 +371,20 @@ class Serializer:
     value must be either a bytes object containing the 65 bytes of a Bitcoin-type uncompressed public key,
     including the 1-byte header, or else it must implement the `format` method, which must accept a
     keyword argument `compressed` and should return the same. (This method signature is supplied by the
-    PublicKey object in the coincurve library.)
+    PublicKey object in the coincurve library.)  It may also be a key in string form, such as STM...,
+    which is serialized as the 33 bytes of the compressed key, as on the blockchain.
     """
-    if type(value) is bytes:
+    if type(value) is str:
+      return self.raw_bytes(public_key_from_str(value))
+    elif type(value) is bytes:
       return self.raw_bytes(value[1:])
     elif hasattr(value, "format"):
       return self.raw_bytes(value.format(compressed=False)[1:])
 
   def static_variant(self, value, variants):
+    if type(value) is dict:
+      # appbase form
+      value = (value["type"], value["value"])
     assert(type(value) in (list, tuple))
     assert(len(value) == 2)
     assert(type(variants) in (list, tuple))
@@ -249,22 +413,29 @@ class Serializer:
   def asset(self, value):
     # new asset JSON form as list, see https://github.com/steemit/steem/issues/1937
 
-    assert(type(value) == str)
-
-    m = self._re_amount.match(value)
-    assert(m is not None)
+    if type(value) is dict:
+      # appbase form, {"amount": "1000", "precision": 3, "nai": "@@000000021"}
+      symbol = self.nai_symbols.get(value["nai"])
+      prec = value["precision"]
+      amount = int(value["amount"])
+    else:
+      assert(type(value) == str)
 
-    lamount, ramount, symbol = m.groups()
+      m = self._re_amount.match(value)
+      assert(m is not None)
 
-    prec = len(ramount)
-    assert( (symbol, prec) in self._allowed_symbol_prec )
+      lamount, ramount, symbol = m.groups()
 
-    encoded_symbol = bytearray(7)
-    encoded_symbol[0:len(symbol)] = symbol.encode("utf8")
+      prec = len(ramount)
+      amount = int(ramount) + (10**prec) * int(lamount)
 
-    amount = int(ramount) + (10**prec) * int(lamount)
+    assert( (symbol, prec) in self._allowed_symbol_prec )
 
-    return self.uint64( amount ) + self.uint8( prec ) + self.raw_bytes( encoded_symbol )
+    pos = self._pos
+    self._reserve(_ASSET.size)
+    _ASSET.pack_into(self._data, pos, amount & UINT64_MAX, prec, symbol.encode("utf8"))
+    self._pos = pos + _ASSET.size
+    return _ASSET.size
 
   def authority(self, value):
     return self.fields(value, (
@@ -285,16 +456,32 @@ class Serializer:
       ( "quote", "asset" )
     ))
 
+  def hardfork_version_vote(self, value):
+    return self.fields(value, (
+      ( "hf_version", "version" ),
+      ( "hf_time", "time_point_sec" )
+    ))
+
+  def block_header_extensions(self, value):
+    return self.extensions(value, (
+      ( "void_t", "void" ),
+      ( "version", "version" ),
+      ( "hardfork_version_vote", "hardfork_version_vote" )
+    ))
+
   def signed_block_header(self, value):
     return self.fields(value, (
-      ( "previous", "raw_bytes" ),
+      ( "previous", "ripemd160" ),
       ( "timestamp", "time_point_sec" ),
       ( "witness", "string" ),
-      ( "transaction_merkle_root", "raw_bytes" ),
-      ( "extensions", lambda s, v: s.array(v, "void") ),
-      ( "witness_signature", "raw_bytes" )
+      ( "transaction_merkle_root", "ripemd160" ),
+      ( "extensions", "block_header_extensions" ),
+      ( "witness_signature", "signature" )
     ))
 
+  def signed_block(self, value):
+    return self.signed_block_header(value) + self.field(value, "transactions", lambda s, v: s.array(v, "signed_transaction"))
+
   def chain_properties(self, value):
     return self.fields(value, (
       ( "account_creation_fee", "asset" ),
@@ -302,19 +489,74 @@ class Serializer:
       ( "sbd_interest_rate", "uint16" )
     ))
 
+  def pow(self, value):
+    return self.fields(value, (
+      ( "worker", "public_key" ),
+      ( "input", "sha256" ),
+      ( "signature", "signature" ),
+      ( "work", "sha256" )
+    ))
+
+  def pow2_input(self, value):
+    return self.fields(value, (
+      ( "worker_account", "string" ),
+      ( "prev_block", "ripemd160" ),
+      ( "nonce", "uint64" )
+    ))
+
+  def pow2(self, value):
+    return self.fields(value, (
+      ( "input", "pow2_input" ),
+      ( "pow_summary", "uint32" )
+    ))
+
+  def equihash_proof(self, value):
+    return self.fields(value, (
+      ( "n", "uint32" ),
+      ( "k", "uint32" ),
+      ( "seed", "sha256" ),
+      ( "inputs", lambda s, v: s.array(v, "uint32") )
+    ))
+
+  def equihash_pow(self, value):
+    return self.fields(value, (
+      ( "input", "pow2_input" ),
+      ( "proof", "equihash_proof" ),
+      ( "prev_block", "ripemd160" ),
+      ( "pow_summary", "uint32" )
+    ))
+
+  def pow2_work(self, value):
+    return self.static_variant(value, (
+      ( "pow2", "pow2" ),
+      ( "equihash_pow", "equihash_pow" )
+    ))
+
   def operation(self, value):
-    return self.static_variant(value, operation_variants)
+    if type(value) is dict and value["type"].endswith(OPERATION_SUFFIX):
+      # appbase form, {"type": "vote_operation", "value": ...}
+      value = (value["type"][0:-len(OPERATION_SUFFIX)], value["value"])
+    elif type(value) is dict:
+      value = (value["type"], value["value"])
+    # Looked up rather than scanned, as in static_variant
+    selector = _operation_selectors.get(value[0])
+    if selector is None:
+      raise ArgumentError("Unknown type for static variant (selector: %s)" % (value[0],))
+    i, variant_def = selector
+    if type(variant_def) is tuple:
+      return self.uvarint(i) + self.fields(value[1], variant_def)
+    return self.uvarint(i) + self._get_serializer_fn(variant_def)(value[1])
 
   _transaction_fields = (
       ( "ref_block_num", "uint16" ),
       ( "ref_block_prefix", "uint32" ),
       ( "expiration", "time_point_sec" ),
       ( "operations", lambda s, v: s.array(v, "operation") ),
-      ( "extensions", lambda s, v: s.array(v, "string") )
+      ( "extensions", future_extensions )
     )
 
   _signed_transaction_fields = _transaction_fields + (
-      ( "signatures", lambda s, v: s.array(v, "hex_string") ),
+      ( "signatures", lambda s, v: s.array(v, "signature") ),
     )
 
   def transaction(self, value):
@@ -332,7 +574,8 @@ class Serializer:
     Returns:
       bytes: The output of the serializer.
     """
-    result = bytes(self._data[0:self._pos])
+    with memoryview(self._data) as data:
+      result = bytes(data[0:self._pos])
     self._pos = 0
     return result
   
@@ -343,6 +586,7 @@ class Serializer:
       ba (bytearray): The buffer to write the serializer's output into.
       offset (int): The offset at which to start writing into `ba`. 
     """
-    ba[offset:self._pos] = self._data[out_offset:self._pos]
+    with memoryview(self._data) as data:
+      ba[offset:offset+self._pos] = data[0:self._pos]
     self._pos = 0
 
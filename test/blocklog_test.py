@@ -0,0 +1,95 @@
+import unittest
+import os
+import struct
+import tempfile
+
+from simple_steem_client.serializer import Serializer, transaction_id, block_id
+from tinman import blocklog
+from tinman import util
+
+def legacy_block(block_num):
+    """ A block as the Serializer takes it, with legacy operations and assets """
+    return {
+        "previous" : "%08x" % (block_num - 1) + "00" * 16,
+        "timestamp" : "2016-03-24T16:%02d:%02d" % (block_num * 3 // 60, block_num * 3 % 60),
+        "witness" : "initminer",
+        "transaction_merkle_root" : "00" * 20,
+        "extensions" : [["version", "0.19.2"]] if block_num == 2 else [],
+        "witness_signature" : "1f" + "00" * 64,
+        "transactions" : [{
+            "ref_block_num" : block_num,
+            "ref_block_prefix" : 12345,
+            "expiration" : "2016-03-24T17:00:00",
+            "operations" : [
+                ["vote", {"voter" : "alice", "author" : "bob", "permlink" : "p%d" % block_num, "weight" : 10000}],
+                ["transfer", {"from" : "alice", "to" : "bob", "amount" : "1.234 STEEM", "memo" : "m"}],
+            ],
+            "extensions" : [],
+            "signatures" : ["20" + "11" * 64],
+        }] * (block_num % 3),
+    }
+
+def write_block_log(path, blocks, append=False):
+    mode = "ab" if append else "wb"
+    with open(path, mode) as log, open(path + ".index", mode) as index:
+        s = Serializer()
+        for block in blocks:
+            position = log.tell()
+            s.signed_block(block)
+            log.write(s.flush())
+            log.write(struct.pack("<Q", position))
+            index.write(struct.pack("<Q", position))
+
+class BlocklogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "block_log")
+        write_block_log(self.path, [legacy_block(n) for n in range(1, 6)])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read_block(self):
+        reader = blocklog.BlockLogReader(self.path)
+        self.assertEqual(reader.head_block_number, 5)
+        for n in range(1, 6):
+            self.assertEqual(reader.read_block(n, appbase=False), legacy_block(n))
+        block = reader.get_block(block_num=2)["block"]
+        self.assertEqual(block["extensions"], [{"type" : "version", "value" : "0.19.2"}])
+        op = block["transactions"][0]["operations"][1]
+        self.assertEqual(op, {"type" : "transfer_operation", "value" : {"from" : "alice", "to" : "bob",
+            "amount" : {"amount" : "1234", "precision" : 3, "nai" : "@@000000021"}, "memo" : "m"}})
+        self.assertEqual(block["block_id"], block_id(legacy_block(2)))
+        self.assertEqual(block["transaction_ids"], [transaction_id(legacy_block(2)["transactions"][0])] * 2)
+        self.assertEqual(reader.get_block(block_num=6), {})
+        self.assertEqual(reader.get_dynamic_global_properties()["head_block_number"], 5)
+        reader.close()
+
+    def test_iterate_operations_from(self):
+        reader = blocklog.BlockLogReader(self.path)
+        ops = list(util.iterate_operations_from(reader, True, 1, 6, {"vote_operation"}))
+        self.assertEqual([op["value"]["permlink"] for op in ops], ["p1", "p2", "p2", "p4", "p5", "p5"])
+        reader.close()
+
+    def test_refresh(self):
+        reader = blocklog.BlockLogReader(self.path)
+        write_block_log(self.path, [legacy_block(6)], append=True)
+        self.assertEqual(reader.read_block(6, appbase=False), legacy_block(6))
+        self.assertEqual(reader.head_block_number, 6)
+        reader.close()
+
+    def test_corrupt(self):
+        with open(self.path, "r+b") as log:
+            # Shortens the witness of block 1, so that it ends before its position
+            log.seek(20 + 4)
+            log.write(b"\x08")
+        reader = blocklog.BlockLogReader(self.path)
+        self.assertRaises(RuntimeError, reader.read_block, 1)
+        reader.close()
+
+    def test_missing_index(self):
+        os.remove(self.path + ".index")
+        self.assertRaises(RuntimeError, blocklog.BlockLogReader, self.path)
+
+if __name__ == "__main__":
+    unittest.main()
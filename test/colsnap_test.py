@@ -0,0 +1,51 @@
+import unittest
+import json
+import tempfile
+
+from tinman import colsnap
+from tinman import txgen
+
+class ColsnapTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name + "/test-snapshot.cols"
+        with open("test-snapshot.json", "rb") as f:
+            colsnap.convert(f, self.path)
+        with open("test-snapshot.json", "r") as f:
+            self.snapshot = json.load(f)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_is_columnar(self):
+        self.assertTrue(colsnap.is_columnar(self.path))
+        self.assertFalse(colsnap.is_columnar("test-snapshot.json"))
+
+    def test_header(self):
+        columnar = colsnap.ColumnarSnapshot(self.path)
+        self.assertEqual(len(columnar), len(self.snapshot["accounts"]))
+        self.assertEqual(columnar.metadata, self.snapshot["metadata"])
+        self.assertEqual(columnar.dgpo, self.snapshot["dynamic_global_properties"])
+        self.assertEqual(columnar.witnesses, self.snapshot["witnesses"])
+
+    def test_accounts(self):
+        columnar = colsnap.ColumnarSnapshot(self.path)
+        for a, b in zip(columnar.iterate_accounts(), self.snapshot["accounts"]):
+            for key in a.keys():
+                self.assertEqual(a[key], b[key])
+
+    def test_total(self):
+        columnar = colsnap.ColumnarSnapshot(self.path)
+        for column in colsnap.AMOUNT_COLUMNS:
+            expected = sum(int(a[column]["amount"]) for a in self.snapshot["accounts"])
+            self.assertEqual(columnar.total(column), expected)
+
+    def test_txgen_account_stats(self):
+        conf = {"snapshot_file" : self.path, "accounts" : {"steemit" : {"name" : "steemit"}}}
+        columnar_stats = txgen.get_account_stats(conf)
+        conf["snapshot_file"] = "test-snapshot.json"
+        json_stats = txgen.get_account_stats(conf)
+        
+        for key in ["account_names", "total_vests", "total_steem", "header"]:
+            self.assertEqual(columnar_stats[key], json_stats[key])
+        self.assertEqual(list(txgen.iterate_accounts(columnar_stats)), list(txgen.iterate_accounts(json_stats)))
@@ -0,0 +1,163 @@
+import unittest
+import json
+import os
+import tempfile
+
+from simple_steem_client.client import SteemRPCException
+
+from tinman import colsnap
+from tinman import gatling
+from tinman import jsonlsnap
+from tinman import oprules
+from tinman import prefixsub
+from tinman import prockey
+from tinman import submit
+from tinman import util
+
+def blocks(count, ops_per_tx=(1,)):
+    for block_num in range(count):
+        yield block_num, [{"operations" : [{"type" : "vote_operation"}] * n} for n in ops_per_tx]
+
+class Api(object):
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+class FlakyNode(object):
+    """ An appbase node of count blocks, failing once on each block of fail_at """
+
+    def __init__(self, count, fail_at=()):
+        self.count = count
+        self.fail_at = set(fail_at)
+        self.requested = []
+        self.block_api = Api(get_block=self.get_block)
+        self.database_api = Api(get_dynamic_global_properties=self.get_dynamic_global_properties)
+
+    def get_block(self, block_num):
+        self.requested.append(block_num)
+        if block_num in self.fail_at:
+            self.fail_at.remove(block_num)
+            raise SteemRPCException({"error" : {"message" : "Internal Error"}})
+        if 1 <= block_num <= self.count:
+            return {"block" : {"transactions" : [{"operations" : [{"type" : "vote_operation", "value" : {"voter" : "v%d" % block_num}}]}]}}
+        return {}
+
+    def get_dynamic_global_properties(self, x=None):
+        return {"head_block_number" : self.count}
+
+class GatlingTest(unittest.TestCase):
+    def source_blocks(self, node, min_block, max_block):
+        with open("../gatling.conf.example", "r") as f:
+            conf = json.load(f)
+        rules = oprules.OperationRules(conf, prockey.ProceduralKeyDatabase())
+        connect_source = gatling.connect_source
+        gatling.connect_source = lambda conf : (node, True)
+        try:
+            return [block_num for block_num, txs in gatling.retry_blocks(conf, rules, min_block, max_block, -1, -1)]
+        finally:
+            gatling.connect_source = connect_source
+
+    def test_retry_blocks(self):
+        node = FlakyNode(6, fail_at=(3, 5))
+        self.assertEqual(self.source_blocks(node, 1, 7), [1, 2, 3, 4, 5, 6])
+        # Resumed from the failed block, not from the start
+        self.assertEqual(node.requested, [1, 2, 3, 3, 4, 5, 5, 6])
+
+    def test_missing_block(self):
+        self.assertRaises(RuntimeError, self.source_blocks, FlakyNode(4), 1, 7)
+
+    def waits(self, actions):
+        return [a[1]["count"] for a in actions if a[0] == "wait_blocks"]
+
+    def test_pace_unpaced(self):
+        actions = list(gatling.ReplayScheduler().pace(blocks(3, (1, 2))))
+        self.assertEqual([a[0] for a in actions], ["submit_transaction"] * 6)
+
+    def test_pace_speed(self):
+        actions = list(gatling.ReplayScheduler(blocks_per_block=5).pace(blocks(20)))
+        self.assertEqual(self.waits(actions), [1, 1, 1, 1])
+        self.assertEqual(actions[5], ["wait_blocks", {"count" : 1}])
+        
+        # Slower than mainnet, each source block takes several testnet blocks
+        actions = list(gatling.ReplayScheduler(blocks_per_block=0.5).pace(blocks(3)))
+        self.assertEqual(self.waits(actions), [2, 2, 2])
+        
+        actions = list(gatling.ReplayScheduler(blocks_per_block=0.3).pace(blocks(10)))
+        self.assertEqual(sum(self.waits(actions)), 33)
+
+    def test_pace_ops(self):
+        actions = list(gatling.ReplayScheduler(ops_per_block=3).pace(blocks(4, (1, 2))))
+        self.assertEqual(self.waits(actions), [1, 1, 1, 1])
+        actions = list(gatling.ReplayScheduler(ops_per_block=2).pace(blocks(1, (5,))))
+        self.assertEqual(self.waits(actions), [2])
+
+    def test_loop_blocks(self):
+        self.assertEqual(list(gatling.loop_blocks(blocks(3), 2)), list(blocks(3)) * 2)
+        self.assertEqual(list(gatling.loop_blocks(blocks(3), 1)), list(blocks(3)))
+        forever = gatling.loop_blocks(blocks(2), 0)
+        self.assertEqual([next(forever)[0] for i in range(7)], [0, 1, 0, 1, 0, 1, 0])
+
+    def test_markers(self):
+        actions = list(gatling.ReplayScheduler(blocks_per_block=2, markers=True).pace(blocks(2)))
+        self.assertEqual([a[0] for a in actions], ["submit_transaction", "source_block", "submit_transaction", "wait_blocks", "source_block"])
+        self.assertEqual(actions[-1], ["source_block", {"block_num" : 1}])
+        self.assertEqual(list(prefixsub.transform_actions(actions[:2])), actions[:2])
+
+    def test_deduplicate_blocks(self):
+        def run(first, last, torn=False):
+            actions = list(gatling.ReplayScheduler(markers=True).pace((n, [{"operations" : [n]}]) for n in range(first, last)))
+            # A run killed in the middle of a block
+            return actions[:-1] if torn else actions
+        
+        # Resuming from a state file saved a few blocks behind the output
+        actions = run(0, 4, torn=True) + run(2, 6)
+        result = [a[1]["tx"]["operations"][0] for a in submit.deduplicate_blocks(actions) if a[0] == "submit_transaction"]
+        self.assertEqual(result, [0, 1, 2, 3, 4, 5])
+        
+        unmarked = [["wait_blocks", {"count" : 1}]] * 3
+        self.assertEqual(list(submit.deduplicate_blocks(unmarked)), unmarked)
+        
+        # Restarting submit too, from the last block it saved
+        actions = [["metadata", {}]] + run(2, 6)
+        result = list(submit.deduplicate_blocks(actions, 3))
+        self.assertEqual(result[0], ["metadata", {}])
+        self.assertEqual([a[1]["tx"]["operations"][0] for a in result if a[0] == "submit_transaction"], [4, 5])
+        self.assertEqual(result[-1], ["source_block", {"block_num" : 5}])
+
+    def test_cursor(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "gatling.state")
+            self.assertIsNone(util.load_cursor(path))
+            util.save_cursor(path, 25066272)
+            util.save_cursor(path, 25066282)
+            self.assertEqual(util.load_cursor(path), 25066282)
+            self.assertEqual(os.listdir(tmpdir), ["gatling.state"])
+
+    def test_repack_block_dropped(self):
+        with open("../gatling.conf.example", "r") as f:
+            conf = json.load(f)
+        vote = {"type" : "vote_operation", "value" : {"voter" : "alice"}}
+        pow_op = {"type" : "pow_operation", "value" : {}}
+        transactions = [{"operations" : [vote, pow_op, vote]}, {"operations" : [pow_op]}]
+        dropped = []
+        for preserve_transactions in (False, True):
+            rules = oprules.OperationRules(conf, prockey.ProceduralKeyDatabase())
+            gatling.repack_block(rules, transactions, rules.types(), preserve_transactions)
+            dropped.append(rules.dropped)
+        self.assertEqual(dropped[0], dropped[1])
+        self.assertEqual(dropped[0][("pow_operation", "type")], 2)
+
+    def test_snapshot_accounts(self):
+        with open("test-snapshot.json", "r") as f:
+            names = [a["name"] for a in json.load(f)["accounts"]]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open("test-snapshot.json", "rb") as f:
+                colsnap.convert(f, tmpdir + "/test-snapshot.cols")
+            with open("test-snapshot.json", "rb") as f, open(tmpdir + "/test-snapshot.jsonl", "w") as outfile:
+                jsonlsnap.convert(f, outfile)
+            for path in ("test-snapshot.json", tmpdir + "/test-snapshot.cols", tmpdir + "/test-snapshot.jsonl"):
+                accounts = gatling.snapshot_accounts(path)
+                self.assertEqual(sorted(accounts.names), sorted(names))
+                self.assertNotIn("nobody", accounts)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import json
+import tempfile
+
+from tinman import colsnap
+from tinman import jsonlsnap
+from tinman import txgen
+
+class JsonlsnapTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = self.tmpdir.name + "/test-snapshot.jsonl"
+        with open("test-snapshot.json", "rb") as infile, open(self.path, "w") as outfile:
+            jsonlsnap.convert(infile, outfile)
+        with open("test-snapshot.json", "r") as f:
+            self.snapshot = json.load(f)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_is_jsonl(self):
+        self.assertTrue(jsonlsnap.is_jsonl(self.path))
+        self.assertFalse(jsonlsnap.is_jsonl("test-snapshot.json"))
+        self.assertFalse(jsonlsnap.is_jsonl(self.tmpdir.name))
+
+    def test_read(self):
+        header = jsonlsnap.read_header(self.path)
+        self.assertEqual(header["metadata"]["snapshot:format"], "jsonl")
+        self.assertEqual(header["metadata"]["snapshot:semver"], self.snapshot["metadata"]["snapshot:semver"])
+        self.assertEqual(header["dynamic_global_properties"], self.snapshot["dynamic_global_properties"])
+        self.assertEqual(list(jsonlsnap.iterate_accounts(self.path)), self.snapshot["accounts"])
+        self.assertEqual(jsonlsnap.read_witnesses(self.path), self.snapshot["witnesses"])
+        
+        start, stop = jsonlsnap.accounts_range(self.path)
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            self.assertEqual(f.read(stop - start).count(b"\n"), len(self.snapshot["accounts"]))
+
+    def test_account_stats(self):
+        conf = {"accounts" : {"steemit" : {"name" : "steemit"}}}
+        json_stats = txgen.get_account_stats(dict(conf, snapshot_file="test-snapshot.json"))
+        jsonl_stats = txgen.get_account_stats(dict(conf, snapshot_file=self.path))
+        
+        self.assertEqual(jsonl_stats["account_names"], json_stats["account_names"])
+        self.assertEqual(jsonl_stats["total_vests"], json_stats["total_vests"])
+        self.assertEqual(jsonl_stats["total_steem"], json_stats["total_steem"])
+        self.assertEqual(jsonl_stats["header"], json_stats["header"])
+        self.assertEqual([a["name"] for a in txgen.iterate_accounts(jsonl_stats)],
+            [a["name"] for a in txgen.iterate_accounts(json_stats)])
+
+    def test_convert_columnar(self):
+        path = self.tmpdir.name + "/test-snapshot.cols"
+        colsnap.convert_jsonl(self.path, path)
+        columnar = colsnap.ColumnarSnapshot(path)
+        self.assertEqual(list(columnar.names()), [a["name"] for a in self.snapshot["accounts"]])
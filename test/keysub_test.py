@@ -23,3 +23,32 @@ class KeysubTest(unittest.TestCase):
             # Note, resolver needs to be mocked to properly test.
             true_exe = shutil.which("true")
             self.assertRaises(json.decoder.JSONDecodeError, keysub.compute_keypair_from_seed, '1234', 'secret', true_exe)
+
+class FakeResolver(object):
+    secret = ""
+
+    def get_pubkey(self, seed):
+        return "TST" + self.secret + seed
+
+    def get_privkey(self, seed):
+        return "5" + self.secret + seed
+
+class KeysubDecodedTest(unittest.TestCase):
+    def test_substitute_esc(self):
+        object = {"key_auths" : [["Bpublickey:owner-aliceB", 1]], "memo" : "a b", "wif" : "xBprivatekey:active-aliceBy"}
+        result = keysub.substitute_esc(object, "B", FakeResolver())
+        self.assertEqual(result, {"key_auths" : [["TSTowner-alice", 1]], "memo" : "a b", "wif" : "x5active-alicey"})
+
+    def test_substitute_actions(self):
+        # The decoded substitution agrees with the one on serialized actions
+        resolver = FakeResolver()
+        actions = [
+            ["set_secret", {"secret" : "xyz-"}],
+            ["metadata", {"txgen:semver" : "0.2"}],
+            ["submit_transaction", {"esc" : "j", "tx" : {"wif_sigs" : ["jprivatekey:active-tnmanj"], "key" : "jpublickey:owner-bobj"}}],
+        ]
+        result = list(keysub.substitute_actions(actions, resolver))
+        self.assertEqual(resolver.secret, "xyz-")
+        self.assertEqual(result[0], actions[1])
+        line = json.dumps(["submit_transaction", {"tx" : actions[2][1]["tx"]}], separators=(",", ":"), sort_keys=True)
+        self.assertEqual(result[1], json.loads(keysub.process_esc(line, "j", resolver)))
@@ -0,0 +1,153 @@
+import unittest
+import io
+import json
+import threading
+import time
+
+from tinman import mirror
+from tinman import oprules
+from tinman import prockey
+
+START = mirror.parse_time("2019-01-01T00:00:00")
+
+def timestamp(t):
+    return mirror.time.strftime("%Y-%m-%dT%H:%M:%S", mirror.time.gmtime(t))
+
+class Api(object):
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+class FakeNode(object):
+    """ An appbase node, producing a block (lag seconds after the source block) for each broadcast """
+
+    def __init__(self, blocks=(), lag=10, fail=None, latency=0):
+        self.blocks = list(blocks)
+        self.lag = lag
+        self.fail = fail
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.block_api = Api(get_block=self.get_block)
+        self.database_api = Api(get_dynamic_global_properties=self.get_dynamic_global_properties)
+        self.network_broadcast_api = Api(broadcast_transaction=self.broadcast_transaction)
+
+    def get_block(self, block_num):
+        with self.lock:
+            if 1 <= block_num <= len(self.blocks):
+                return {"block" : self.blocks[block_num - 1]}
+        return {}
+
+    def get_dynamic_global_properties(self, a=None):
+        with self.lock:
+            return {"head_block_number" : len(self.blocks), "head_block_id" : "00" * 20, "time" : timestamp(START)}
+
+    def broadcast_transaction(self, trx):
+        if self.fail is not None and self.fail(trx):
+            raise RuntimeError("rejected")
+        if self.latency:
+            with self.lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            # The HTTP round trip
+            time.sleep(self.latency)
+            with self.lock:
+                self.in_flight -= 1
+        source_time = START + 3 * int(trx["operations"][0]["value"]["permlink"])
+        with self.lock:
+            self.blocks.append({"timestamp" : timestamp(source_time + self.lag), "transactions" : [trx]})
+
+class FakeSigner(object):
+    def __init__(self):
+        self.count = 0
+
+    def sign_transaction(self, tx, wif):
+        self.count += 1
+        return {"result" : {"sig" : "%s-%d" % (wif, self.count)}}
+
+class FakeResolver(object):
+    def get_privkey(self, seed):
+        return "5" + seed
+
+def vote(permlink):
+    return {"type" : "vote_operation", "value" : {"voter" : "alice", "author" : "bob", "permlink" : permlink, "weight" : 100}}
+
+def source_blocks(count):
+    transfer = {"type" : "transfer_operation", "value" : {"from" : "alice", "to" : "bob"}}
+    return [{"timestamp" : timestamp(START + 3 * i), "transactions" : [{"operations" : [vote(str(i)), transfer]}]}
+        for i in range(1, count + 1)]
+
+class MirrorTest(unittest.TestCase):
+    def rules(self):
+        conf = {"transaction_signer" : "tnman", "ported_operations" : [{"type" : "vote_operation", "roles" : ["posting"]}]}
+        return oprules.OperationRules(conf, prockey.ProceduralKeyDatabase())
+
+    def test_follow_blocks(self):
+        node = FakeNode(source_blocks(2))
+        clock = [START + 6]
+        sleeps = []
+
+        def sleep(t):
+            sleeps.append(t)
+            clock[0] += t
+            if len(sleeps) == 2:
+                node.blocks.extend(source_blocks(3)[2:])
+
+        blocks = mirror.follow_blocks(node, True, 1, 4, sleep=sleep, now=lambda : clock[0])
+        self.assertEqual([(n, t) for n, t, trxs in blocks], [(1, START + 3), (2, START + 6), (3, START + 9)])
+        # Sleeps until the next block is due, then polls
+        self.assertEqual(sleeps, [3, mirror.POLL_INTERVAL])
+
+        stopped = mirror.follow_blocks(node, True, 1, stop=lambda : True)
+        self.assertEqual(list(stopped), [])
+
+    def test_lag_tracker(self):
+        clock = [0]
+        tracker = mirror.LagTracker(expiration=60, now=lambda : clock[0])
+        tracker.sent({"signatures" : ["a"]}, 1, 100)
+        tracker.sent({"signatures" : ["b"]}, 2, 103)
+        tracker.sent({"signatures" : []}, 2, 103)
+        self.assertEqual(tracker.included(110, [{"signatures" : ["b"]}, {"signatures" : ["c"]}]), [(2, 7)])
+        self.assertEqual(tracker.waiting(), 1)
+        clock[0] = 61
+        self.assertEqual(tracker.included(200, []), [])
+        self.assertEqual((tracker.waiting(), tracker.expired, tracker.count, tracker.max), (0, 1, 1, 7))
+
+    def test_mirror(self):
+        source = FakeNode(source_blocks(5))
+        target = FakeNode(lag=10)
+        m = mirror.Mirror(source, target, target, self.rules(), FakeResolver(), FakeSigner(), 1, 5, queue_size=1)
+        m.run()
+        trxs = [b["transactions"][0] for b in target.blocks]
+        self.assertEqual([trx["operations"] for trx in trxs], [[vote(str(i))] for i in range(1, 5)])
+        self.assertEqual(trxs[0]["signatures"], ["5posting-tnman-1"])
+        self.assertEqual((m.submitted, m.tracker.count, m.tracker.max, m.tracker.waiting()), (4, 4, 10, 0))
+
+    def test_mirror_busy_block(self):
+        # A busy block, too many transactions to broadcast one after the other within a block interval
+        block = {"timestamp" : timestamp(START + 3), "transactions" : [{"operations" : [vote("1")]}] * 200}
+        source = FakeNode([block])
+        target = FakeNode(latency=0.05)
+        m = mirror.Mirror(source, target, target, self.rules(), FakeResolver(), FakeSigner(), 1, 2, submitters=16)
+        start = time.time()
+        m.run()
+        self.assertLess(time.time() - start, mirror.submit.STEEM_BLOCK_INTERVAL)
+        self.assertEqual((m.submitted, m.tracker.count), (200, 200))
+        self.assertEqual(target.max_in_flight, 16)
+
+    def test_mirror_failures(self):
+        source = FakeNode(source_blocks(3))
+        target = FakeNode(fail=lambda trx : trx["operations"][0]["value"]["permlink"] == "2")
+        fail_file = io.StringIO()
+        m = mirror.Mirror(source, target, target, self.rules(), FakeResolver(), FakeSigner(), 1, 4, fail_file=fail_file)
+        m.run()
+        self.assertEqual((m.submitted, m.failed, m.tracker.count), (2, 1, 2))
+        cmd, args, error = json.loads(fail_file.getvalue())
+        self.assertEqual(error, "rejected")
+
+        m = mirror.Mirror(source, FakeNode(fail=lambda trx : True), target, self.rules(), FakeResolver(), FakeSigner(), 1, 4,
+            fail_file=io.StringIO(), die_on_fail=True)
+        self.assertRaises(RuntimeError, m.run)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+import json
+
+from tinman import nameset
+
+class NameSetTest(unittest.TestCase):
+    def test_membership(self):
+        names = ["steemit", "alice", "bob", "alice", "ümlaut"]
+        s = nameset.NameSet(names)
+        self.assertEqual(len(s), 4)
+        self.assertEqual(s, set(names))
+        self.assertEqual(list(s), sorted(set(names), key=lambda n : n.encode("utf-8")))
+        for name in names:
+            self.assertIn(name, s)
+        for name in ["", "a", "alicf", "zzz", "steemit2", None, 1]:
+            self.assertNotIn(name, s)
+
+    def test_empty(self):
+        s = nameset.NameSet()
+        self.assertEqual(len(s), 0)
+        self.assertNotIn("alice", s)
+
+    def test_snapshot_names(self):
+        with open("test-snapshot.json", "r") as f:
+            snapshot = json.load(f)
+        names = [a["name"] for a in snapshot["accounts"]]
+        s = nameset.NameSet(names)
+        self.assertEqual(s, set(names))
+        self.assertEqual(s.nbytes(), sum(len(n) + 8 for n in names) + 8)
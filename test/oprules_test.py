@@ -0,0 +1,103 @@
+import unittest
+import json
+
+from tinman import nameset
+from tinman import oprules
+from tinman import prockey
+
+class OprulesTest(unittest.TestCase):
+    def setUp(self):
+        with open("../gatling.conf.example", "r") as f:
+            self.conf = json.load(f)
+        self.keydb = prockey.ProceduralKeyDatabase()
+
+    def role_of(self, rules, op):
+        tx = rules(op)
+        return None if tx is None else tx["wif_sigs"][0].name
+
+    def transfer(self, sender, amount="1000"):
+        return {"type" : "transfer_operation", "value" : {"from" : sender, "to" : "bob",
+            "amount" : {"amount" : amount, "precision" : 3, "nai" : "@@000000021"}, "memo" : ""}}
+
+    def test_roles(self):
+        rules = oprules.OperationRules(self.conf, self.keydb)
+        self.assertEqual(self.role_of(rules, {"type" : "vote_operation", "value" : {"voter" : "alice"}}), "posting-tnman")
+        self.assertEqual(self.role_of(rules, self.transfer("alice")), "active-tnman")
+        custom = {"type" : "custom_json_operation", "value" : {"required_auths" : [], "required_posting_auths" : ["alice"]}}
+        self.assertEqual(self.role_of(rules, custom), "posting-tnman")
+        custom["value"]["required_posting_auths"] = []
+        self.assertEqual(self.role_of(rules, custom), "active-tnman")
+
+    def test_unknown_type(self):
+        rules = oprules.OperationRules(self.conf, self.keydb)
+        self.assertIsNone(rules({"type" : "pow_operation", "value" : {}}))
+        self.assertEqual(rules.dropped[("pow_operation", "type")], 1)
+        self.assertNotIn("pow_operation", rules.types())
+
+    def test_ratio(self):
+        self.conf["ported_operations"] = [{"type" : "vote_operation", "roles" : ["posting"], "ratio" : 0.1}]
+        rules = oprules.OperationRules(self.conf, self.keydb)
+        kept = [rules({"type" : "vote_operation", "value" : {"voter" : "alice"}}) for i in range(100)]
+        self.assertEqual(sum(1 for tx in kept if tx is not None), 10)
+        self.assertEqual(rules.dropped[("vote_operation", "ratio")], 90)
+
+    def test_accounts(self):
+        self.conf["deny_accounts"] = ["mallory"]
+        self.conf["ported_operations"] = [{"type" : "transfer_operation", "roles" : ["active"], "allow_accounts" : ["alice", "mallory"]}]
+        rules = oprules.OperationRules(self.conf, self.keydb)
+        self.assertIsNotNone(rules(self.transfer("alice")))
+        self.assertIsNone(rules(self.transfer("mallory")))
+        self.assertIsNone(rules(self.transfer("carol")))
+        self.assertEqual(rules.dropped[("transfer_operation", "deny_accounts")], 1)
+        self.assertEqual(rules.dropped[("transfer_operation", "allow_accounts")], 1)
+
+    def test_known_accounts(self):
+        accounts = oprules.KnownAccounts(nameset.NameSet(["alice", "bob"]))
+        rules = oprules.OperationRules(self.conf, self.keydb, accounts)
+        self.assertIsNotNone(rules(self.transfer("alice")))
+        self.assertIsNone(rules(self.transfer("carol")))
+        self.assertEqual(rules.dropped[("transfer_operation", "missing_accounts")], 1)
+        
+        # Posts have an empty parent_author
+        post = {"type" : "comment_operation", "value" : {"parent_author" : "", "author" : "alice"}}
+        self.assertIsNotNone(rules(post))
+        
+        # Accounts created by ported operations exist from then on
+        create = {"type" : "account_create_operation", "value" : {"creator" : "alice", "new_account_name" : "carol"}}
+        self.assertIsNotNone(rules(create))
+        self.assertIsNotNone(rules(self.transfer("carol")))
+        create["value"]["creator"] = "dave"
+        create["value"]["new_account_name"] = "erin"
+        self.assertIsNone(rules(create))
+        self.assertNotIn("erin", accounts)
+
+    def test_where(self):
+        self.conf["ported_operations"] = [{"type" : "transfer_operation", "roles" : ["active"],
+            "where" : [["amount.amount", ">=", 1000], ["amount.nai", "in", ["@@000000021"]]]}]
+        rules = oprules.OperationRules(self.conf, self.keydb)
+        self.assertIsNotNone(rules(self.transfer("alice", "1000")))
+        self.assertIsNone(rules(self.transfer("alice", "999")))
+        self.assertRaises(RuntimeError, oprules.compile_predicate, "amount", "~", 1)
+
+    def test_signing_roles(self):
+        self.assertEqual(oprules.signing_roles({"posting"}), ["posting"])
+        self.assertEqual(oprules.signing_roles({"posting", "active"}), ["active"])
+        self.assertEqual(oprules.signing_roles({"owner", "active", "memo"}), ["owner", "memo"])
+
+    def test_port_transaction(self):
+        rules = oprules.OperationRules(self.conf, self.keydb)
+        vote = {"type" : "vote_operation", "value" : {"voter" : "alice"}}
+        pow = {"type" : "pow_operation", "value" : {}}
+        
+        txs = rules.port_transaction([vote, self.transfer("alice"), vote])
+        self.assertEqual(len(txs), 1)
+        self.assertEqual(txs[0]["operations"], [vote, self.transfer("alice"), vote])
+        self.assertEqual([k.name for k in txs[0]["wif_sigs"]], ["active-tnman"])
+        
+        txs = rules.port_transaction([pow, vote, pow, self.transfer("alice"), self.transfer("bob")])
+        self.assertEqual([tx["operations"] for tx in txs], [[vote], [self.transfer("alice"), self.transfer("bob")]])
+        self.assertEqual([k.name for k in txs[0]["wif_sigs"]], ["posting-tnman"])
+        self.assertEqual(rules.port_transaction([pow]), [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import copy
+
+from simple_steem_client.serializer.operation_variants import operation_variants
+from tinman import amountsub
+from tinman import opschema
+from tinman import prefixsub
+
+KEY = "STM6LLegbAgLAy28EHrffBVuANFWcFgmqRMW13wBmTExqFE9SCkg4"
+
+def sample_value(typedef):
+    """ A value of typedef in the JSON form of appbase """
+    if typedef == "asset":
+        return {"amount" : "123456", "precision" : 3, "nai" : "@@000000021"}
+    elif typedef == "public_key":
+        return KEY
+    elif typedef in ("string", "raw_bytes", "time_point_sec"):
+        return "text"
+    elif typedef == "boolean":
+        return True
+    description = opschema._describe(typedef)
+    if description is None:
+        return 7
+    kind = description[0]
+    if kind == "fields":
+        return {name : sample_value(fieldtype) for name, fieldtype in description[1]}
+    elif kind == "array":
+        return [sample_value(description[1]), sample_value(description[1])]
+    elif kind == "map":
+        return [[sample_value(description[1]), sample_value(description[2])]]
+    elif kind == "optional":
+        return sample_value(description[1])
+    return []
+
+def sample_operations():
+    for name, fields in operation_variants:
+        yield {"type" : name + "_operation", "value" : sample_value(("fields", fields))}
+
+class OpschemaTest(unittest.TestCase):
+    def test_describe(self):
+        self.assertEqual(opschema._describe("price")[0], "fields")
+        self.assertEqual(opschema._describe(lambda s, v: s.optional(v, "authority")), ("optional", "authority"))
+        self.assertIsNone(opschema._describe("string"))
+        self.assertIsNone(opschema._describe("asset"))
+
+    def test_amounts_match_generic(self):
+        transform_operation = amountsub.operation_transformer(0.5, 10)
+        for op in sample_operations():
+            expected = copy.deepcopy(op)
+            amountsub.transform_amounts(expected["value"], 0.5, 10)
+            self.assertEqual(transform_operation(op), expected)
+
+    def test_prefix_matches_generic(self):
+        for op in sample_operations():
+            expected = copy.deepcopy(op)
+            prefixsub.transform_prefix(expected["value"])
+            self.assertEqual(prefixsub.transform_operation(op), expected)
+
+    def test_skips_other_fields(self):
+        op = {"type" : "comment_operation", "value" : {"body" : KEY, "json_metadata" : {"key" : KEY}}}
+        self.assertEqual(prefixsub.transform_operation(copy.deepcopy(op)), op)
+        transformer = opschema.OperationTransformer(["public_key"], prefixsub.transform_key, None)
+        self.assertIsNone(transformer.operations["comment_operation"])
+        self.assertIsNotNone(transformer.operations["account_update_operation"])
+
+    def test_optional_missing(self):
+        op = {"type" : "account_update_operation", "value" : {"account" : "alice", "owner" : None, "memo_key" : KEY}}
+        prefixsub.transform_operation(op)
+        self.assertEqual(op["value"], {"account" : "alice", "owner" : None, "memo_key" : "TST" + KEY[3:]})
+
+    def test_fallback(self):
+        # An operation of a later protocol, missing from the schema
+        op = {"type" : "recurrent_transfer_operation", "value" : {"from" : "alice", "to" : "bob",
+            "amount" : {"amount" : "3000", "precision" : 3, "nai" : "@@000000021"}, "recurrence" : 24}}
+        fallback_values = []
+        transformer = opschema.OperationTransformer(["asset"], lambda a : self.fail("leaf applied"), fallback_values.append)
+        self.assertNotIn(op["type"], transformer.operations)
+        transformer(op)
+        self.assertEqual(fallback_values, [op["value"]])
+        
+        amountsub.operation_transformer(0.5)(op)
+        self.assertEqual(op["value"]["amount"]["amount"], "1500")
+
+if __name__ == "__main__":
+    unittest.main()
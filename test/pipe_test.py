@@ -0,0 +1,58 @@
+import unittest
+import argparse
+import io
+import json
+import tempfile
+
+from tinman import amountsub
+from tinman import pipe
+from tinman import prefixsub
+from tinman import util
+
+class PipeTest(unittest.TestCase):
+    def setUp(self):
+        with open("test-backfill.actions", "r") as f:
+            self.lines = f.read().splitlines()
+
+    def chained(self, *transforms):
+        # The standalone commands, each decoding and encoding every action
+        lines = self.lines
+        for transform in transforms:
+            output = io.StringIO()
+            util.transform_lines(io.StringIO("\n".join(lines)), output, transform)
+            lines = output.getvalue().splitlines()
+        return [json.loads(line) for line in lines]
+
+    def test_parse_stages(self):
+        self.assertEqual(pipe.parse_stages("keysub, prefixsub,"), ["keysub", "prefixsub"])
+        self.assertRaises(argparse.ArgumentTypeError, pipe.parse_stages, "keysub,submit")
+
+    def test_stages(self):
+        args = argparse.Namespace(ratio="0.5", floor_satoshi="1", get_dev_key_exe="get_dev_key")
+        run = pipe.build_stages(["prefixsub", "amountsub"], args)
+        result = list(run(json.loads(line) for line in self.lines))
+
+        def prefix(line):
+            act, act_args = json.loads(line)
+            return json.dumps(next(prefixsub.transform_actions([[act, act_args]]), None))
+
+        def amounts(line):
+            act, act_args = json.loads(line)
+            return json.dumps(next(amountsub.transform_actions([[act, act_args]], 0.5), None))
+
+        self.assertEqual(result, self.chained(prefix, amounts))
+        self.assertTrue(any(a[1]["tx"]["operations"][0]["value"]["amount"]["amount"] == "51" for a in result
+            if "amount" in a[1]["tx"]["operations"][0]["value"]))
+
+    def test_main(self):
+        with open("test-backfill.actions", "r") as f:
+            expected = [json.loads(line) for line in f]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outfile = tmpdir + "/out.actions"
+            pipe.main(["pipe", "-i", "test-backfill.actions", "-o", outfile, "--stages", "prefixsub"])
+            with open(outfile, "r") as f:
+                result = [json.loads(line) for line in f]
+        self.assertEqual(result, list(prefixsub.transform_actions(expected)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,8 +1,10 @@
 import unittest
 import json
 import shutil
+import tempfile
 
 from tinman import prefixsub
+from tinman import util
 
 class PrefixsubTest(unittest.TestCase):
     def test_transform_prefix_str(self):
@@ -98,6 +100,25 @@ class PrefixsubTest(unittest.TestCase):
         }
         self.assertEqual(object, expected_result)
     
+    def test_main_encoding(self):
+        # Rewritten lines are encoded as the lines passed through
+        key = "STM6LLegbAgLAy28EHrffBVuANFWcFgmqRMW13wBmTExqFE9SCkg4"
+        actions = [
+            ["submit_transaction", {"esc" : "z", "tx" : {"operations" : [{"type" : "vote_operation", "value" : {"voter" : "alice", "weight" : 1}}]}}],
+            ["submit_transaction", {"esc" : "z", "tx" : {"operations" : [{"type" : "account_update_operation", "value" : {"account" : "alice", "memo_key" : key}}]}}],
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(tmpdir + "/in.actions", "w") as f:
+                for action in actions:
+                    f.write(util.action_to_str(action) + "\n")
+            prefixsub.main(["prefixsub", "-i", tmpdir + "/in.actions", "-o", tmpdir + "/out.actions"])
+            with open(tmpdir + "/out.actions", "r") as f:
+                lines = f.read().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn("TST6LL", lines[1])
+        for line in lines:
+            self.assertEqual(line, util.action_to_str(json.loads(line)))
+
     def test_transform_prefix_transaction_ignore(self):
         object = ["submit_transaction", {
             "tx": {
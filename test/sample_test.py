@@ -0,0 +1,106 @@
+import unittest
+import copy
+import heapq
+import io
+import json
+import tempfile
+
+import ijson
+
+from tinman import sample
+
+class PipeReader(object):
+    """ A non-seekable stream returning short reads, like a pipe """
+
+    def __init__(self, data, chunk=7):
+        self.f = io.BytesIO(data)
+        self.chunk = chunk
+
+    def read(self, size=-1):
+        if size < 0 or size > self.chunk:
+            size = self.chunk
+        return self.f.read(size)
+
+class SampleTest(unittest.TestCase):
+    def setUp(self):
+        with open("test-snapshot.json", "rb") as f:
+            self.data = f.read()
+        self.snapshot = json.loads(self.data)
+
+    def expected_top(self, size):
+        accounts = self.snapshot["accounts"]
+        top = heapq.nlargest(size, range(len(accounts)), key=lambda i : int(accounts[i]["balance"]["amount"]))
+        return [accounts[i] for i in sorted(top)]
+
+    def test_rewindable_reader(self):
+        reader = sample.RewindableReader(PipeReader(b"0123456789", chunk=3))
+        self.assertEqual(reader.read(4), b"012")
+        self.assertEqual(reader.read(4), b"345")
+        reader.rewind()
+        self.assertEqual(reader.read(4), b"0123")
+        self.assertEqual(reader.read(4), b"45")
+        self.assertEqual(reader.read(4), b"678")
+        self.assertEqual(reader.read(), b"9")
+        self.assertEqual(reader.read(), b"")
+
+    def test_iterate_json_accounts(self):
+        header = {}
+        accounts = list(sample.iterate_json_accounts(PipeReader(self.data), header, ijson))
+        self.assertEqual(accounts, self.snapshot["accounts"])
+        self.assertEqual(header["metadata"], self.snapshot["metadata"])
+        self.assertEqual(header["dynamic_global_properties"], self.snapshot["dynamic_global_properties"])
+
+    def test_top_accounts(self):
+        for size in (0, 1, 5, len(self.snapshot["accounts"]) + 1):
+            top = sample.top_accounts(iter(self.snapshot["accounts"]), size, silent=True)
+            self.assertEqual(top, self.expected_top(size))
+
+    def test_top_accounts_ties(self):
+        accounts = [{"name" : str(i), "balance" : {"amount" : "1"}} for i in range(10)]
+        top = sample.top_accounts(accounts, 3, silent=True)
+        self.assertEqual([a["name"] for a in top], ["0", "1", "2"])
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outfile = tmpdir + "/sample.json"
+            sample.main(["sample", "-i", "test-snapshot.json", "-o", outfile, "--size", "5"])
+            with open(outfile, "r") as f:
+                result = json.load(f)
+        self.assertEqual(result["accounts"], self.expected_top(5))
+        self.assertEqual(result["dynamic_global_properties"]["total_vesting_fund_steem"],
+            self.snapshot["dynamic_global_properties"]["total_vesting_fund_steem"])
+        self.assertEqual(result["metadata"]["snapshot:origin_api"], self.snapshot["metadata"]["snapshot:origin_api"])
+        self.assertEqual(result["witnesses"], [])
+
+    def test_sample_snapshot_without_fund(self):
+        snapshot = sample.sample_snapshot({}, {}, [])
+        self.assertEqual(snapshot["dynamic_global_properties"], {"total_vesting_fund_steem" : {}})
+
+    def test_account_refs(self):
+        a = {"name" : "alice", "proxy" : "carol", "witness_votes" : ["dave"],
+             "owner" : {"account_auths" : [["alice", 1]]},
+             "active" : {"account_auths" : []},
+             "posting" : {"account_auths" : [["bob", 1]]}}
+        self.assertEqual(sample.account_refs(a), {"bob"})
+        self.assertEqual(sample.account_refs(a, votes=True), {"bob", "carol", "dave"})
+
+    def test_close_names(self):
+        refs = {"a" : ["b", "c"], "b" : ["d"], "d" : ["a", "e"]}
+        self.assertEqual(sample.close_names(["a"], refs, 10), ({"a", "b", "c", "d", "e"}, 0))
+        self.assertEqual(sample.close_names(["a"], refs, 2), ({"a", "b", "c"}, 1))
+        self.assertEqual(sample.close_names(["c"], refs, 10), ({"c"}, 0))
+
+    def test_closure_accounts(self):
+        accounts = copy.deepcopy(self.snapshot["accounts"])
+        for a in accounts:
+            if a["name"] == "bittrex":
+                a["posting"]["account_auths"] = [["hellosteem", 1], ["nobody", 1]]
+        expected = [a for a in accounts if a["name"] in ("bittrex", "poloniex", "hellosteem")]
+        for spill in (False, True):
+            result = sample.closure_accounts(lambda : iter(accounts), 2, 100, spill=spill, silent=True)
+            self.assertEqual(result, expected)
+        result = sample.closure_accounts(lambda : iter(accounts), 2, 0, silent=True)
+        self.assertEqual([a["name"] for a in result], [a["name"] for a in self.expected_top(2)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+import unittest
+
+from simple_steem_client.serializer import Serializer, Deserializer, transaction_id, block_id, TESTNET_NAI_SYMBOLS
+from simple_steem_client.serializer.operation_variants import operation_variants
+from simple_steem_client.serializer.serializer import ArgumentError
+from tinman import opschema
+
+KEY = "STM6LLegbAgLAy28EHrffBVuANFWcFgmqRMW13wBmTExqFE9SCkg4"
+
+SAMPLES = {
+    "uint8" : 200,
+    "uint16" : 60000,
+    "uint32" : 4000000000,
+    "uint64" : 2**63 + 5,
+    "int8" : -100,
+    "int16" : -10000,
+    "int32" : -2000000000,
+    "int64" : -2**62,
+    "boolean" : True,
+    "string" : "téxt",
+    "time_point_sec" : "2019-01-01T12:34:56",
+    "asset" : "123.456 STEEM",
+    "public_key" : KEY,
+    "ripemd160" : "ab" * 20,
+    "sha256" : "cd" * 32,
+    "signature" : "1f" + "ef" * 64,
+    "binary" : "00ff10",
+    "version" : "0.20.1",
+    "void" : None,
+}
+
+APPBASE_SAMPLES = dict(SAMPLES, asset={"amount" : "123456", "precision" : 3, "nai" : "@@000000021"})
+
+def sample_value(typedef, samples):
+    """ A value of typedef, in the form the Deserializer returns (legacy, or appbase) """
+    if typedef in samples:
+        return samples[typedef]
+    description = typedef if isinstance(typedef, tuple) else opschema._describe(typedef)
+    assert description is not None, typedef
+    kind = description[0]
+    if kind == "fields":
+        return {name : sample_value(fieldtype, samples) for name, fieldtype in description[1]}
+    elif kind == "array":
+        return [sample_value(description[1], samples)] * 2
+    elif kind == "map":
+        return [[sample_value(description[1], samples), sample_value(description[2], samples)]]
+    elif kind == "optional":
+        return sample_value(description[1], samples)
+    elif kind in ("static_variant", "extensions"):
+        # The last variant, to exercise the selector
+        name, variant_def = description[1][-1]
+        variant = sample_value(variant_def, samples)
+        if samples is APPBASE_SAMPLES:
+            variant = {"type" : name, "value" : variant}
+        else:
+            variant = [name, variant]
+        return [variant] if kind == "extensions" else variant
+    raise AssertionError(typedef)
+
+def sample_operations(samples):
+    for name, fields in operation_variants:
+        value = sample_value(("fields", fields), samples)
+        if samples is APPBASE_SAMPLES:
+            yield {"type" : name + "_operation", "value" : value}
+        else:
+            yield [name, value]
+
+def transaction(operations, samples):
+    return {
+        "ref_block_num" : 1234,
+        "ref_block_prefix" : 567890,
+        "expiration" : "2019-01-01T12:34:56",
+        "operations" : list(operations),
+        "extensions" : [],
+        "signatures" : [samples["signature"]],
+    }
+
+def serialize(typedef, value):
+    s = Serializer()
+    s._get_serializer_fn(typedef)(value)
+    return s.flush()
+
+class SerializerTest(unittest.TestCase):
+    def assertRoundTrip(self, typedef, value, appbase=False):
+        data = serialize(typedef, value)
+        d = Deserializer(data, appbase=appbase)
+        self.assertEqual(d._get_deserializer_fn(typedef)(), value)
+        self.assertEqual(d.pos, len(data))
+        return data
+
+    def test_primitives(self):
+        for typedef, value in SAMPLES.items():
+            self.assertRoundTrip(typedef, value)
+        for value in (0, 127, 128, 2**35):
+            self.assertRoundTrip("uvarint", value)
+        for value in (0, -1, 63, -64, 2**35, -2**35):
+            self.assertRoundTrip("svarint", value)
+        for value in ("0.001 SBD", "0.000001 VESTS", "1000.000 TESTS"):
+            self.assertRoundTrip("asset", value)
+
+    def test_operations(self):
+        for op in sample_operations(SAMPLES):
+            self.assertRoundTrip("operation", op)
+
+    def test_operations_appbase(self):
+        for op, legacy in zip(sample_operations(APPBASE_SAMPLES), sample_operations(SAMPLES)):
+            data = self.assertRoundTrip("operation", op, appbase=True)
+            self.assertEqual(data, serialize("operation", legacy))
+
+    def test_signed_block(self):
+        trx = transaction(sample_operations(APPBASE_SAMPLES), APPBASE_SAMPLES)
+        block = {
+            "previous" : "0000044d" + "00" * 16,
+            "timestamp" : "2019-01-01T12:34:57",
+            "witness" : "initminer",
+            "transaction_merkle_root" : "00" * 20,
+            "extensions" : [{"type" : "version", "value" : "0.20.1"}],
+            "witness_signature" : "1f" + "00" * 64,
+            "transactions" : [trx, dict(trx, ref_block_num=1)],
+        }
+        decoded = Deserializer(serialize("signed_block", block), appbase=True).signed_block()
+        self.assertEqual(decoded.pop("block_id"), block_id(block))
+        self.assertTrue(block_id(block).startswith("0000044e"))
+        self.assertEqual(decoded.pop("transaction_ids"), [transaction_id(t) for t in block["transactions"]])
+        self.assertNotEqual(transaction_id(trx), transaction_id(block["transactions"][1]))
+        self.assertEqual(len(transaction_id(trx)), 40)
+        self.assertEqual(decoded, block)
+
+    def test_transaction_id(self):
+        trx = transaction([["vote", {"voter" : "alice", "author" : "bob", "permlink" : "p", "weight" : 100}]], SAMPLES)
+        # Signatures are not part of the id
+        self.assertEqual(transaction_id(trx), transaction_id(dict(trx, signatures=[])))
+
+    def test_testnet_assets(self):
+        transfer = {"from" : "alice", "to" : "bob", "amount" : "1.000 TESTS", "memo" : ""}
+        legacy = transaction([["transfer", transfer]], SAMPLES)
+        appbase = transaction([{"type" : "transfer_operation", "value" : dict(transfer,
+            amount={"amount" : "1000", "precision" : 3, "nai" : "@@000000021"})}], SAMPLES)
+        self.assertEqual(transaction_id(appbase, TESTNET_NAI_SYMBOLS), transaction_id(legacy))
+        self.assertNotEqual(transaction_id(appbase), transaction_id(legacy))
+
+    def test_buffer_grows(self):
+        s = Serializer(size=4)
+        s.uint64(1)
+        s.string("x" * 100000)
+        data = s.flush()
+        self.assertEqual(len(data), 8 + 3 + 100000)
+        self.assertEqual(Deserializer(data, 8).string(), "x" * 100000)
+        s.uint32(5)
+        out = bytearray(b"ab")
+        s.flush_into(out, 2)
+        self.assertEqual(out, b"ab\x05\x00\x00\x00")
+
+    def test_serializer_fns_bounded(self):
+        s = Serializer()
+        authority = sample_value("authority", SAMPLES)
+        for i in range(3):
+            s.authority(authority)
+        count = len(s._serializer_fns)
+        for i in range(100):
+            s.authority(authority)
+            s.signed_transaction(transaction(sample_operations(SAMPLES), SAMPLES))
+            s.flush()
+        self.assertLessEqual(len(s._serializer_fns), count + 50)
+
+    def test_binary64(self):
+        for value in (0.0, -2.5, 1e300, float("inf"), float("-inf")):
+            self.assertRoundTrip("binary64", value)
+
+    def test_zero_copy(self):
+        data = bytearray(b"\xff" + serialize("string", "abc") + b"\xff")
+        d = Deserializer(data, 1)
+        self.assertEqual(d.string(), "abc")
+        self.assertEqual(d.pos, 5)
+
+    def test_errors(self):
+        self.assertRaises(ArgumentError, Deserializer(b"\x05abc").string)
+        self.assertRaises(ArgumentError, Deserializer(b"\x7f").operation)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import json
+import tempfile
+
+from tinman import colsnap
+from tinman import jsonlsnap
+from tinman import snapindex
+from tinman import snapshot
+from tinman import txgen
+
+# Only the owners of witnesses are dumped
+WITNESSES = ["alice", "bob"]
+
+class FakeDatabaseApi(object):
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def get_dynamic_global_properties(self, x=None):
+        return self.snapshot["dynamic_global_properties"]
+
+    def list_accounts(self, start, limit, order):
+        accounts = sorted(self.snapshot["accounts"], key=lambda a : a["name"])
+        return {"accounts" : [a for a in accounts if a["name"] >= start][:limit]}
+
+    def list_witnesses(self, start, limit, order):
+        return {"witnesses" : [{"owner" : "alice"}, {"owner" : "bob"}]}
+
+class FakeSteemd(object):
+    def __init__(self, snapshot):
+        self.database_api = FakeDatabaseApi(snapshot)
+
+class SnapindexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        with open("test-snapshot.json", "r") as f:
+            self.snapshot = json.load(f)
+        self.steemd = FakeSteemd(self.snapshot)
+        self.accounts = sorted(self.snapshot["accounts"], key=lambda a : a["name"])
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def dump(self, dump, name):
+        path = self.tmpdir.name + "/" + name
+        index = {}
+        outfile = snapindex.OffsetWriter(open(path, "w"))
+        dump(self.steemd, outfile, {"snapshot:semver" : "0.2"}, index)
+        outfile.close()
+        snapindex.write_index(path, index)
+        return path
+
+    def check_offsets(self, path, index):
+        with open(path, "rb") as f:
+            data = f.read()
+        decoder = json.JSONDecoder()
+        self.assertIn(data[index["accounts:offset"]:index["accounts:offset"] + 1], [b"[", b"{"])
+        witnesses = decoder.raw_decode(data[index["witnesses:offset"]:].decode("utf-8"))[0]
+        self.assertEqual(witnesses if isinstance(witnesses, list) else witnesses["witnesses"], WITNESSES)
+
+    def test_json_index(self):
+        import ijson
+        path = self.dump(snapshot.dump_json, "snapshot.json")
+        index = snapindex.read_index(path)
+        
+        self.assertEqual(index["metadata"]["snapshot:semver"], "0.2")
+        self.assertEqual(index["dynamic_global_properties"], self.snapshot["dynamic_global_properties"])
+        self.check_offsets(path, index)
+        with open(path, "rb") as f:
+            self.assertEqual(list(snapindex.iterate_accounts(f, index, ijson)), self.accounts)
+        with open(path, "r") as f:
+            self.assertEqual(json.load(f)["accounts"], self.accounts)
+        with open(path, "rb") as f:
+            self.assertEqual(list(snapindex.iterate_witnesses(f, index, ijson)), WITNESSES)
+        
+        # Converting with the index reads the same as scanning
+        jsonl_path = path + ".jsonl"
+        with open(path, "rb") as f, open(jsonl_path, "w") as outfile:
+            self.assertEqual(jsonlsnap.convert(f, outfile, index), len(self.accounts))
+        self.assertEqual(jsonlsnap.read_witnesses(jsonl_path), WITNESSES)
+        self.assertEqual(list(jsonlsnap.iterate_accounts(jsonl_path)), self.accounts)
+        with open(path, "rb") as f:
+            self.assertEqual(colsnap.convert(f, path + ".cols", index), len(self.accounts))
+        self.assertEqual(colsnap.ColumnarSnapshot(path + ".cols").witnesses, WITNESSES)
+        
+        header = txgen.read_snapshot_header({"snapshot_file" : path})
+        self.assertEqual(header["metadata"], {"snapshot:semver" : "0.2"})
+        self.assertGreater(header["total_vesting_steem"], 0)
+
+    def test_jsonl_index(self):
+        path = self.dump(snapshot.dump_jsonl, "snapshot.jsonl")
+        index = snapindex.read_index(path)
+        
+        self.assertTrue(jsonlsnap.is_jsonl(path))
+        self.assertEqual(index["metadata"]["snapshot:format"], "jsonl")
+        self.check_offsets(path, index)
+        self.assertEqual(jsonlsnap.accounts_range(path), (index["accounts:offset"], index["accounts:end"]))
+
+    def test_stale_index(self):
+        path = self.dump(snapshot.dump_json, "snapshot.json")
+        with open(path, "a") as f:
+            f.write("\n")
+        self.assertIsNone(snapindex.read_index(path))
+        self.assertIsNone(snapindex.read_index("test-snapshot.json"))
@@ -1,8 +1,11 @@
 import unittest
 import json
 import shutil
+import types
 
 from tinman import snapshot
+from tinman import txgen
+from tinman import util
 from simple_steem_client.client import SteemRemoteBackend, SteemInterface, SteemRPCException
 
 class SnapshotTest(unittest.TestCase):
@@ -10,3 +13,77 @@ class SnapshotTest(unittest.TestCase):
         backend = SteemRemoteBackend(nodes=["http://test.com"], appbase=True)
         steemd = SteemInterface(backend)
         self.assertIsNotNone(snapshot.list_all_accounts(steemd))
+
+    def test_collect_account_names(self):
+        op = {"voter" : "alice", "author" : "bob", "permlink" : "not-an-account", "weight" : 10000,
+            "required_auths" : ["carol"], "owner" : {"account_auths" : [["dave", 1]], "key_auths" : []},
+            "memo" : "hello", "to" : "X"}
+        self.assertEqual(snapshot.collect_account_names(op, set()), {"alice", "bob", "carol", "dave"})
+
+    def test_merge_accounts(self):
+        old = [{"name" : "alice", "v" : 1}, {"name" : "bob", "v" : 1}, {"name" : "dan", "v" : 1}]
+        new = [{"name" : "bob", "v" : 2}, {"name" : "carol", "v" : 2}, {"name" : "zed", "v" : 2}]
+        merged = list(snapshot.merge_accounts(old, new))
+        self.assertEqual([(a["name"], a["v"]) for a in merged],
+            [("alice", 1), ("bob", 2), ("carol", 2), ("dan", 1), ("zed", 2)])
+
+    def test_add_proxies(self):
+        proxies = {"alice" : "bob", "bob" : "carol", "carol" : "", "dan" : "carol", "erin" : "frank"}
+        
+        def find_accounts(accounts):
+            return {"accounts" : [{"name" : name, "proxy" : proxies.get(name, "")} for name in accounts]}
+        
+        steemd = types.SimpleNamespace(database_api=types.SimpleNamespace(find_accounts=find_accounts))
+        self.assertEqual(snapshot.add_proxies(steemd, {"alice", "dan"}), {"alice", "bob", "carol", "dan"})
+        self.assertEqual(snapshot.read_base_proxies("test-snapshot.json", {"alpha", "bob"}), {"blocktrades"})
+
+    def test_read_base_head_block_number(self):
+        with open("test-snapshot.json", "r") as f:
+            expected = json.load(f)["dynamic_global_properties"].get("head_block_number")
+        self.assertEqual(snapshot.read_base_head_block_number("test-snapshot.json"), expected)
+
+    def test_check_base_fields(self):
+        with open("test-snapshot.json", "r") as f:
+            full = json.load(f)
+        snapshot.check_base_fields("test-snapshot.json", None)
+        self.assertRaises(RuntimeError, snapshot.check_base_fields, "test-snapshot.json", snapshot.parse_fields("txgen"))
+        projected = dict(full, metadata=dict(full["metadata"], **{"snapshot:fields" : snapshot.parse_fields("txgen")}))
+        with open("/tmp/test-projected-base.json", "w") as f:
+            json.dump(projected, f)
+        snapshot.check_base_fields("/tmp/test-projected-base.json", snapshot.parse_fields("txgen"))
+        self.assertRaises(RuntimeError, snapshot.check_base_fields, "/tmp/test-projected-base.json", None)
+        self.assertRaises(RuntimeError, snapshot.check_base_fields, "/tmp/test-projected-base.json", snapshot.parse_fields("balance"))
+
+    def test_parse_fields(self):
+        self.assertEqual(snapshot.parse_fields("txgen"), txgen.SPILLED_ACCOUNT_FIELDS)
+        self.assertEqual(snapshot.parse_fields("balance, memo_key"), ["name", "balance", "memo_key"])
+
+    def test_projected_snapshot(self):
+        with open("test-snapshot.json", "r") as f:
+            full = json.load(f)
+        
+        def port(snapshot_file):
+            conf = {
+              "snapshot_file" : snapshot_file,
+              "min_vesting_per_account": {"amount" : "1", "precision" : 3, "nai" : "@@000000021"},
+              "total_port_balance" : {"amount" : "200000000000", "precision" : 3, "nai" : "@@000000021"},
+              "accounts": {"porter": {"name": "porter"}, "manager": {"name": "tnman"}}
+            }
+            account_stats = txgen.get_account_stats(conf)
+            keydb = txgen.prockey.ProceduralKeyDatabase()
+            txs = list(txgen.create_accounts(account_stats, conf, keydb)) + list(txgen.update_accounts(account_stats, conf, keydb))
+            return [util.action_to_str(["submit_transaction", {"tx" : tx}]) for tx in txs]
+        
+        for profile, ok in [("txgen", True), ("balance,vesting_shares", False)]:
+            projected = dict(full)
+            projected["metadata"] = dict(full["metadata"], **{"snapshot:fields" : snapshot.parse_fields(profile)})
+            projected["accounts"] = list(snapshot.project_accounts(full["accounts"], snapshot.parse_fields(profile)))
+            with open("/tmp/test-projected-snapshot.json", "w") as f:
+                json.dump(projected, f)
+            
+            if ok:
+                shutil.copyfile("test-snapshot.json", "/tmp/test-snapshot.json")
+                self.assertEqual(port("/tmp/test-projected-snapshot.json"), port("/tmp/test-snapshot.json"))
+            else:
+                with self.assertRaises(RuntimeError):
+                    port("/tmp/test-projected-snapshot.json")
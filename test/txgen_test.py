@@ -1,8 +1,11 @@
 import unittest
+import copy
+import json
 import shutil
 
 from tinman import prockey
 from tinman import txgen
+from tinman import util
 
 FULL_CONF = {
     "transactions_per_block" : 40,
@@ -148,6 +151,33 @@ class TxgenTest(unittest.TestCase):
         self.assertEqual(account_stats["total_vests"], 103927120221962824)
         self.assertEqual(account_stats["total_steem"], 60859732440)
 
+    def test_iterate_accounts(self):
+        shutil.copyfile("test-snapshot.json", "/tmp/test-snapshot.json")
+        conf = {
+          "snapshot_file" : "/tmp/test-snapshot.json",
+          "accounts": {"steemit": {"name": "steemit"}}
+        }
+        
+        account_stats = txgen.get_account_stats(conf)
+        accounts = list(txgen.iterate_accounts(account_stats))
+        
+        self.assertEqual(len(accounts), 20)
+        self.assertEqual({a["name"] for a in accounts}, account_stats["account_names"])
+        self.assertEqual(sum(a["vesting_shares"] for a in accounts), account_stats["total_vests"])
+        self.assertEqual(sorted(accounts[0].keys()), sorted(txgen.SPILLED_ACCOUNT_FIELDS))
+        
+        # Readers keep independent positions
+        first, second = txgen.iterate_accounts(account_stats), txgen.iterate_accounts(account_stats)
+        self.assertEqual(next(first)["name"], next(second)["name"])
+
+    def test_read_snapshot_header(self):
+        shutil.copyfile("test-snapshot.json", "/tmp/test-snapshot.json")
+        header = txgen.read_snapshot_header({"snapshot_file" : "/tmp/test-snapshot.json"})
+        
+        self.assertEqual(header["metadata"]["snapshot:semver"], "0.2")
+        self.assertEqual(header["metadata"]["snapshot:origin_api"], "http://calculon.local")
+        self.assertGreater(header["total_vesting_steem"], 0)
+
     def test_get_proportions(self):
         shutil.copyfile("test-snapshot.json", "/tmp/test-snapshot.json")
         conf = {
@@ -163,6 +193,29 @@ class TxgenTest(unittest.TestCase):
         self.assertEqual(proportions["vest_conversion_factor"], 1469860)
         self.assertEqual(proportions["steem_conversion_factor"], 776237928593)
 
+    def test_allocate_balances(self):
+        shutil.copyfile("test-snapshot.json", "/tmp/test-snapshot.json")
+        conf = {
+          "snapshot_file" : "/tmp/test-snapshot.json",
+          "min_vesting_per_account": {"amount" : "1", "precision" : 3, "nai" : "@@000000021"},
+          "total_port_balance" : {"amount" : "200000000000", "precision" : 3, "nai" : "@@000000021"},
+          "accounts": {}
+        }
+        account_stats = txgen.get_account_stats(conf)
+        proportions = txgen.get_proportions(account_stats, conf)
+        allocation = txgen.allocate_balances(account_stats, conf)
+        accounts = list(txgen.iterate_accounts(account_stats))
+        
+        for i, a in enumerate(accounts):
+            vesting = max((a["vesting_shares"] * proportions["vest_conversion_factor"]) // txgen.DENOM, 1)
+            liquid = (a["balance"] * proportions["steem_conversion_factor"]) // txgen.DENOM
+            self.assertEqual(int(allocation["vesting"][i]), vesting)
+            self.assertEqual(int(allocation["liquid"][i]), liquid)
+        
+        self.assertEqual(allocation["total"], sum(map(int, allocation["vesting"])) + sum(map(int, allocation["liquid"])))
+        self.assertLessEqual(allocation["total"], 200000000000)
+        self.assertIs(txgen.allocate_balances(account_stats, conf), allocation)
+
     def test_create_accounts(self):
         shutil.copyfile("test-snapshot.json", "/tmp/test-snapshot.json")
         conf = {
@@ -252,6 +305,54 @@ class TxgenTest(unittest.TestCase):
             else:
                 self.fail("Unexpected action: %s" % cmd)
 
+    def test_build_actions_jobs(self):
+        shutil.copyfile("test-snapshot.json", "/tmp/test-snapshot.json")
+        shutil.copyfile("test-backfill.actions", "/tmp/test-backfill.actions")
+        
+        def transactions(jobs):
+            lines = "\n".join(util.action_to_str(action) for action in txgen.build_actions(FULL_CONF, jobs=jobs))
+            return [line for line in lines.split("\n") if line.startswith('["submit_transaction"')]
+        
+        shard_accounts = txgen.SHARD_ACCOUNTS
+        txgen.SHARD_ACCOUNTS = 3
+        try:
+            self.assertEqual(transactions(3), transactions(1))
+        finally:
+            txgen.SHARD_ACCOUNTS = shard_accounts
+
+    def test_build_delta_actions(self):
+        shutil.copyfile("test-snapshot.json", "/tmp/test-snapshot.json")
+        with open("test-snapshot.json", "r") as f:
+            snapshot = json.load(f)
+        
+        accounts = {a["name"] : a for a in snapshot["accounts"]}
+        accounts["ned"]["memo_key"] = "STM5jZtLoV8YbxCxr4imnbWn61zMB24wwonpnVhfXRmv7j6fk3dTH"
+        accounts["dan"]["vesting_shares"]["amount"] = str(2 * int(accounts["dan"]["vesting_shares"]["amount"]))
+        new_account = copy.deepcopy(accounts["alpha"])
+        new_account["name"] = "alpha-new"
+        snapshot["accounts"].append(new_account)
+        with open("/tmp/test-new-snapshot.json", "w") as f:
+            json.dump(snapshot, f)
+        
+        conf = FULL_CONF.copy()
+        conf["snapshot_file"] = "/tmp/test-new-snapshot.json"
+        actions = list(txgen.build_delta_actions(conf, "/tmp/test-snapshot.json"))
+        
+        cmd, metadata = actions[0]
+        self.assertEqual(cmd, "metadata")
+        self.assertEqual(metadata["actions:count"], len(actions) - 1)
+        
+        ops = [(op["type"], op["value"]) for cmd, args in actions[1:] for op in args["tx"]["operations"]]
+        self.assertEqual(ops[0][0], "transfer_operation")
+        self.assertEqual(ops[0][1]["to"], "porter")
+        self.assertEqual([v["new_account_name"] for t, v in ops if t == "account_create_operation"], ["alpha-new"])
+        self.assertEqual({v["to"] for t, v in ops if t == "transfer_to_vesting_operation"}, {"alpha-new", "dan"})
+        self.assertEqual({v["account"] for t, v in ops if t == "account_update_operation"}, {"alpha-new", "ned"})
+        
+        # Nothing to do against the same snapshot
+        conf["snapshot_file"] = "/tmp/test-snapshot.json"
+        self.assertEqual(len(list(txgen.build_delta_actions(conf, "/tmp/test-snapshot.json"))), 1)
+
     def test_build_actions_future_snapshot(self):
         shutil.copyfile("test-future-snapshot.json", "/tmp/test-future-snapshot.json")
         conf = FULL_CONF.copy()
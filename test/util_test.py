@@ -1,5 +1,8 @@
+import io
+import tempfile
 import unittest
 
+from tinman import prockey
 from tinman import util
 
 from simple_steem_client.client import SteemRemoteBackend, SteemInterface
@@ -15,6 +18,33 @@ class UtilTest(unittest.TestCase):
         expected_result = [['s', 'p', 'a'], ['m', 's', 'p'], ['a', 'm']]
         self.assertEqual(result, expected_result)
 
+    def test_transform_lines(self):
+        input_file = io.StringIO('a\nbb\n\nccc')
+        output_file = io.StringIO()
+        util.transform_lines(input_file, output_file, lambda line : line.upper() if line else None)
+        self.assertEqual(output_file.getvalue(), 'A\nBB\nCCC\n')
+
+    def test_transform_lines_fd(self):
+        with tempfile.TemporaryFile("w+") as input_file:
+            input_file.write('["metadata",{}]\n["wait_blocks",{"count":1}]\n')
+            input_file.seek(0)
+            output_file = io.StringIO()
+            util.transform_lines(input_file, output_file, util.action_name)
+            self.assertEqual(output_file.getvalue(), 'metadata\nwait_blocks\n')
+
+    def test_pread_lines(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(b"spam\neggs\nham")
+            f.flush()
+            self.assertEqual(list(util.pread_lines(f.fileno(), size=3)), [b"spam", b"eggs", b"ham"])
+            self.assertEqual(list(util.pread_lines(f.fileno(), 5, 10, size=2)), [b"eggs"])
+
+    def test_action_name(self):
+        self.assertEqual(util.action_name('["submit_transaction",{"tx":{}}]'), 'submit_transaction')
+        self.assertEqual(util.action_name('["set_secret", {"secret":"xyz-"}]'), 'set_secret')
+        self.assertIsNone(util.action_name('[ "metadata", {}]'))
+        self.assertIsNone(util.action_name('["a\\"b", {}]'))
+
     def test_find_non_substr(self):
         self.assertEqual(util.find_non_substr('steem'), 'a')
         self.assertEqual(util.find_non_substr('steemian'), 'b')
@@ -25,6 +55,14 @@ class UtilTest(unittest.TestCase):
         self.assertEqual(util.find_non_substr('steemian bob can do fun'), 'g')
         self.assertEqual(util.find_non_substr('steemian bob can do fun things'), 'j')
 
+    def test_shortest_non_substr(self):
+        self.assertEqual(util.shortest_non_substr('steem'), 'a')
+        self.assertEqual(util.shortest_non_substr('steemian bob can do fun things'), 'j')
+        self.assertEqual(util.shortest_non_substr('ab', 'ab'), 'aa')
+        self.assertEqual(util.shortest_non_substr('aabba', 'ab'), 'aaa')
+        self.assertEqual(util.shortest_non_substr('a' * 1000, 'ab'), 'b')
+        self.assertEqual(util.shortest_non_substr('', 'ab'), 'a')
+
     def test_iterate_operations_from(self):
         backend = SteemRemoteBackend(nodes=["https://api.steemit.com"], appbase=True)
         steemd = SteemInterface(backend)
@@ -74,3 +112,16 @@ class UtilTest(unittest.TestCase):
         action = ["metadata", {"esc": "C"}]
         result = util.action_to_str(action)
         self.assertEqual(result, '["metadata",{"esc":"C"}]')
+
+    def test_action_to_str_keys(self):
+        keydb = prockey.ProceduralKeyDatabase()
+        action = ["submit_transaction", {"tx" : {"memo_key" : keydb.get_pubkey("alice", "memo"),
+            "wif_sigs" : [keydb.get_privkey("porter")]}}]
+        result = util.action_to_str(action)
+        self.assertEqual(result, '["submit_transaction",{"esc":"d","tx":{"memo_key":"dpublickey:memo-aliced","wif_sigs":["dprivatekey:active-porterd"]}}]')
+
+    def test_action_to_str_marks_in_data(self):
+        keydb = prockey.ProceduralKeyDatabase()
+        action = ["submit_transaction", {"tx" : {"memo" : "\x00\x01", "memo_key" : keydb.get_pubkey("alice", "memo")}}]
+        result = util.action_to_str(action)
+        self.assertEqual(result, '["submit_transaction",{"esc":"d","tx":{"memo":"\\u0000\\u0001","memo_key":"dpublickey:memo-aliced"}}]')
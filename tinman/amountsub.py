@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+from . import opschema
 from . import util
 
 import argparse
@@ -7,6 +8,35 @@ import json
 import sys
 import math
 
+ASSET_KEYS = frozenset(["amount", "precision", "nai"])
+
+def transform_asset(asset, ratio, floor_satoshi=1):
+    """ Scales the amount of asset (with amount, precision and nai) in place """
+    if asset["amount"] == "0":
+        return asset
+    
+    new_amount = math.floor(int(asset["amount"]) * ratio)
+    
+    if new_amount < floor_satoshi:
+        new_amount = floor_satoshi
+    
+    asset["amount"] = str(new_amount)
+    return asset
+
+def operation_transformer(ratio, floor_satoshi=1):
+    """
+    Returns a function scaling the amounts of an operation (`{"type": ...,
+    "value": ...}`) in place.  Only asset fields are visited, operations
+    missing from the schema are walked whole.
+    """
+    def transform_asset_field(field):
+        if isinstance(field, dict) and ASSET_KEYS.issubset(field.keys()):
+            transform_asset(field, ratio, floor_satoshi)
+        return field
+    
+    return opschema.OperationTransformer(["asset"], transform_asset_field,
+        lambda value : transform_amounts(value, ratio, floor_satoshi))
+
 def transform_amounts(object, ratio, floor_satoshi=1):
     def intersection(a, b):
         c = [value for value in a if value in b]
@@ -25,15 +55,24 @@ def transform_amounts(object, ratio, floor_satoshi=1):
                 transform_amounts(field, ratio, floor_satoshi)
                 continue
             else:
-                if field["amount"] == "0":
-                    continue
-                
-                new_amount = math.floor(int(field["amount"]) * ratio)
-                
-                if new_amount < floor_satoshi:
-                    new_amount = floor_satoshi
-                
-                field["amount"] = str(new_amount)
+                transform_asset(field, ratio, floor_satoshi)
+
+def transform_actions(actions, ratio, floor_satoshi=1):
+    """
+    Yields the decoded `submit_transaction` actions of actions with their
+    operations transformed in place, dropping every other action but
+    `source_block` markers.
+    """
+    transform_operation = operation_transformer(ratio, floor_satoshi)
+    for act, act_args in actions:
+        if act == "source_block":
+            yield [act, act_args]
+            continue
+        if act != "submit_transaction" or not act_args["tx"]:
+            continue
+        for op in act_args["tx"]["operations"]:
+            transform_operation(op)
+        yield [act, act_args]
 
 def main(argv):
     parser = argparse.ArgumentParser(prog=argv[0], description="Adjust amount fields by ratio")
@@ -59,23 +98,37 @@ def main(argv):
         print("Useless ratio: 1.0")
         exit(1)
     
-    for line in input_file:
+    floor_satoshi = int(args.floor_satoshi)
+    transform_operation = operation_transformer(ratio, floor_satoshi)
+    
+    def transform(line):
         line = line.strip()
+        if not line:
+            return None
+        name = util.action_name(line)
+        if name == "source_block":
+            return line
+        if name is not None and name != "submit_transaction":
+            return None
+        # Without an asset anywhere in the line there is nothing to transform
+        if name is not None and '"nai"' not in line and '"operations"' in line:
+            return line
         act, act_args = json.loads(line)
+        if act == "source_block":
+            return line
         if act != "submit_transaction":
-            continue
+            return None
         
         if not act_args["tx"]:
-            continue
+            return None
         
         for op in act_args["tx"]["operations"]:
-            transform_amounts(op["value"], ratio, int(args.floor_satoshi))
+            transform_operation(op)
         
-        transformed_line = json.dumps([act, act_args])
-        
-        output_file.write(transformed_line)
-        output_file.write("\n")
-        output_file.flush()
+        # Encoded as the lines passed through are
+        return util.action_to_str([act, act_args])
+
+    util.transform_lines(input_file, output_file, transform)
     if args.input_file != "-":
         input_file.close()
     if args.output_file != "-":
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Reads blocks from the `block_log` of a steemd node, without the node.
+
+steemd appends every block to `block_log`, serialized in the binary format
+of the blockchain and followed by its position (a little-endian uint64),
+and the positions alone to `block_log.index`, so that the position of block
+n is the n-th uint64 of the index.  A `BlockLogReader` memory-maps both and
+decodes blocks with `simple_steem_client.serializer.Deserializer`, with the
+`block_id` and `transaction_ids` the API adds to them (but no `signing_key`).
+
+It stands in for a steemd connection as a source of blocks, for instance to
+`util.iterate_operations_from` or, with `"block_log"` in the
+`transaction_source` of its configuration, to gatling:
+
+>>> steemd = BlockLogReader("/var/lib/steemd/blockchain/block_log")
+>>> ops = util.iterate_operations_from(steemd, True, 1102, 1103, set())
+"""
+
+import mmap
+import os
+import struct
+
+from simple_steem_client.serializer import Deserializer
+from simple_steem_client.serializer.serializer import ArgumentError
+
+_POSITION = struct.Struct("<Q")
+
+class BlockLogReader(object):
+    def __init__(self, path, index_path=None):
+        if index_path is None:
+            index_path = path + ".index"
+        if not os.path.isfile(index_path):
+            raise RuntimeError("Missing block_log.index:", index_path)
+        self.log_file = open(path, "rb")
+        self.index_file = open(index_path, "rb")
+        self.log = None
+        self.index = None
+        self.head_block_number = 0
+        self.refresh()
+        # Stands in for the APIs of a steemd connection
+        self.block_api = self
+        self.database_api = self
+        return
+
+    def _map(self, f):
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return None
+        return mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+    def refresh(self):
+        """ Maps the files again if the node has appended blocks since they were mapped """
+        size = os.fstat(self.index_file.fileno()).st_size
+        if self.index is not None and size == len(self.index):
+            return
+        self.close_maps()
+        # The index is appended after the log, so the log has every block it indexes
+        self.index = self._map(self.index_file)
+        self.log = self._map(self.log_file)
+        self.head_block_number = 0 if self.index is None else len(self.index) // _POSITION.size
+        return
+
+    def position(self, block_num):
+        return _POSITION.unpack_from(self.index, _POSITION.size * (block_num - 1))[0]
+
+    def read_block(self, block_num, appbase=True):
+        """ Returns block block_num, decoded in the form of the appbase API (or legacy, see `Deserializer`), or None """
+        if block_num > self.head_block_number:
+            self.refresh()
+        if block_num < 1 or block_num > self.head_block_number:
+            return None
+        position = self.position(block_num)
+        d = Deserializer(self.log, position, appbase=appbase)
+        try:
+            block = d.signed_block()
+        except (ArgumentError, IndexError, struct.error) as e:
+            raise RuntimeError("Corrupt block_log, cannot decode block %d: %s" % (block_num, e))
+        # Each block is followed by its position, which checks that it was decoded in full
+        if _POSITION.unpack_from(self.log, d.pos)[0] != position:
+            raise RuntimeError("Corrupt block_log, block %d does not end at its position" % block_num)
+        return block
+
+    def get_block(self, block_num=None):
+        """ Same as `block_api.get_block` of appbase """
+        block = self.read_block(block_num)
+        if block is None:
+            return {}
+        return {"block" : block}
+
+    def get_dynamic_global_properties(self, a=None):
+        """ The part of `database_api.get_dynamic_global_properties` known from the block log """
+        self.refresh()
+        dgpo = {"head_block_number" : self.head_block_number}
+        head = self.read_block(self.head_block_number)
+        if head is not None:
+            dgpo["time"] = head["timestamp"]
+        return dgpo
+
+    def close_maps(self):
+        for m in (self.log, self.index):
+            if m is not None:
+                m.close()
+        self.log = None
+        self.index = None
+        return
+
+    def close(self):
+        self.close_maps()
+        self.log_file.close()
+        self.index_file.close()
+        return
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Columnar binary form of a snapshot.
+
+A columnar snapshot is a directory holding one file per column, so that
+consumers only read (and only page in) the columns they use:
+
+- `header.json` : metadata, dynamic global properties, witnesses, the account
+  count and a description of the columns
+- `<column>.int64` : little-endian int64 satoshi amounts, one per account
+- `<column>.offsets` and `<column>.data` : string columns, where account `i`
+  is `data[offsets[i]:offsets[i+1]]`
+
+The amounts are `balance` and `vesting_shares`.  The string columns are
+`name`, `memo_key`, `json_metadata` and `authorities`, the latter holding the
+compact JSON of `[owner, active, posting]`.
+"""
+
+import array
+import json
+import mmap
+import os
+import os.path
+import sys
+
+try:
+    import numpy
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+from . import __version__
+from . import jsonlsnap
+from . import snapindex
+
+COLSNAP_MAJOR_VERSION_SUPPORTED = 0
+HEADER_FILE = "header.json"
+AMOUNT_COLUMNS = ["balance", "vesting_shares"]
+STRING_COLUMNS = ["name", "memo_key", "json_metadata", "authorities"]
+AUTHORITY_ROLES = ["owner", "active", "posting"]
+WRITE_BATCH_SIZE = 10000
+
+def is_columnar(path):
+    """ True if path is a columnar snapshot directory """
+    return os.path.isfile(os.path.join(path, HEADER_FILE))
+
+def _int64_bytes(values):
+    a = array.array("q", values)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a.tobytes()
+
+class ColumnarSnapshotWriter(object):
+    """
+    Writes accounts one at a time into a columnar snapshot directory.
+    Call `close` with the snapshot header once all accounts are added.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.count = 0
+        self.is_sorted = True
+        self.last_name = None
+        self.assets = {}
+        self.files = {}
+        self.offsets = {}
+        self.pending = {}
+        for column in AMOUNT_COLUMNS:
+            self.files[column] = open(os.path.join(path, column + ".int64"), "wb")
+            self.pending[column] = []
+        for column in STRING_COLUMNS:
+            self.files[column] = open(os.path.join(path, column + ".data"), "wb")
+            self.files[column + ".offsets"] = open(os.path.join(path, column + ".offsets"), "wb")
+            self.offsets[column] = 0
+            self.pending[column] = [0]
+        return
+
+    def add_account(self, a):
+        name = a["name"]
+        if self.last_name is not None and name <= self.last_name:
+            self.is_sorted = False
+        self.last_name = name
+
+        for column in AMOUNT_COLUMNS:
+            asset = a[column]
+            self.assets.setdefault(column, {"precision" : asset["precision"], "nai" : asset["nai"]})
+            self.pending[column].append(int(asset["amount"]))
+
+        authorities = json.dumps([a[role] for role in AUTHORITY_ROLES], separators=(",", ":"), sort_keys=True)
+        for column, value in (("name", name), ("memo_key", a["memo_key"]),
+                ("json_metadata", a["json_metadata"]), ("authorities", authorities)):
+            data = value.encode("utf-8")
+            self.files[column].write(data)
+            self.offsets[column] += len(data)
+            self.pending[column].append(self.offsets[column])
+
+        self.count += 1
+        if self.count % WRITE_BATCH_SIZE == 0:
+            self._write_pending()
+        return
+
+    def _write_pending(self):
+        for column in AMOUNT_COLUMNS:
+            self.files[column].write(_int64_bytes(self.pending[column]))
+            self.pending[column] = []
+        for column in STRING_COLUMNS:
+            self.files[column + ".offsets"].write(_int64_bytes(self.pending[column]))
+            self.pending[column] = []
+        return
+
+    def close(self, metadata, dgpo, witnesses):
+        self._write_pending()
+        for f in self.files.values():
+            f.close()
+        header = {
+          "metadata" : metadata,
+          "dynamic_global_properties" : dgpo,
+          "witnesses" : witnesses,
+          "colsnap:semver" : __version__,
+          "accounts:count" : self.count,
+          "accounts:sorted" : self.is_sorted,
+          "assets" : self.assets,
+        }
+        with open(os.path.join(self.path, HEADER_FILE), "w") as f:
+            # ijson parses non-integer numbers as Decimal
+            json.dump(header, f, separators=(",", ":"), sort_keys=True, default=float)
+        return
+
+class ColumnarSnapshot(object):
+    """
+    Reads a columnar snapshot through memory maps of its column files.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, HEADER_FILE), "r") as f:
+            self.header = json.load(f)
+
+        major_version = int(self.header.get("colsnap:semver", "0.0").split(".")[0])
+        if major_version != COLSNAP_MAJOR_VERSION_SUPPORTED:
+            raise RuntimeError("Unsupported columnar snapshot:", self.header.get("colsnap:semver"))
+
+        self.count = self.header["accounts:count"]
+        self.metadata = self.header["metadata"]
+        self.dgpo = self.header["dynamic_global_properties"]
+        self.witnesses = self.header["witnesses"]
+        self.assets = self.header["assets"]
+        self.amounts = {column : self._int64_column(column + ".int64") for column in AMOUNT_COLUMNS}
+        self.offsets = {column : self._int64_column(column + ".offsets") for column in STRING_COLUMNS}
+        self.data = {column : self._map(column + ".data") for column in STRING_COLUMNS}
+        return
+
+    def _map(self, filename):
+        with open(os.path.join(self.path, filename), "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b"")
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _int64_column(self, filename):
+        view = self._map(filename).cast("q")
+        if sys.byteorder == "big":
+            a = array.array("q", view)
+            a.byteswap()
+            return memoryview(a)
+        return view
+
+    def __len__(self):
+        return self.count
+
+    def amount_array(self, column):
+        """
+        The satoshi amounts of column, as a NumPy array when NumPy is
+        available, otherwise as a memoryview of int64.
+        """
+        if NUMPY_AVAILABLE:
+            return numpy.frombuffer(self.amounts[column], dtype=numpy.int64)
+        return self.amounts[column]
+
+    def total(self, column):
+        """ Sums the satoshi amounts of column """
+        values = self.amount_array(column)
+        if NUMPY_AVAILABLE and len(values) > 0:
+            # Summing in int64 is exact unless the total could overflow
+            if int(numpy.abs(values).max()) < (2**63 - 1) // len(values):
+                return int(values.sum())
+            return int(values.sum(dtype=object))
+        return sum(values)
+
+    def string(self, column, i):
+        offsets = self.offsets[column]
+        return str(self.data[column][offsets[i]:offsets[i+1]], "utf-8")
+
+    def name(self, i):
+        return self.string("name", i)
+
+    def names(self):
+        for i in range(self.count):
+            yield self.string("name", i)
+
+    def asset(self, column, i):
+        asset = dict(self.assets.get(column, {}))
+        asset["amount"] = str(self.amounts[column][i])
+        return asset
+
+    def account(self, i):
+        """ Returns account i in the same shape as a JSON snapshot account """
+        a = {
+          "name" : self.name(i),
+          "memo_key" : self.string("memo_key", i),
+          "json_metadata" : self.string("json_metadata", i),
+        }
+        for column in AMOUNT_COLUMNS:
+            a[column] = self.asset(column, i)
+        a.update(zip(AUTHORITY_ROLES, json.loads(self.string("authorities", i))))
+        return a
+
+    def iterate_accounts(self, start=0, stop=None):
+        if stop is None:
+            stop = self.count
+        for i in range(start, stop):
+            yield self.account(i)
+
+def convert_jsonl(infile, path):
+    """
+    Converts the JSON Lines snapshot at path infile into a columnar snapshot
+    at path.
+    """
+    header = jsonlsnap.read_header(infile)
+    writer = ColumnarSnapshotWriter(path)
+    for a in jsonlsnap.iterate_accounts(infile):
+        writer.add_account(a)
+    writer.close(header["metadata"], header["dynamic_global_properties"], jsonlsnap.read_witnesses(infile))
+    return writer.count
+
+def convert(infile, path, index=None):
+    """
+    Converts the JSON snapshot read from binary file infile into a columnar
+    snapshot at path.  Requires a seekable infile.  With the index of infile
+    (see `snapindex`), only its accounts and witnesses are parsed.
+    """
+    try:
+        import ijson.backends.yajl2_cffi as ijson
+    except ImportError:
+        import ijson
+
+    if index is not None and "witnesses:end" in index:
+        writer = ColumnarSnapshotWriter(path)
+        for a in snapindex.iterate_accounts(infile, index, ijson):
+            writer.add_account(a)
+        witnesses = list(snapindex.iterate_witnesses(infile, index, ijson))
+        writer.close(index["metadata"], index["dynamic_global_properties"], witnesses)
+        return writer.count
+
+    metadata = next(ijson.items(infile, "metadata"), {})
+    infile.seek(0)
+    dgpo = next(ijson.items(infile, "dynamic_global_properties"), {})
+    infile.seek(0)
+    writer = ColumnarSnapshotWriter(path)
+    for a in ijson.items(infile, "accounts.item"):
+        writer.add_account(a)
+    infile.seek(0)
+    witnesses = list(ijson.items(infile, "witnesses.item"))
+    writer.close(metadata, dgpo, witnesses)
+    return writer.count
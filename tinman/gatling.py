@@ -2,11 +2,21 @@
 
 import argparse
 import json
+import os
+import pickle
+import stat
 import sys
+import tempfile
 import time
 from simple_steem_client.client import SteemRemoteBackend, SteemInterface, SteemRPCException
 
+from . import blocklog
+from . import colsnap
+from . import jsonlsnap
+from . import nameset
+from . import oprules
 from . import prockey
+from . import submit
 from . import util
 
 # Whitelist of exceptions from transaction source (Mainnet).
@@ -26,16 +36,71 @@ def str2bool(str_arg):
     """
     return True if str_arg.lower() == 'true' else (False if str_arg.lower() == 'false' else None)
 
-def repack_operations(conf, keydb, min_block, max_block, from_blocks_ago, to_blocks_ago):
+def connect_source(conf):
+    """
+    Returns the source of blocks of the `transaction_source` of conf, a
+    steemd node, or a block log (see `blocklog.BlockLogReader`) if it has
+    `block_log`, and whether it is appbase.
+    """
+    source = conf["transaction_source"]
+    if source.get("block_log"):
+        return blocklog.BlockLogReader(source["block_log"]), True
+    is_appbase = str2bool(source["appbase"])
+    backend = SteemRemoteBackend(nodes=[source["node"]], appbase=is_appbase)
+    return SteemInterface(backend), is_appbase
+
+def snapshot_accounts(path):
+    """
+    Returns the `oprules.KnownAccounts` of a snapshot (columnar, JSON Lines
+    or JSON), holding its account names in a `NameSet`.
+    """
+    names = nameset.NameSetBuilder()
+    if colsnap.is_columnar(path):
+        for name in colsnap.ColumnarSnapshot(path).names():
+            names.add(name)
+    elif jsonlsnap.is_jsonl(path):
+        for account in jsonlsnap.iterate_accounts(path):
+            names.add(account["name"])
+    else:
+        try:
+            import ijson.backends.yajl2_cffi as ijson
+        except ImportError:
+            import ijson
+        with open(path, "rb") as f:
+            for name in ijson.items(f, "accounts.item.name"):
+                names.add(name)
+    return oprules.KnownAccounts(names.build())
+
+def repack_block(rules, transactions, ported_types, preserve_transactions=False):
+    """
+    Returns the transactions porting the source transactions of one block,
+    under rules (an `oprules.OperationRules`, whose types are ported_types).
+    """
+    txs = []
+    for trx in transactions:
+        if preserve_transactions:
+            txs.extend(rules.port_transaction(trx["operations"]))
+            continue
+        for op in trx["operations"]:
+            if op["type"] not in ported_types:
+                # Counted as rules would, so both modes report the same drops
+                rules.dropped[(op["type"], "type")] += 1
+                continue
+            tx = rules(op)
+            if tx is not None:
+                txs.append(tx)
+    return txs
+
+def repack_blocks(conf, rules, min_block, max_block, from_blocks_ago, to_blocks_ago, preserve_transactions=False):
     """
     Uses configuration file data to acquire operations from source node
-    blocks/transactions and repack them in new transactions one to one.
+    blocks/transactions and repack them in new transactions one to one, or
+    with preserve_transactions, in as many transactions as the original.
+    Yields a (block_num, transactions) pair for every source block, even
+    those with nothing to port.
     """
     
-    source_node = conf["transaction_source"]["node"]
-    is_appbase = str2bool(conf["transaction_source"]["appbase"])
-    backend = SteemRemoteBackend(nodes=[source_node], appbase=is_appbase)
-    steemd = SteemInterface(backend)
+    steemd, is_appbase = connect_source(conf)
     dgpo = steemd.database_api.get_dynamic_global_properties()
     
     if min_block == 0:
@@ -47,89 +112,156 @@ def repack_operations(conf, keydb, min_block, max_block, from_blocks_ago, to_blo
     if to_blocks_ago != -1:
         max_block = dgpo["head_block_number"] - to_blocks_ago
     
-    ported_operations = conf["ported_operations"]
-    ported_types = set([op["type"] for op in ported_operations])
+    ported_types = rules.types()
+    next_block = min_block
+    
+    def repack(last_block):
+        nonlocal next_block
+        for block_num, transactions in util.iterate_block_transactions_from(steemd, is_appbase, next_block, last_block):
+            yield block_num, repack_block(rules, transactions, ported_types, preserve_transactions)
+            next_block = block_num + 1
+    
     """ Positive value of max_block means get from [min_block_number,max_block_number) range and stop """
     if max_block > 0: 
-        for op in util.iterate_operations_from(steemd, is_appbase, min_block, max_block, ported_types):
-            yield op_for_role(op, conf, keydb, ported_operations)
+        yield from repack(max_block)
+        if next_block < max_block:
+            raise RuntimeError("Source node is missing block", next_block)
         return
     """
     Otherwise get blocks from min_block_number to current head and again
-    until you have to wait for another block to be produced (chase-then-listen mode)
+    until you have to wait for another block to be produced (chase-then-listen mode).
+    A block the node does not return yet is asked again, rather than skipped.
     """
-    old_head_block = min_block
     while True:
         dgpo = steemd.database_api.get_dynamic_global_properties()
         new_head_block = dgpo["head_block_number"]
-        while old_head_block == new_head_block:
+        while new_head_block <= next_block:
             time.sleep(1) # Theoretically 3 seconds, but most probably we won't have to wait that long.
             dgpo = steemd.database_api.get_dynamic_global_properties()
             new_head_block = dgpo["head_block_number"]
-        for op in util.iterate_operations_from(steemd, is_appbase, old_head_block, new_head_block, ported_types):
-            yield op_for_role(op, conf, keydb, ported_operations)
-        old_head_block = new_head_block
+        yield from repack(new_head_block)
+        if next_block < new_head_block:
+            time.sleep(1)
     return
 
-def op_for_role(op, conf, keydb, ported_operations):
+def retry_blocks(conf, rules, min_block, max_block, from_blocks_ago, to_blocks_ago, preserve_transactions=False):
     """
-    Here, we match the role with the op type.  For certain types, there's more
-    to do than just grab the one and only appropriate role.
+    Yields the blocks of `repack_blocks`, recovering from retryable source
+    node errors by resuming after the last block yielded, so that no block
+    is repeated or skipped.
     """
-    tx_signer = conf["transaction_signer"]
-    
-    for ported_op in ported_operations:
-        if ported_op["type"] == op["type"]:
-            roles = ported_op["roles"]
-    
-    if roles and len(roles) == 1:
-        # It's a trivial role that know about right in config.
-        return {"operations" : [op], "wif_sigs" : [keydb.get_privkey(tx_signer, roles[0])]}
-    else:
-        # custom_json_operation is usually posting, but sometimes there's an elevated role.
-        if op["type"] in ["custom_json_operation", "custom_binary_operation", "custom_operation"]:
-            if len(op["value"]["required_posting_auths"]) > 0:
-                # The role is "posting" because required_posting_auths has keys.
-                return {"operations" : [op], "wif_sigs" : [keydb.get_privkey(tx_signer, "posting")]}
-            else:
-                # Assume "active" because there's nothing in required_posting_auths.
-                return {"operations" : [op], "wif_sigs" : [keydb.get_privkey(tx_signer, "active")]}
-        else:
-            # Assume it's "active" as a fallback.
-            return {"operations" : [op], "wif_sigs" : [keydb.get_privkey(tx_signer, "active")]}
-
-def build_actions(conf, min_block, max_block, from_blocks_ago, to_blocks_ago):
-    """
-    Packs transactions rebuilt with operations acquired from source node into blocks of configured size.
-    """
-    keydb = prockey.ProceduralKeyDatabase()
     retry_count = 0
     
     while True:
         retry_count += 1
         
         try:
-            for b in util.batch(repack_operations(conf, keydb, min_block, max_block, from_blocks_ago, to_blocks_ago), conf["transactions_per_block"]):
-                for tx in b:
-                    yield ["submit_transaction", {"tx" : tx}]
-                    retry_count = 0
-            break
+            for block in repack_blocks(conf, rules, min_block, max_block, from_blocks_ago, to_blocks_ago, preserve_transactions):
+                yield block
+                retry_count = 0
+                min_block = block[0] + 1
+                from_blocks_ago = -1
+            return
         except SteemRPCException as e:
-            cause = e.args[0].get("error")
+            message = None
+            data = None
+            cause = e.args[0].get("error") if e.args and isinstance(e.args[0], dict) else None
             if cause:
                 message = cause.get("message")
                 data = cause.get("data")
-                retry = False
             
-            if message and message in TRANSACTION_SOURCE_RETRYABLE_ERRORS:
-                retry = True
-            
-            if retry and retry_count < MAX_RETRY:
+            if message in TRANSACTION_SOURCE_RETRYABLE_ERRORS and retry_count < MAX_RETRY:
                 print("Recovered (tries: %s): %s" % (retry_count, message), file=sys.stderr)
                 if data:
                     print(json.dumps(data, indent=2), file=sys.stderr)
             else:
                 raise e
+
+def loop_blocks(blocks, count=0):
+    """
+    Yields the items of blocks, then replays them count - 1 more times
+    (forever if count is 0).  They are recorded in a temporary file, so the
+    source is read only once.
+    """
+    with tempfile.TemporaryFile() as recording:
+        for block in blocks:
+            pickle.dump(block, recording)
+            yield block
+        passes = 1
+        while count == 0 or passes < count:
+            recording.seek(0)
+            while True:
+                try:
+                    block = pickle.load(recording)
+                except EOFError:
+                    break
+                yield block
+            passes += 1
+    return
+
+class ReplayScheduler(object):
+    """
+    Turns repacked blocks into actions, inserting `wait_blocks` actions to
+    pace them at a rate of blocks_per_block source blocks per testnet block
+    (e.g. 5 to replay at 5x mainnet speed), and/or ops_per_block operations
+    per testnet block.  Without either, no `wait_blocks` are inserted.
+
+    With markers, the actions of each source block are followed by a
+    `["source_block", {"block_num": n}]` action, so that downstream stages
+    know which blocks they have seen in full (see `submit.deduplicate_blocks`).
+    """
+
+    def __init__(self, blocks_per_block=None, ops_per_block=None, markers=False):
+        self.blocks_per_block = blocks_per_block
+        self.ops_per_block = ops_per_block
+        self.markers = markers
+        self.blocks = 0
+        self.ops = 0
+        self.waits_for_blocks = 0
+        self.waits_for_ops = 0
+        return
+
+    def pace(self, blocks):
+        # Waits are counted rather than kept as fractional credit, so that
+        # rounding errors do not accumulate
+        for block_num, txs in blocks:
+            for tx in txs:
+                yield ["submit_transaction", {"tx" : tx}]
+                if self.ops_per_block:
+                    self.ops += len(tx["operations"])
+                    due = int(self.ops / self.ops_per_block)
+                    if due > self.waits_for_ops:
+                        yield ["wait_blocks", {"count" : due - self.waits_for_ops}]
+                        self.waits_for_ops = due
+            if self.blocks_per_block:
+                self.blocks += 1
+                due = int(self.blocks / self.blocks_per_block)
+                if due > self.waits_for_blocks:
+                    yield ["wait_blocks", {"count" : due - self.waits_for_blocks}]
+                    self.waits_for_blocks = due
+            if self.markers:
+                yield ["source_block", {"block_num" : block_num}]
+        return
+
+def build_actions(conf, min_block, max_block, from_blocks_ago, to_blocks_ago, preserve_transactions=False, scheduler=None, loop=1, accounts=None):
+    """
+    Packs transactions rebuilt with operations acquired from source node
+    into actions, paced by scheduler (a `ReplayScheduler`).  With loop other
+    than 1, the block range is replayed loop times (0 for forever).  With
+    accounts (see `snapshot_accounts`), operations involving other accounts
+    are dropped.
+    """
+    keydb = prockey.ProceduralKeyDatabase()
+    rules = oprules.OperationRules(conf, keydb, accounts)
+    if scheduler is None:
+        scheduler = ReplayScheduler()
+    blocks = retry_blocks(conf, rules, min_block, max_block, from_blocks_ago, to_blocks_ago, preserve_transactions)
+    if loop != 1:
+        blocks = loop_blocks(blocks, loop)
+    yield from scheduler.pace(blocks)
+    
+    for (op_type, reason), count in sorted(rules.dropped.items()):
+        print("Dropped %s (%s): %d" % (op_type, reason, count), file=sys.stderr)
     return
 
 def main(argv):
@@ -140,16 +272,18 @@ def main(argv):
     parser.add_argument("-fb", "--from_blocks_ago", default=-1, dest="from_blocks_ago", metavar="INT", help="Stream from relative block_num")
     parser.add_argument("-tb", "--to_blocks_ago", default=-1, dest="to_blocks_ago", metavar="INT", help="Stream to relative block_num")
     parser.add_argument("-o", "--outfile", default="-", dest="outfile", metavar="FILE", help="Specify output file, - means stdout")
+    parser.add_argument("--preserve-transactions", dest="preserve_transactions", action="store_true", help="Port the operations of each transaction together, instead of one transaction per operation")
+    parser.add_argument("--speed", default=None, type=float, dest="speed", metavar="FLOAT", help="Insert wait_blocks to replay this many source blocks per testnet block")
+    parser.add_argument("--ops-per-sec", default=None, type=float, dest="ops_per_sec", metavar="FLOAT", help="Insert wait_blocks to replay this many operations per second of testnet blocks")
+    parser.add_argument("--loop", default=1, type=int, dest="loop", metavar="INT", help="Replay the block range this many times, 0 for forever")
+    parser.add_argument("--accounts-from", default=None, dest="accounts_from", metavar="FILE", help="Drop operations involving accounts missing from this snapshot")
+    parser.add_argument("--state-file", default=None, dest="state_file", metavar="FILE", help="Resume after the last block saved there (by submit, or by gatling itself when writing to a file); marks the end of each block with a source_block action")
+    parser.add_argument("--state-interval", default=10, type=int, dest="state_interval", metavar="INT", help="When writing to a file, save the state file every this many blocks (default: 10)")
     args = parser.parse_args(argv[1:])
 
     with open(args.conffile, "r") as f:
         conf = json.load(f)
 
-    if args.outfile == "-":
-        outfile = sys.stdout
-    else:
-        outfile = open(args.outfile, "w")
-    
     min_block_num = int(args.min_block_num)
     max_block_num = int(args.max_block_num)
     from_blocks_ago = int(args.from_blocks_ago)
@@ -161,11 +295,61 @@ def main(argv):
     if max_block_num == -1:
         max_block_num = int(conf["max_block_number"])
     
-    for action in build_actions(conf, min_block_num, max_block_num, from_blocks_ago, to_blocks_ago):
-        outfile.write(util.action_to_str(action))
-        outfile.write("\n")
-
-    outfile.flush()
+    if args.loop != 1 and (max_block_num <= 0 or from_blocks_ago != -1 or to_blocks_ago != -1):
+        raise RuntimeError("--loop needs a fixed block range, given by --from_block and --to_block")
+    
+    cursor = None
+    if args.state_file is not None:
+        if args.loop != 1:
+            raise RuntimeError("--state-file cannot be used with --loop")
+        cursor = util.load_cursor(args.state_file)
+        if cursor is not None:
+            print("Resuming after block %d" % cursor, file=sys.stderr)
+            min_block_num = cursor + 1
+            from_blocks_ago = -1
+            if max_block_num > 0 and min_block_num >= max_block_num:
+                return
+    
+    if args.outfile == "-":
+        outfile = sys.stdout
+    else:
+        # A resumed run adds to the output of the previous ones
+        outfile = open(args.outfile, "w" if cursor is None else "a")
+    
+    # A block written to a file is saved once synced, but one written to a
+    # pipe is only saved by its consumer (`tinman submit --state-file`) once
+    # submitted, as a crash may lose what is still in the pipe
+    save_state = args.state_file is not None and stat.S_ISREG(os.fstat(outfile.fileno()).st_mode)
+    
+    ops_per_block = None
+    if args.ops_per_sec is not None:
+        ops_per_block = args.ops_per_sec * submit.STEEM_BLOCK_INTERVAL
+    scheduler = ReplayScheduler(blocks_per_block=args.speed, ops_per_block=ops_per_block, markers=args.state_file is not None)
+    
+    accounts = None
+    if args.accounts_from is not None:
+        accounts = snapshot_accounts(args.accounts_from)
+        print("Accounts read:", len(accounts.names), file=sys.stderr)
+    
+    saved = cursor
+    try:
+        for action in build_actions(conf, min_block_num, max_block_num, from_blocks_ago, to_blocks_ago, args.preserve_transactions, scheduler, args.loop, accounts):
+            outfile.write(util.action_to_str(action))
+            outfile.write("\n")
+            if action[0] == "source_block" and save_state:
+                cursor = action[1]["block_num"]
+                # Never behind the cursor already saved
+                if saved is None or cursor - saved >= args.state_interval:
+                    outfile.flush()
+                    os.fsync(outfile.fileno())
+                    util.save_cursor(args.state_file, cursor)
+                    saved = cursor
+    finally:
+        outfile.flush()
+        if save_state and cursor is not None and (saved is None or cursor > saved):
+            os.fsync(outfile.fileno())
+            util.save_cursor(args.state_file, cursor)
+    
     if args.outfile != "-":
         outfile.close()
 
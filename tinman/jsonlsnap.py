@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+JSON Lines form of a snapshot.
+
+Each line is one JSON object:
+
+- first, a header with `metadata` (including `"snapshot:format": "jsonl"`)
+  and `dynamic_global_properties`
+- then one account per line
+- last, a trailer `{"witnesses": [...]}`
+
+Since every account is a line, consumers parse each with `json.loads`
+instead of streaming parser events, can count accounts without parsing,
+and can split the accounts into byte ranges at line boundaries.
+"""
+
+import json
+import os
+
+from . import snapindex
+from . import util
+
+FORMAT = "jsonl"
+WITNESSES_PREFIX = b'{"witnesses":'
+HEADER_MAX_SIZE = 1 << 20
+READ_SIZE = 1 << 20
+
+def is_jsonl(path):
+    """ True if path is a JSON Lines snapshot """
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as f:
+        line = f.readline(HEADER_MAX_SIZE)
+    if not line.startswith(b'{"') or not line.endswith(b"\n"):
+        return False
+    try:
+        header = json.loads(line)
+    except ValueError:
+        return False
+    return isinstance(header, dict) and header.get("metadata", {}).get("snapshot:format") == FORMAT
+
+def write_header(outfile, metadata, dgpo):
+    metadata = dict(metadata)
+    metadata["snapshot:format"] = FORMAT
+    json.dump({"metadata" : metadata, "dynamic_global_properties" : dgpo}, outfile, separators=(",", ":"))
+    outfile.write("\n")
+    return
+
+def write_accounts(outfile, accounts):
+    """ Writes one account per line.  Returns the account count. """
+    count = 0
+    for a in accounts:
+        # ijson parses non-integer numbers as Decimal
+        outfile.write(json.dumps(a, separators=(",", ":"), sort_keys=True, default=float) + "\n")
+        count += 1
+    return count
+
+def write_witnesses(outfile, witnesses):
+    json.dump({"witnesses" : list(witnesses)}, outfile, separators=(",", ":"))
+    outfile.write("\n")
+    return
+
+def convert(infile, outfile, index=None):
+    """
+    Converts the JSON snapshot read from binary file infile into JSON Lines
+    written to outfile.  Requires a seekable infile.  With the index of
+    infile (see `snapindex`), only its accounts and witnesses are parsed.
+    """
+    try:
+        import ijson.backends.yajl2_cffi as ijson
+    except ImportError:
+        import ijson
+
+    if index is not None and "witnesses:end" in index:
+        write_header(outfile, index["metadata"], index["dynamic_global_properties"])
+        count = write_accounts(outfile, snapindex.iterate_accounts(infile, index, ijson))
+        write_witnesses(outfile, snapindex.iterate_witnesses(infile, index, ijson))
+        return count
+
+    metadata = next(ijson.items(infile, "metadata"), {})
+    infile.seek(0)
+    dgpo = next(ijson.items(infile, "dynamic_global_properties"), {})
+    infile.seek(0)
+    # ijson parses non-integer numbers as Decimal
+    metadata, dgpo = json.loads(json.dumps([metadata, dgpo], default=float))
+    write_header(outfile, metadata, dgpo)
+    count = write_accounts(outfile, ijson.items(infile, "accounts.item"))
+    infile.seek(0)
+    write_witnesses(outfile, ijson.items(infile, "witnesses.item"))
+    return count
+
+def read_header(path):
+    with open(path, "rb") as f:
+        return json.loads(f.readline(HEADER_MAX_SIZE))
+
+def accounts_range(path):
+    """ Returns the byte offsets (start, stop) of the account lines of path """
+    index = snapindex.read_index(path)
+    if index is not None:
+        return index["accounts:offset"], index["accounts:end"]
+    with open(path, "rb") as f:
+        start = len(f.readline(HEADER_MAX_SIZE))
+        size = os.fstat(f.fileno()).st_size
+        # The trailer is the last line, scan back for the newline before it
+        last = start
+        pos = size - 1
+        while pos > start:
+            step = min(READ_SIZE, pos - start)
+            f.seek(pos - step)
+            i = f.read(step).rfind(b"\n")
+            if i >= 0:
+                last = pos - step + i + 1
+                break
+            pos -= step
+        f.seek(last)
+        if f.read(len(WITNESSES_PREFIX)) == WITNESSES_PREFIX:
+            return start, last
+        return start, size
+
+def iterate_accounts(path):
+    """ Yields the accounts of path """
+    start, stop = accounts_range(path)
+    with open(path, "rb") as f:
+        for line in util.pread_lines(f.fileno(), start, stop, READ_SIZE):
+            yield json.loads(line)
+
+def read_witnesses(path):
+    start, stop = accounts_range(path)
+    with open(path, "rb") as f:
+        f.seek(stop)
+        line = f.readline()
+    if not line:
+        return []
+    return json.loads(line)["witnesses"]
@@ -8,21 +8,56 @@ import json
 import subprocess
 import sys
 
+def resolve_key(e, resolver=None):
+    ktype, seed = e.split(":", 1)
+    if ktype == "publickey":
+        return resolver.get_pubkey(seed)
+    elif ktype == "privatekey":
+        return resolver.get_privkey(seed)
+    else:
+        raise RuntimeError("invalid input")
+
 def process_esc(s, esc="", resolver=None):
     result = []
     for e, is_escaped in util.tag_escape_sequences(s, esc):
         if not is_escaped:
             result.append(e)
             continue
-        ktype, seed = e.split(":", 1)
-        if ktype == "publickey":
-            result.append( json.dumps(resolver.get_pubkey(seed))[1:-1] )
-        elif ktype == "privatekey":
-            result.append( json.dumps(resolver.get_privkey(seed))[1:-1] )
-        else:
-            raise RuntimeError("invalid input")
+        result.append( json.dumps(resolve_key(e, resolver))[1:-1] )
     return "".join(result)
 
+def substitute_esc(object, esc="", resolver=None):
+    """
+    Decoded counterpart of `process_esc`: returns object (decoded JSON) with
+    the escape sequences in its strings resolved.
+    """
+    if isinstance(object, str):
+        if esc not in object:
+            return object
+        return "".join(resolve_key(e, resolver) if is_escaped else e
+            for e, is_escaped in util.tag_escape_sequences(object, esc))
+    elif isinstance(object, list):
+        return [substitute_esc(e, esc, resolver) for e in object]
+    elif isinstance(object, dict):
+        return {substitute_esc(k, esc, resolver) : substitute_esc(v, esc, resolver) for k, v in object.items()}
+    return object
+
+def substitute_actions(actions, resolver):
+    """
+    Yields decoded actions with their keys substituted, taking the secret
+    from `set_secret` actions (which are dropped).
+    """
+    for act, act_args in actions:
+        if act == "set_secret":
+            resolver.secret = act_args["secret"]
+            continue
+        esc = act_args.get("esc")
+        if esc:
+            act_args = dict(act_args)
+            del act_args["esc"]
+            act_args = substitute_esc(act_args, esc=esc, resolver=resolver)
+        yield [act, act_args]
+
 def compute_keypair_from_seed(seed, secret, get_dev_key_exe="get_dev_key"):
     result_bytes = subprocess.check_output([get_dev_key_exe, secret, seed])
     result_str = result_bytes.decode("utf-8")
@@ -73,21 +108,26 @@ def main(argv):
 
     resolver = ProceduralKeyResolver(get_dev_key_exe=args.get_dev_key_exe)
 
-    for line in input_file:
+    def substitute(line):
         line = line.strip()
+        if not line:
+            return None
+        # Lines without an escape or a secret need no work, so skip decoding them
+        if '"esc"' not in line and '"set_secret"' not in line:
+            return line
         act, act_args = json.loads(line)
         if act == "set_secret":
             resolver.secret = act_args["secret"]
-            continue
+            return None
         esc = act_args.get("esc")
         if esc:
             act_args_minus_esc = dict(act_args)
             del act_args_minus_esc["esc"]
-            json_line_minus_esc = json.dumps([act, act_args_minus_esc], separators=(",", ":"), sort_keys=True)
+            json_line_minus_esc = util.action_json([act, act_args_minus_esc])
             line = process_esc(json_line_minus_esc, esc=esc, resolver=resolver)
-        output_file.write(line)
-        output_file.write("\n")
-        output_file.flush()
+        return line
+
+    util.transform_lines(input_file, output_file, substitute)
     if args.input_file != "-":
         input_file.close()
     if args.output_file != "-":
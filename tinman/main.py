@@ -13,6 +13,8 @@ from . import warden
 from . import amountsub
 from . import durables
 from . import prefixsub
+from . import pipe
+from . import mirror
 from . import server
 
 class Help(object):
@@ -36,6 +38,8 @@ commands = collections.OrderedDict((
             ("amountsub"  , amountsub  ),
             ("durables"  , durables  ),
             ("prefixsub", prefixsub),
+            ("pipe", pipe),
+            ("mirror", mirror),
             ("server", server),
             ("help"    , Help    ),
            ))
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Mirrors the source network onto a testnet as blocks are produced.
+
+`tinman mirror` does the work of
+`tinman gatling | tinman pipe --stages keysub,prefixsub,amountsub --then submit`
+in one process, as a pipeline of threads connected by bounded queues:
+
+- follow : reads each source block as soon as it is due
+- port : repacks its operations (see `gatling.repack_block`), applies the
+  prefixsub and amountsub stages and derives the signing keys
+- submit : signs the transactions and broadcasts them to the testnet, with
+  a pool of threads so that the HTTP round trips of a busy block overlap
+- track : follows the testnet blocks, to find the ported transactions
+
+When a stage falls behind, the queue before it fills up and the stages
+upstream block, so memory stays bounded.  The end-to-end lag, from the time
+of the source block to that of the testnet block including the ported
+transaction, is reported on stderr.
+"""
+
+import argparse
+import calendar
+import collections
+import concurrent.futures
+import json
+import queue
+import sys
+import threading
+import time
+import traceback
+from simple_steem_client.client import SteemRemoteBackend, SteemInterface, SteemRPCException
+
+from . import gatling
+from . import keysub
+from . import oprules
+from . import pipe
+from . import prockey
+from . import submit
+from . import util
+
+# How often to look for a block that is due but not produced yet
+POLL_INTERVAL = 0.25
+
+# Sent transactions not seen in a testnet block for this long have expired
+EXPIRATION = 120
+
+# Broadcasts in flight at once
+SUBMITTERS = 16
+
+def parse_time(s):
+    """ Seconds since the epoch of a UTC block timestamp """
+    return calendar.timegm(time.strptime(s, "%Y-%m-%dT%H:%M:%S"))
+
+def follow_blocks(steemd, is_appbase, block_num, last_block=-1, stop=lambda : False, sleep=time.sleep, now=time.time):
+    """
+    Yields a (block_num, timestamp, transactions) triple for each of
+    provided node's blocks from block_num, up to last_block (excluded) or,
+    if it is -1, for as long as stop() is false.  Once at the head, it sleeps
+    until the next block is due, a block interval after the last one, rather
+    than polling for it.
+    """
+    due = None
+    while (last_block < 0 or block_num < last_block) and not stop():
+        block = util.get_block(steemd, is_appbase, block_num)
+        if block is None:
+            wait = POLL_INTERVAL
+            if due is not None:
+                wait = min(max(wait, due - now()), submit.STEEM_BLOCK_INTERVAL)
+            sleep(wait)
+            continue
+        timestamp = parse_time(block["timestamp"])
+        yield block_num, timestamp, block["transactions"]
+        due = timestamp + submit.STEEM_BLOCK_INTERVAL
+        block_num += 1
+    return
+
+class LagTracker(object):
+    """
+    Measures the lag from the time of a source block to the time of the
+    testnet block including a transaction ported from it.  Transactions are
+    recognized by their first signature.  Transactions not included after
+    expiration seconds are dropped and counted in `expired`.
+    """
+
+    def __init__(self, expiration=EXPIRATION, now=time.time):
+        self.expiration = expiration
+        self.now = now
+        self.lock = threading.Lock()
+        self.pending = collections.OrderedDict()
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+        self.last = None
+        self.expired = 0
+        return
+
+    def sent(self, tx, source_block_num, source_time):
+        signatures = tx.get("signatures")
+        if not signatures:
+            return
+        with self.lock:
+            self.pending[signatures[0]] = (source_block_num, source_time, self.now())
+        return
+
+    def discard(self, tx):
+        signatures = tx.get("signatures")
+        if not signatures:
+            return
+        with self.lock:
+            self.pending.pop(signatures[0], None)
+        return
+
+    def included(self, block_time, transactions):
+        """
+        Records the transactions of a testnet block of time block_time, and
+        returns the (source_block_num, lag) pairs of those found.
+        """
+        lags = []
+        with self.lock:
+            for trx in transactions:
+                signatures = trx.get("signatures")
+                if not signatures:
+                    continue
+                entry = self.pending.pop(signatures[0], None)
+                if entry is None:
+                    continue
+                lag = block_time - entry[1]
+                self.count += 1
+                self.total += lag
+                self.last = lag
+                if self.max is None or lag > self.max:
+                    self.max = lag
+                lags.append((entry[0], lag))
+            limit = self.now() - self.expiration
+            while self.pending:
+                signature, entry = next(iter(self.pending.items()))
+                if entry[2] >= limit:
+                    break
+                del self.pending[signature]
+                self.expired += 1
+        return lags
+
+    def waiting(self):
+        with self.lock:
+            return len(self.pending)
+
+    def summary(self):
+        with self.lock:
+            if self.count == 0:
+                lag = "no transaction included yet"
+            else:
+                lag = "mean %.1fs, max %.1fs, last %.1fs over %d transactions" % (self.total / self.count, self.max, self.last, self.count)
+            return "lag: %s, %d pending, %d expired" % (lag, len(self.pending), self.expired)
+
+def _retryable(e):
+    """ The message of a source node error worth retrying, or None """
+    cause = e.args[0].get("error") if e.args and isinstance(e.args[0], dict) else None
+    message = cause.get("message") if cause else None
+    if message in gatling.TRANSACTION_SOURCE_RETRYABLE_ERRORS:
+        return message
+    return None
+
+class Mirror(object):
+    """
+    Runs the stages of the mirror (see module documentation) in threads.
+    source is the source node, target and monitor are connections to the
+    testnet for the submit and track stages, rules an
+    `oprules.OperationRules`, stages a function over actions (see
+    `pipe.build_stages`) and resolver a `keysub.ProceduralKeyResolver`.
+    Up to submitters transactions of a source block are broadcast at once,
+    those of the next block only once they are all done.  An error in any
+    stage stops them all, and is raised by `run`.
+    """
+
+    def __init__(self, source, target, monitor, rules, resolver, signer, first_block, last_block=-1,
+            is_appbase=True, preserve_transactions=False, stages=None, queue_size=100,
+            fail_file=None, die_on_fail=False, tracker=None, submitters=SUBMITTERS):
+        self.source = source
+        self.target = target
+        self.monitor = monitor
+        self.rules = rules
+        self.resolver = resolver
+        self.signer = signer
+        self.first_block = first_block
+        self.last_block = last_block
+        self.is_appbase = is_appbase
+        self.preserve_transactions = preserve_transactions
+        self.stages = stages if stages is not None else (lambda actions : actions)
+        self.fail_file = fail_file if fail_file is not None else sys.stdout
+        self.die_on_fail = die_on_fail
+        self.tracker = tracker if tracker is not None else LagTracker()
+        self.submitters = submitters
+
+        # Source blocks, then ported transactions, each None terminated
+        self.blocks = queue.Queue(queue_size)
+        self.ready = queue.Queue(queue_size)
+        self.stop = threading.Event()
+        self.drained = threading.Event()
+        self.errors = []
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.failed = 0
+        return
+
+    def put(self, q, item):
+        """ Blocks until item fits in q, returns False if stopped first """
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def take(self, q):
+        """ Yields the items of q up to None, or until stopped """
+        while not self.stop.is_set():
+            try:
+                item = q.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+            if item is None:
+                return
+            yield item
+        return
+
+    def follow(self):
+        block_num = self.first_block
+        retry_count = 0
+        while True:
+            try:
+                for block in follow_blocks(self.source, self.is_appbase, block_num, self.last_block, stop=self.stop.is_set):
+                    if not self.put(self.blocks, block):
+                        return
+                    block_num = block[0] + 1
+                    retry_count = 0
+                break
+            except SteemRPCException as e:
+                retry_count += 1
+                message = _retryable(e)
+                if message is None or retry_count >= gatling.MAX_RETRY:
+                    raise
+                print("Recovered (tries: %s): %s" % (retry_count, message), file=sys.stderr)
+        self.put(self.blocks, None)
+        return
+
+    def port(self):
+        ported_types = self.rules.types()
+
+        def actions():
+            for block_num, timestamp, transactions in self.take(self.blocks):
+                for tx in gatling.repack_block(self.rules, transactions, ported_types, self.preserve_transactions):
+                    yield ["submit_transaction", {"tx" : tx, "source" : [block_num, timestamp]}]
+
+        # The stages are chained once, over the whole stream
+        for act, act_args in self.stages(actions()):
+            tx = act_args["tx"]
+            tx["wif_sigs"] = [self.resolver.get_privkey(k.name) for k in tx["wif_sigs"]]
+            block_num, timestamp = act_args["source"]
+            if not self.put(self.ready, (block_num, timestamp, tx)):
+                return
+        self.put(self.ready, None)
+        return
+
+    def fail(self, tx, e):
+        self.tracker.discard(tx)
+        with self.lock:
+            self.failed += 1
+            self.fail_file.write(json.dumps(["submit_transaction", {"tx" : tx}, str(e)])+"\n")
+            self.fail_file.flush()
+        if self.die_on_fail:
+            raise e
+        return
+
+    def broadcast(self, tx):
+        try:
+            self.target.network_broadcast_api.broadcast_transaction(trx=tx)
+        except Exception as e:
+            self.fail(tx, e)
+            return
+        with self.lock:
+            self.submitted += 1
+        return
+
+    def submit(self):
+        cached_dgpo = submit.CachedDgpo(steemd=self.target)
+        # Signing is done here, in order, broadcasting by the pool
+        with concurrent.futures.ThreadPoolExecutor(self.submitters) as pool:
+            pending = []
+            pending_block = None
+            for block_num, timestamp, tx in self.take(self.ready):
+                if block_num != pending_block:
+                    # A block may depend on the ones before it
+                    for future in pending:
+                        future.result()
+                    pending = []
+                    pending_block = block_num
+                try:
+                    tx = submit.sign_transaction(tx, self.signer, cached_dgpo.get())
+                except Exception as e:
+                    self.fail(tx, e)
+                    continue
+                # Recorded first, as the transaction may be included before broadcast returns
+                self.tracker.sent(tx, block_num, timestamp)
+                pending.append(pool.submit(self.broadcast, tx))
+            for future in pending:
+                future.result()
+        self.drained.set()
+        return
+
+    def track(self, head):
+        def done():
+            return self.stop.is_set() or (self.drained.is_set() and self.tracker.waiting() == 0)
+
+        for block_num, timestamp, transactions in follow_blocks(self.monitor, True, head + 1, stop=done):
+            self.tracker.included(timestamp, transactions)
+        return
+
+    def _run(self, stage):
+        try:
+            stage()
+        except Exception as e:
+            traceback.print_exc()
+            self.errors.append(e)
+            self.stop.set()
+        return
+
+    def report(self):
+        print("%s; queued %d blocks, %d transactions; %d submitted, %d failed" % (self.tracker.summary(),
+            self.blocks.qsize(), self.ready.qsize(), self.submitted, self.failed), file=sys.stderr)
+        return
+
+    def run(self, report_interval=30.0):
+        # Taken before anything is submitted, so that every testnet block
+        # that may include a ported transaction is tracked
+        head = self.monitor.database_api.get_dynamic_global_properties()["head_block_number"]
+        stages = [self.follow, self.port, self.submit, lambda : self.track(head)]
+        threads = [threading.Thread(target=self._run, args=(stage,), daemon=True) for stage in stages]
+        for thread in threads:
+            thread.start()
+        last_report = time.time()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                if self.stop.wait(POLL_INTERVAL):
+                    break
+                if time.time() - last_report >= report_interval:
+                    self.report()
+                    last_report = time.time()
+        except KeyboardInterrupt:
+            self.stop.set()
+        for thread in threads:
+            thread.join()
+        self.report()
+        for (op_type, reason), count in sorted(self.rules.dropped.items()):
+            print("Dropped %s (%s): %d" % (op_type, reason, count), file=sys.stderr)
+        if self.errors:
+            raise self.errors[0]
+        return
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog=argv[0], description="Mirror the source network onto a testnet as it is produced")
+    parser.add_argument("-c", "--conffile", default="gatling.conf", dest="conffile", metavar="FILE", help="Specify gatling configuration file")
+    parser.add_argument("--from-block", default=-1, type=int, dest="from_block", metavar="INT", help="Mirror from block_num (default: source head)")
+    parser.add_argument("--to-block", default=-1, type=int, dest="to_block", metavar="INT", help="Mirror up to block_num, then stop (default: follow the head)")
+    parser.add_argument("--accounts-from", default=None, dest="accounts_from", metavar="FILE", help="Drop operations involving accounts missing from this snapshot")
+    parser.add_argument("--preserve-transactions", dest="preserve_transactions", action="store_true", help="Port the operations of each transaction together, instead of one transaction per operation")
+    parser.add_argument("-s", "--stages", default=[], type=pipe.parse_stages, dest="stages", metavar="LIST", help="Comma-separated stages, from: prefixsub,amountsub")
+    parser.add_argument("--ratio", default="1.0", dest="ratio", metavar="FLOAT", help="Adjust amounts in op to ratio")
+    parser.add_argument("--floor-satoshi", default="1", dest="floor_satoshi", metavar="INT", help="Minimum amount after ratio is applied")
+    parser.add_argument("--get-dev-key", default="get_dev_key", dest="get_dev_key_exe", metavar="FILE", help="Specify path to get_dev_key tool")
+    parser.add_argument("--secret", default="", dest="secret", metavar="SECRET", help="Secret of the procedural keys")
+    parser.add_argument("-t", "--testserver", default="http://127.0.0.1:8190", dest="testserver", metavar="URL", help="Specify testnet steemd server")
+    parser.add_argument("--signer", default="sign_transaction", dest="sign_transaction_exe", metavar="FILE", help="Specify path to sign_transaction tool")
+    parser.add_argument("-n", "--chain-name", default="", dest="chain_name", metavar="CN", help="Specify chain name")
+    parser.add_argument("--chain-id", default="", dest="chain_id", metavar="CID", help="Specify chain ID")
+    parser.add_argument("-f", "--fail-file", default="-", dest="fail_file", metavar="FILE", help="File to write failures, - for stdout, die to quit on failure")
+    parser.add_argument("--timeout", default=5.0, type=float, dest="timeout", metavar="SECONDS", help="API timeout")
+    parser.add_argument("--submitters", default=SUBMITTERS, type=int, dest="submitters", metavar="INT", help="Transactions of a block broadcast at once (default: %d)" % SUBMITTERS)
+    parser.add_argument("--queue-size", default=100, type=int, dest="queue_size", metavar="INT", help="Blocks, and transactions, queued between stages (default: 100)")
+    parser.add_argument("--report-interval", default=30.0, type=float, dest="report_interval", metavar="SECONDS", help="Seconds between lag reports")
+    args = parser.parse_args(argv[1:])
+
+    if "keysub" in args.stages:
+        # Keys are always derived by the mirror itself
+        args.stages.remove("keysub")
+    if "amountsub" in args.stages and float(args.ratio) == 1.0:
+        print("Useless ratio: 1.0", file=sys.stderr)
+        return 1
+
+    with open(args.conffile, "r") as f:
+        conf = json.load(f)
+
+    die_on_fail = False
+    if args.fail_file == "-":
+        fail_file = sys.stdout
+    elif args.fail_file == "die":
+        fail_file = sys.stdout
+        die_on_fail = True
+    else:
+        fail_file = open(args.fail_file, "w")
+
+    source, is_appbase = gatling.connect_source(conf)
+
+    def connect_target():
+        return SteemInterface(SteemRemoteBackend(nodes=[args.testserver], appbase=True, min_timeout=args.timeout, max_timeout=args.timeout))
+
+    first_block = args.from_block
+    if first_block == -1:
+        first_block = source.database_api.get_dynamic_global_properties()["head_block_number"]
+
+    accounts = None
+    if args.accounts_from is not None:
+        accounts = gatling.snapshot_accounts(args.accounts_from)
+    rules = oprules.OperationRules(conf, prockey.ProceduralKeyDatabase(), accounts)
+    resolver = keysub.ProceduralKeyResolver(secret=args.secret, get_dev_key_exe=args.get_dev_key_exe)
+    signer = submit.TransactionSigner(sign_transaction_exe=args.sign_transaction_exe, chain_id=submit.get_chain_id(args.chain_name, args.chain_id))
+
+    mirror = Mirror(source, connect_target(), connect_target(), rules, resolver, signer, first_block, args.to_block,
+        is_appbase=is_appbase,
+        preserve_transactions=args.preserve_transactions,
+        stages=pipe.build_stages(args.stages, args),
+        queue_size=args.queue_size,
+        fail_file=fail_file,
+        die_on_fail=die_on_fail,
+        submitters=args.submitters,
+        )
+    mirror.run(args.report_interval)
+
+    if args.fail_file not in ("-", "die"):
+        fail_file.close()
+    return
+
+if __name__ == "__main__":
+    main(sys.argv)
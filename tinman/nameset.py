@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Compact set of account names.
+
+Mainnet has well over a million accounts, and a Python `set` of their names
+costs over 100 MB.  A `NameSet` packs the sorted names back to back in a
+single byte string with an array of offsets, about the size of the names
+themselves, and answers membership by binary search.
+"""
+
+import array
+import collections.abc
+
+class NameSetBuilder(object):
+    """
+    Accumulates names for a `NameSet`.  Adding names in sorted order (as
+    they appear in a snapshot) avoids a sort when building.
+    """
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array.array("Q", [0])
+        self.is_sorted = True
+        self.last = None
+        return
+
+    def add(self, name):
+        b = name.encode("utf-8")
+        if self.last is not None and b <= self.last:
+            if b == self.last:
+                return
+            self.is_sorted = False
+        self.last = b
+        self.data += b
+        self.offsets.append(len(self.data))
+        return
+
+    def build(self):
+        data, offsets = self.data, self.offsets
+        if not self.is_sorted:
+            names = sorted(set(bytes(data[offsets[i]:offsets[i+1]]) for i in range(len(offsets) - 1)))
+            data = bytearray()
+            offsets = array.array("Q", [0])
+            for b in names:
+                data += b
+                offsets.append(len(data))
+        return NameSet._from_packed(bytes(data), offsets)
+
+class NameSet(collections.abc.Set):
+    """
+    Immutable set of names, stored sorted and packed.
+
+    Example usage:
+
+    >>> names = NameSet(["bob", "alice"])
+    >>> "alice" in names, "carol" in names
+    (True, False)
+    """
+
+    def __init__(self, names=()):
+        builder = NameSetBuilder()
+        for name in names:
+            builder.add(name)
+        built = builder.build()
+        self._data = built._data
+        self._offsets = built._offsets
+        return
+
+    @classmethod
+    def _from_packed(cls, data, offsets):
+        self = cls.__new__(cls)
+        self._data = data
+        self._offsets = offsets
+        return self
+
+    def _get(self, i):
+        return self._data[self._offsets[i]:self._offsets[i+1]]
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield str(self._get(i), "utf-8")
+
+    def __contains__(self, name):
+        if not isinstance(name, str):
+            return False
+        b = name.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            v = self._get(mid)
+            if v < b:
+                lo = mid + 1
+            elif v > b:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def nbytes(self):
+        """ Approximate memory used by the packed names and offsets """
+        return len(self._data) + self._offsets.itemsize * len(self._offsets)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Rules deciding which mainnet operations gatling ports, and how they are signed.
+
+The rules are compiled once from the gatling configuration into a table
+keyed by operation type.  Each entry of `ported_operations` may have, besides
+`type` and `roles`:
+
+- `allow_accounts` : only port operations involving one of these accounts
+- `deny_accounts` : never port operations involving one of these accounts
+- `where` : a list of `[field, operator, value]` predicates that must all
+  hold, where field is a dotted path into the operation value (such as
+  `amount.nai`) and operator is one of `==`, `!=`, `<`, `<=`, `>`, `>=`,
+  `in`, `not in`
+- `ratio` : the fraction of the remaining operations to port, e.g. `0.1` for
+  every tenth
+
+`allow_accounts` and `deny_accounts` at the top level of the configuration
+apply to every type.  The accounts involved in an operation are the values
+of its ACCOUNT_FIELDS.
+
+Given the accounts that exist on the testnet (`KnownAccounts`), operations
+involving any other account are dropped too, as they would only fail there.
+"""
+
+import collections
+import operator
+
+CUSTOM_OPERATION_TYPES = ["custom_json_operation", "custom_binary_operation", "custom_operation"]
+
+ACCOUNT_FIELDS = [
+    "account", "account_to_recover", "account_to_reset", "agent", "author",
+    "challenged", "challenger", "creator", "current_reset_account",
+    "delegatee", "delegator", "from", "from_account", "new_account_name",
+    "new_recovery_account", "owner", "parent_author", "proxy", "publisher",
+    "receiver", "recovery_account", "required_auths", "required_posting_auths",
+    "reset_account", "to", "to_account", "voter", "who", "witness",
+]
+
+# A stronger role also satisfies the weaker ones
+ROLE_STRENGTH = ["posting", "active", "owner"]
+
+OPERATORS = {
+    "==" : operator.eq,
+    "!=" : operator.ne,
+    "<" : operator.lt,
+    "<=" : operator.le,
+    ">" : operator.gt,
+    ">=" : operator.ge,
+    "in" : lambda a, b : a in b,
+    "not in" : lambda a, b : a not in b,
+}
+
+# The accounts an operation needs to exist, new_account_name being created by it
+EXISTING_ACCOUNT_FIELDS = [field for field in ACCOUNT_FIELDS if field != "new_account_name"]
+
+def involved_accounts(value, fields=ACCOUNT_FIELDS):
+    """ Yields the account names in the fields (ACCOUNT_FIELDS by default) of an operation value """
+    for field in fields:
+        account = value.get(field)
+        if isinstance(account, str):
+            yield account
+        elif isinstance(account, list):
+            for a in account:
+                if isinstance(a, str):
+                    yield a
+
+def compile_predicate(field, op_name, expected):
+    """ Returns a function of an operation value, true if its field satisfies `op_name expected` """
+    if op_name not in OPERATORS:
+        raise RuntimeError("Unknown operator in where:", op_name)
+    compare = OPERATORS[op_name]
+    path = field.split(".")
+    numeric = isinstance(expected, (int, float)) and not isinstance(expected, bool)
+
+    def predicate(value):
+        for key in path:
+            if not isinstance(value, dict) or key not in value:
+                return False
+            value = value[key]
+        if numeric and isinstance(value, str):
+            # Amounts are strings in operations
+            try:
+                value = int(value)
+            except ValueError:
+                return False
+        try:
+            return compare(value, expected)
+        except TypeError:
+            return False
+    return predicate
+
+def compile_sampler(ratio):
+    """
+    Returns a function that is true for a ratio of its calls, evenly spread,
+    e.g. every tenth call for 0.1.
+    """
+    ratio = float(ratio)
+    if ratio >= 1.0:
+        return None
+    count = [0]
+
+    def sample():
+        # Computed from the count, so that rounding errors do not accumulate
+        count[0] += 1
+        return int(count[0] * ratio) > int((count[0] - 1) * ratio)
+    return sample
+
+def compile_role(op_type, roles):
+    """ Returns a function of an operation value, giving the role to sign it with """
+    if roles and len(roles) == 1:
+        # It's a trivial role that know about right in config.
+        role = roles[0]
+        return lambda value : role
+    elif op_type in CUSTOM_OPERATION_TYPES:
+        # custom_json_operation is usually posting, but sometimes there's an elevated role.
+        # The role is "posting" when required_posting_auths has keys, otherwise
+        # assume "active".
+        return lambda value : "posting" if len(value.get("required_posting_auths", [])) > 0 else "active"
+    else:
+        # Assume it's "active" as a fallback.
+        return lambda value : "active"
+
+def signing_roles(roles):
+    """
+    The roles to sign a transaction with, for operations requiring roles:
+    only the strongest of posting, active and owner is needed (a signature
+    that is not needed would make the transaction fail).
+    """
+    ranked = [role for role in ROLE_STRENGTH if role in roles]
+    return ranked[-1:] + sorted(role for role in roles if role not in ROLE_STRENGTH)
+
+class KnownAccounts(object):
+    """
+    The accounts of the testnet: names (any set, such as a `NameSet` of
+    the snapshot's accounts) and those created by ported operations.
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.created = set()
+        return
+
+    def __contains__(self, name):
+        return name in self.created or name in self.names
+
+    def add(self, name):
+        self.created.add(name)
+        return
+
+class OperationRule(object):
+    def __init__(self, ported_op, conf, accounts=None):
+        self.accounts = accounts
+        self.type = ported_op["type"]
+        self.role = compile_role(self.type, ported_op.get("roles"))
+        self.allow = set(conf.get("allow_accounts", [])) | set(ported_op.get("allow_accounts", []))
+        self.deny = set(conf.get("deny_accounts", [])) | set(ported_op.get("deny_accounts", []))
+        self.predicates = [compile_predicate(*p) for p in ported_op.get("where", [])]
+        self.sample = compile_sampler(ported_op.get("ratio", 1.0))
+        return
+
+    def reject(self, value):
+        """ Returns why value is not ported (see `OperationRules.dropped`), or None """
+        if self.allow or self.deny:
+            accounts = set(involved_accounts(value))
+            if self.deny and not self.deny.isdisjoint(accounts):
+                return "deny_accounts"
+            if self.allow and self.allow.isdisjoint(accounts):
+                return "allow_accounts"
+        for predicate in self.predicates:
+            if not predicate(value):
+                return "where"
+        if self.accounts is not None:
+            for account in involved_accounts(value, EXISTING_ACCOUNT_FIELDS):
+                # Empty names, such as the parent_author of a post, are no account
+                if account and account not in self.accounts:
+                    return "missing_accounts"
+        if self.sample is not None and not self.sample():
+            return "ratio"
+        return None
+
+class OperationRules(object):
+    """
+    Turns each mainnet operation into a transaction to port, or None if the
+    rules drop it.  Dropped operations are counted by type and reason in
+    `dropped`.  With accounts (a `KnownAccounts`), operations involving
+    accounts missing from it are dropped.
+    """
+
+    def __init__(self, conf, keydb, accounts=None):
+        self.signer = conf["transaction_signer"]
+        self.keydb = keydb
+        self.accounts = accounts
+        self.rules = {}
+        for ported_op in conf["ported_operations"]:
+            self.rules[ported_op["type"]] = OperationRule(ported_op, conf, accounts)
+        self.dropped = collections.Counter()
+        return
+
+    def types(self):
+        """ The set of operation types that may be ported """
+        return set(self.rules.keys())
+
+    def role(self, op):
+        """ Returns the role to sign op with, or None if op is dropped """
+        rule = self.rules.get(op["type"])
+        if rule is None:
+            self.dropped[(op["type"], "type")] += 1
+            return None
+        value = op["value"]
+        reason = rule.reject(value)
+        if reason is not None:
+            self.dropped[(op["type"], reason)] += 1
+            return None
+        if self.accounts is not None and value.get("new_account_name"):
+            self.accounts.add(value["new_account_name"])
+        return rule.role(value)
+
+    def transaction(self, ops, roles):
+        return {"operations" : ops, "wif_sigs" : [self.keydb.get_privkey(self.signer, role) for role in signing_roles(roles)]}
+
+    def __call__(self, op):
+        role = self.role(op)
+        if role is None:
+            return None
+        return self.transaction([op], [role])
+
+    def port_transaction(self, ops):
+        """
+        Returns the transactions porting the operations ops of one mainnet
+        transaction: a single transaction, unless operations are dropped,
+        which split it into the runs of operations between them.
+        """
+        txs = []
+        run = []
+        roles = set()
+        for op in ops:
+            role = self.role(op)
+            if role is None:
+                if run:
+                    txs.append(self.transaction(run, roles))
+                    run = []
+                    roles = set()
+                continue
+            run.append(op)
+            roles.add(role)
+        if run:
+            txs.append(self.transaction(run, roles))
+        return txs
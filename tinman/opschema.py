@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Operation transformers compiled from the operation schema.
+
+`simple_steem_client.serializer.operation_variants` lists the fields of
+every operation with their types.  An `OperationTransformer` compiles, per
+operation type, a function that visits only the fields (at any depth) of
+the given types, such as every `asset` or `public_key`, and skips the
+rest, such as `comment` bodies and `json_metadata`.  Operations missing from
+the schema are handed to a fallback that walks the whole value.
+"""
+
+from simple_steem_client.serializer.operation_variants import operation_variants
+from simple_steem_client.serializer.serializer import Serializer
+
+OPERATION_SUFFIX = "_operation"
+
+class _TypeProbe(object):
+    """
+    Stands in for a `Serializer` to find out what a type definition
+    serializes as: every method call returns its name and arguments.
+    """
+
+    def __getattr__(self, name):
+        return lambda value, *args : (name,) + args
+
+def _describe(typedef):
+    """
+    Returns the definition of typedef in terms of the `Serializer`
+    combinators (`fields`, `array`, `map`, `optional`, `extensions` and
+    `static_variant`), or None for an opaque type.
+    """
+    if isinstance(typedef, str):
+        fn = getattr(Serializer, typedef, None)
+        if fn is None:
+            return None
+    else:
+        fn = typedef
+    try:
+        result = fn(_TypeProbe(), None)
+    except Exception:
+        return None
+    if isinstance(result, tuple) and result and result[0] in ("fields", "array", "map", "optional", "extensions", "static_variant"):
+        return result
+    return None
+
+def _variant(value):
+    # Static variants are [type, value] or, from appbase, {"type", "value"}
+    if isinstance(value, list) and len(value) == 2:
+        return value[0], value[1]
+    if isinstance(value, dict) and "type" in value:
+        return value["type"], value.get("value")
+    return None, None
+
+class OperationTransformer(object):
+    """
+    Applies leaf to every field of one of types in an operation
+    (`{"type": ..., "value": ...}`), replacing the field with the result.
+    Operations of a type missing from the schema are passed (by value) to
+    fallback, which transforms them in place.
+
+    Example usage:
+
+    >>> t = OperationTransformer({"asset"}, lambda a : dict(a, amount="0"), lambda v : None)
+    >>> op = {"type": "transfer_operation", "value": {"amount": {"amount": "1"}, "memo": "1"}}
+    >>> t(op)["value"]
+    {'amount': {'amount': '0'}, 'memo': '1'}
+    """
+
+    def __init__(self, types, leaf, fallback):
+        self.types = set(types)
+        self.leaf = leaf
+        self.fallback = fallback
+        self.compiled = {}
+        self.operations = {}
+        for name, fields in operation_variants:
+            self.operations[name + OPERATION_SUFFIX] = self._compile(("fields", fields))
+        return
+
+    def _compile(self, typedef):
+        """
+        Returns a function transforming (and returning) a value of typedef,
+        or None if a typedef never holds any of types.
+        """
+        if isinstance(typedef, str):
+            if typedef in self.types:
+                return self.leaf
+            if typedef in self.compiled:
+                return self.compiled[typedef]
+            # Guards against recursive types
+            self.compiled[typedef] = None
+            self.compiled[typedef] = self._compile(_describe(typedef))
+            return self.compiled[typedef]
+        if typedef is None:
+            return None
+        if not isinstance(typedef, tuple):
+            return self._compile(_describe(typedef))
+
+        kind = typedef[0]
+        if kind == "fields":
+            return self._compile_fields(typedef[1])
+        elif kind == "array":
+            return self._compile_array(self._compile(typedef[1]))
+        elif kind == "map":
+            return self._compile_map(self._compile(typedef[1]), self._compile(typedef[2]))
+        elif kind == "optional":
+            # A missing optional is None, which every function skips
+            return self._compile(typedef[1])
+        elif kind == "extensions":
+            return self._compile_array(self._compile_static_variant(typedef[1]))
+        elif kind == "static_variant":
+            return self._compile_static_variant(typedef[1])
+        return None
+
+    def _compile_fields(self, pairs):
+        compiled = [(name, self._compile(fieldtype)) for name, fieldtype in pairs]
+        compiled = [(name, fn) for name, fn in compiled if fn is not None]
+        if not compiled:
+            return None
+
+        def transform_fields(value):
+            if isinstance(value, dict):
+                for name, fn in compiled:
+                    field = value.get(name)
+                    if field is not None:
+                        value[name] = fn(field)
+            return value
+        return transform_fields
+
+    def _compile_array(self, fn):
+        if fn is None:
+            return None
+
+        def transform_array(value):
+            if isinstance(value, list):
+                for i, e in enumerate(value):
+                    if e is not None:
+                        value[i] = fn(e)
+            return value
+        return transform_array
+
+    def _compile_map(self, key_fn, value_fn):
+        if key_fn is None and value_fn is None:
+            return None
+
+        def transform_map(value):
+            # Maps are lists of [key, value] pairs
+            if isinstance(value, list):
+                for pair in value:
+                    if isinstance(pair, list) and len(pair) == 2:
+                        if key_fn is not None and pair[0] is not None:
+                            pair[0] = key_fn(pair[0])
+                        if value_fn is not None and pair[1] is not None:
+                            pair[1] = value_fn(pair[1])
+            return value
+        return transform_map
+
+    def _compile_static_variant(self, variants):
+        compiled = {}
+        for name, variant_def in variants:
+            compiled[name] = self._compile(variant_def)
+        if all(fn is None for fn in compiled.values()):
+            return None
+
+        def transform_static_variant(value):
+            name, variant_value = _variant(value)
+            fn = compiled.get(name)
+            if fn is not None and variant_value is not None:
+                variant_value = fn(variant_value)
+                if isinstance(value, list):
+                    value[1] = variant_value
+                else:
+                    value["value"] = variant_value
+            elif name not in compiled and variant_value is not None:
+                self.fallback(variant_value)
+            return value
+        return transform_static_variant
+
+    def __call__(self, op):
+        op_type = op["type"]
+        if op_type not in self.operations:
+            self.fallback(op["value"])
+        else:
+            fn = self.operations[op_type]
+            if fn is not None:
+                op["value"] = fn(op["value"])
+        return op
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Runs several action filters in one process.
+
+`tinman pipe --stages keysub,prefixsub,amountsub` does the work of
+`tinman keysub | tinman prefixsub | tinman amountsub`, but each action is
+decoded once, passed through every stage as a Python object, and encoded
+once, instead of being decoded and encoded by every command and copied
+through a pipe between each.  With `--then submit`, the actions are
+submitted from the same process rather than written out.
+"""
+
+import argparse
+import json
+import sys
+
+from . import amountsub
+from . import keysub
+from . import prefixsub
+from . import submit
+from . import util
+
+STAGES = ["keysub", "prefixsub", "amountsub"]
+
+def build_stages(stages, args):
+    """
+    Returns a function that chains stages (names from STAGES) over an
+    iterable of decoded actions, configured by args.
+    """
+    filters = []
+    for stage in stages:
+        if stage == "keysub":
+            resolver = keysub.ProceduralKeyResolver(get_dev_key_exe=args.get_dev_key_exe)
+            filters.append(lambda actions, resolver=resolver : keysub.substitute_actions(actions, resolver))
+        elif stage == "prefixsub":
+            filters.append(prefixsub.transform_actions)
+        elif stage == "amountsub":
+            ratio = float(args.ratio)
+            floor_satoshi = int(args.floor_satoshi)
+            filters.append(lambda actions : amountsub.transform_actions(actions, ratio, floor_satoshi))
+        else:
+            raise RuntimeError("Unknown stage:", stage)
+
+    def run(actions):
+        for f in filters:
+            actions = f(actions)
+        return actions
+    return run
+
+def parse_stages(s):
+    stages = [stage.strip() for stage in s.split(",") if stage.strip()]
+    for stage in stages:
+        if stage not in STAGES:
+            raise argparse.ArgumentTypeError("unknown stage %r, choose from %s" % (stage, ",".join(STAGES)))
+    return stages
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog=argv[0], description="Run action filters in one process")
+    parser.add_argument("-i", "--input-file", default="-", dest="input_file", metavar="FILE", help="File to read actions from")
+    parser.add_argument("-o", "--output-file", default="-", dest="output_file", metavar="FILE", help="File to write actions to")
+    parser.add_argument("-s", "--stages", default=[], type=parse_stages, dest="stages", metavar="LIST", help="Comma-separated stages, from: " + ",".join(STAGES))
+    parser.add_argument("--then", default=None, choices=["submit"], dest="then", help="Submit the actions instead of writing them")
+    keysub_options = parser.add_argument_group("keysub options")
+    keysub_options.add_argument("--get-dev-key", default="get_dev_key", dest="get_dev_key_exe", metavar="FILE", help="Specify path to get_dev_key tool")
+    amountsub_options = parser.add_argument_group("amountsub options")
+    amountsub_options.add_argument("--ratio", default="1.0", dest="ratio", metavar="FLOAT", help="Adjust amounts in op to ratio")
+    amountsub_options.add_argument("--floor-satoshi", default="1", dest="floor_satoshi", metavar="INT", help="Minimum amount after ratio is applied")
+    submit.add_arguments(parser.add_argument_group("submit options (with --then submit)"))
+    args = parser.parse_args(argv[1:])
+
+    if "amountsub" in args.stages and float(args.ratio) == 1.0:
+        print("Useless ratio: 1.0", file=sys.stderr)
+        return 1
+
+    if args.input_file == "-":
+        input_file = sys.stdin
+    else:
+        input_file = open(args.input_file, "r")
+
+    if args.then is None:
+        if args.output_file == "-":
+            output_file = sys.stdout
+        else:
+            output_file = open(args.output_file, "w")
+    else:
+        output_file = None
+
+    lines = (line.strip() for line in util.read_lines(input_file, output_file))
+    actions = (json.loads(line) for line in lines if line)
+    actions = build_stages(args.stages, args)(actions)
+
+    if args.then == "submit":
+        submit.submit_actions(actions, args)
+    else:
+        for action in actions:
+            output_file.write(json.dumps(action, separators=(",", ":")))
+            output_file.write("\n")
+        output_file.flush()
+
+    if args.input_file != "-":
+        input_file.close()
+    if args.output_file != "-" and output_file is not None:
+        output_file.close()
+    return
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+from . import opschema
 from . import util
 
 import argparse
@@ -37,6 +38,35 @@ def transform_prefix(object):
         else:
             return object
 
+def transform_key(key):
+    if isinstance(key, str):
+        return transform_prefix(key)
+    return key
+
+# Only public_key fields can hold keys, operations missing from the schema
+# are walked whole
+OPERATION_TRANSFORMER = opschema.OperationTransformer(["public_key"], transform_key, transform_prefix)
+
+def transform_operation(op):
+    """ Transforms the keys of op (`{"type": ..., "value": ...}`) in place """
+    return OPERATION_TRANSFORMER(op)
+
+def transform_actions(actions):
+    """
+    Yields the decoded `submit_transaction` actions of actions with their
+    operations transformed in place, dropping every other action but
+    `source_block` markers.
+    """
+    for act, act_args in actions:
+        if act == "source_block":
+            yield [act, act_args]
+            continue
+        if act != "submit_transaction" or not act_args["tx"]:
+            continue
+        for op in act_args["tx"]["operations"]:
+            transform_operation(op)
+        yield [act, act_args]
+
 def main(argv):
     parser = argparse.ArgumentParser(prog=argv[0], description="Substitute prefix")
     parser.add_argument("-i", "--input-file", default="-", dest="input_file", metavar="FILE", help="File to read actions from")
@@ -53,23 +83,34 @@ def main(argv):
     else:
         input_file = open(args.input_file, "r")
 
-    for line in input_file:
+    def transform(line):
         line = line.strip()
+        if not line:
+            return None
+        name = util.action_name(line)
+        if name == "source_block":
+            return line
+        if name is not None and name != "submit_transaction":
+            return None
+        # Without a mainnet prefix anywhere in the line there is nothing to transform
+        if name is not None and MAINNET_PREFIX not in line and '"operations"' in line:
+            return line
         act, act_args = json.loads(line)
+        if act == "source_block":
+            return line
         if act != "submit_transaction":
-            continue
+            return None
         
         if not act_args["tx"]:
-            continue
+            return None
         
         for op in act_args["tx"]["operations"]:
-            transform_prefix(op["value"])
+            transform_operation(op)
         
-        transformed_line = json.dumps([act, act_args])
-        
-        output_file.write(transformed_line)
-        output_file.write("\n")
-        output_file.flush()
+        # Encoded as the lines passed through are
+        return util.action_to_str([act, act_args])
+
+    util.transform_lines(input_file, output_file, transform)
     if args.input_file != "-":
         input_file.close()
     if args.output_file != "-":
@@ -78,17 +78,22 @@ class PubkeySerializer(object):
     serialized JSON, and use that as the escape.
 
     For the first pass, we have no prefix.
+
+    The number of keys serialized is kept in `count`.
     """
 
     def __init__(self,
         esc="",
         ):
         self.esc = esc
+        self.count = 0
         return
 
     def __call__(self, obj):
         if isinstance(obj, ProceduralPublicKey):
+            self.count += 1
             return self.esc + "publickey:" + obj.name + self.esc
         if isinstance(obj, ProceduralPrivateKey):
+            self.count += 1
             return self.esc + "privatekey:" + obj.name + self.esc
         return obj
@@ -5,29 +5,214 @@ import collections
 import heapq
 import json
 import sys
+import tempfile
 
 from . import __version__
+from . import colsnap
+from . import jsonlsnap
+from . import snapindex
+
+class RewindableReader(object):
+    """
+    Wraps a binary stream (which may be a pipe), keeping what is read until
+    `rewind`, after which that is read again before the rest of the stream.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.kept = bytearray()
+        self.replay = None
+        return
+
+    def rewind(self):
+        self.replay = memoryview(bytes(self.kept))
+        self.kept = None
+        return
+
+    def read(self, size=-1):
+        if self.replay is None:
+            data = self.f.read(size)
+            self.kept += data
+            return data
+        if len(self.replay) == 0:
+            return self.f.read(size)
+        if size < 0:
+            data = bytes(self.replay) + self.f.read()
+            self.replay = self.replay[len(self.replay):]
+            return data
+        data = bytes(self.replay[:size])
+        self.replay = self.replay[len(data):]
+        return data
+
+def iterate_json_accounts(f, header, ijson):
+    """
+    Yields the accounts of the JSON snapshot read from binary stream f, in a
+    single pass.  The `metadata` and `dynamic_global_properties` that come
+    before the accounts are stored in header once the first account is
+    yielded.
+    """
+    from ijson.common import ObjectBuilder
+    
+    reader = RewindableReader(f)
+    builder = None
+    for prefix, event, value in ijson.parse(reader):
+        if builder is None:
+            if prefix in ("metadata", "dynamic_global_properties") and event == "start_map":
+                key = prefix
+                builder = ObjectBuilder()
+            elif prefix in ("accounts", "witnesses"):
+                break
+            else:
+                continue
+        builder.event(event, value)
+        if prefix == key and event == "end_map":
+            header[key] = builder.value
+            builder = None
+    # Only the header was kept, the accounts are parsed by the backend
+    reader.rewind()
+    yield from ijson.items(reader, "accounts.item")
+
+def top_accounts(accounts, size, silent=False):
+    """
+    Returns the size accounts with the largest balances, in the order they
+    come in accounts, keeping no more than size accounts in memory.  Ties
+    favor earlier accounts, as with `heapq.nlargest`.
+    """
+    heap = []
+    count = 0
+    for a in accounts:
+        entry = (int(a["balance"]["amount"]), -count, a)
+        if len(heap) < size:
+            heapq.heappush(heap, entry)
+        elif size > 0 and entry[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, entry)
+        count += 1
+        if not silent and count % 100000 == 0:
+            print("Accounts so far:", count, file=sys.stderr)
+    return [a for balance, seq, a in sorted(heap, key=lambda e : -e[1])]
+
+def sample_snapshot(metadata, dgpo, accounts):
+    snapshot = {
+      "metadata": {"snapshot:semver": __version__},
+      "dynamic_global_properties": {
+        "total_vesting_fund_steem": dgpo.get("total_vesting_fund_steem", {})
+      },
+      "accounts": accounts,
+      "witnesses": []
+    }
+    if "snapshot:origin_api" in metadata:
+        snapshot["metadata"]["snapshot:origin_api"] = metadata["snapshot:origin_api"]
+    return snapshot
+
+def account_refs(a, votes=False):
+    """
+    Names of the accounts a references in the `account_auths` of its
+    authorities, and with votes, its proxy and witness votes.
+    """
+    refs = set()
+    for role in colsnap.AUTHORITY_ROLES:
+        for name, weight in a.get(role, {}).get("account_auths", []):
+            refs.add(name)
+    if votes:
+        if a.get("proxy"):
+            refs.add(a["proxy"])
+        refs.update(a.get("witness_votes", []))
+    refs.discard(a["name"])
+    return refs
+
+def close_names(seeds, refs, max_added):
+    """
+    Returns the set of seeds and the names they transitively reference
+    through refs (a dict of name to referenced names), adding at most
+    max_added names breadth first, and the number of names left out by
+    that cap.
+    """
+    names = set(seeds)
+    left_out = set()
+    queue = collections.deque(seeds)
+    added = 0
+    while queue:
+        for name in refs.get(queue.popleft(), ()):
+            if name in names:
+                continue
+            if added >= max_added:
+                left_out.add(name)
+                continue
+            names.add(name)
+            queue.append(name)
+            added += 1
+    return names, len(left_out)
+
+def closure_accounts(iterate, size, max_added, votes=False, spill=False, silent=False):
+    """
+    Returns the size accounts with the largest balances and the accounts
+    they depend on (see `account_refs` and `close_names`), in snapshot
+    order.  Calls iterate twice for an iterator of the accounts, unless
+    spill is set (for streams that can only be read once), in which case
+    the accounts are spilled to a temporary file on the first pass.
+    """
+    refs = {}
+    spill_file = tempfile.TemporaryFile("w+") if spill else None
+    
+    def first_pass():
+        for a in iterate():
+            a_refs = account_refs(a, votes)
+            if a_refs:
+                refs[a["name"]] = sorted(a_refs)
+            if spill_file is not None:
+                # ijson parses non-integer numbers as Decimal
+                spill_file.write(json.dumps(a, separators=(",", ":"), default=float) + "\n")
+            yield a
+    
+    seeds = [a["name"] for a in top_accounts(first_pass(), size, silent)]
+    names, left_out = close_names(seeds, refs, max_added)
+    refs = None
+    
+    if not silent:
+        print("Found top accounts:", len(seeds), file=sys.stderr)
+        print("Found referenced accounts:", len(names) - len(seeds), file=sys.stderr)
+        if left_out > 0:
+            print("WARNING: Closure truncated at", max_added, "referenced accounts, left out:", left_out, file=sys.stderr)
+    
+    if spill_file is not None:
+        spill_file.seek(0)
+        accounts = (json.loads(line) for line in spill_file)
+    else:
+        accounts = iterate()
+    selected = [a for a in accounts if a["name"] in names]
+    
+    if spill_file is not None:
+        spill_file.close()
+    if not silent and len(selected) < len(names):
+        print("WARNING: Referenced accounts missing from snapshot:", len(names) - len(selected), file=sys.stderr)
+    return selected
 
 def main(argv):
     parser = argparse.ArgumentParser(prog=argv[0], description="Generate transactions for Steem testnet")
     parser.add_argument("-i", "--infile", default="", dest="infile", metavar="FILE", help="Specify input snapshot, - means stdin")
     parser.add_argument("-o", "--outfile", default="-", dest="outfile", metavar="FILE", help="Specify output snapshot, - means stdout")
+    parser.add_argument("-n", "--size", default=2000, type=int, dest="size", metavar="COUNT", help="Number of accounts to sample")
+    parser.add_argument("--closure", action="store_true", dest="closure", help="Also sample the accounts the sampled accounts reference in their authorities, transitively")
+    parser.add_argument("--closure-max", default=10000, type=int, dest="closure_max", metavar="COUNT", help="Maximum number of referenced accounts added by --closure")
+    parser.add_argument("--closure-votes", action="store_true", dest="closure_votes", help="With --closure, also follow proxies and witness votes")
     args = parser.parse_args(argv[1:])
 
-    sample_size = 2000
+    sample_size = args.size
 
-    if args.infile == "-":
-        # We do not have random access, so we must load the whole thing in
-        # memory.  And we cannot output messages.
+    # Messages go to stderr, stdout may be the sample
+    infile = None
+    columnar = None
+    if args.infile != "-" and colsnap.is_columnar(args.infile):
+        columnar = colsnap.ColumnarSnapshot(args.infile)
+        header = {"metadata": columnar.metadata, "dynamic_global_properties": columnar.dgpo}
+        iterate = columnar.iterate_accounts
+    elif args.infile != "-" and jsonlsnap.is_jsonl(args.infile):
+        # The header is one line, and accounts are parsed line by line.
         
-        infile = sys.stdin
-        
-        snapshot = json.load(infile, object_pairs_hook=collections.OrderedDict)
-        snapshot["witnesses"] = []
-        snapshot["accounts"] = heapq.nlargest(sample_size, snapshot["accounts"],
-            key=lambda a : int(a["balance"]["amount"]))
+        header = jsonlsnap.read_header(args.infile)
+        iterate = lambda : jsonlsnap.iterate_accounts(args.infile)
     else:
-        # We have random access!
+        # Files and stdin alike are read in a single streaming pass.
         
         try:
             import ijson.backends.yajl2_cffi as ijson
@@ -38,76 +223,57 @@ def main(argv):
             YAJL2_CFFI_AVAILABLE = False
         
         if not YAJL2_CFFI_AVAILABLE:
-            print("Warning: could not load yajl, falling back to default backend for ijson.")
-        
-        infile = open(args.infile, "rb")
-
-        account_balances = {}
-        snapshot = {
-          "metadata": {"snapshot:semver": __version__},
-          "dynamic_global_properties": {
-            "total_vesting_fund_steem": {}
-          },
-          "accounts": [],
-          "witnesses": []
-        }
-        
-        for prefix, event, value in ijson.parse(infile):
-            if prefix == "metadata.snapshot:origin_api":
-                snapshot["metadata"]["snapshot:origin_api"] = value
-                break
-        
-        print("Captured:", snapshot["metadata"])
+            print("Warning: could not load yajl, falling back to default backend for ijson.", file=sys.stderr)
         
-        fund = snapshot["dynamic_global_properties"]["total_vesting_fund_steem"]
-        infile.seek(0)
-        for prefix, event, value in ijson.parse(infile):
-            if prefix == "dynamic_global_properties.total_vesting_fund_steem.amount":
-                fund["amount"] = value
-            elif prefix == "dynamic_global_properties.total_vesting_fund_steem.precision":
-                fund["precision"] = value
-            elif prefix == "dynamic_global_properties.total_vesting_fund_steem.nai":
-                fund["nai"] = value
-            if len(fund.keys()) > 2:
-                break
+        if args.infile == "-":
+            infile = sys.stdin.buffer
+            index = None
+        else:
+            infile = open(args.infile, "rb")
+            index = snapindex.read_index(args.infile)
         
-        print("Captured:", snapshot["dynamic_global_properties"])
-        
-        infile.seek(0)
-        for a in ijson.items(infile, "accounts.item"):
-            account_balances[a["name"]] = a["balance"]["amount"]
+        if index is not None:
+            # With an index, only the accounts array is parsed
+            header = index
+            iterate = lambda : snapindex.iterate_accounts(infile, index, ijson)
+        else:
+            header = {"metadata": {}, "dynamic_global_properties": {}}
             
-            if len(account_balances) % 100000 == 0:
-                print("Balances so far:", len(account_balances))
+            def iterate():
+                if args.infile != "-":
+                    infile.seek(0)
+                return iterate_json_accounts(infile, header, ijson)
+    
+    if args.closure:
+        accounts = closure_accounts(iterate, sample_size, args.closure_max,
+            votes=args.closure_votes, spill=(args.infile == "-"))
+    elif columnar is not None:
+        # Only the balance column needs to be read to rank accounts.
         
-        top_accounts = heapq.nlargest(sample_size, account_balances,
-            key=lambda a : int(account_balances[a]))
+        balances = columnar.amounts["balance"]
+        top = heapq.nlargest(sample_size, range(len(columnar)), key=balances.__getitem__)
+        accounts = [columnar.account(i) for i in sorted(top)]
         
-        print('Found top accounts:', len(top_accounts))
+        print("Found top accounts:", len(accounts), file=sys.stderr)
+    else:
+        # Only the top accounts are kept in memory.
         
-        infile.seek(0)
-        for a in ijson.items(infile, "accounts.item"):
-            t = len(top_accounts)
-            s = len(snapshot["accounts"])
-            
-            if s >= t:
-                break
-                    
-            if a["name"] in top_accounts:
-                snapshot["accounts"].append(a)
-                
-                if s > 0 and s % 100 == 0:
-                    print("Samples created:", s)
-                    print("\t", '%.2f%% complete' % (s / t * 100.0))
-                
+        accounts = top_accounts(iterate(), sample_size)
+        
+        print("Found top accounts:", len(accounts), file=sys.stderr)
+    
+    snapshot = sample_snapshot(header["metadata"], header["dynamic_global_properties"], accounts)
+    
+    if infile is not None and args.infile != "-":
         infile.close()
 
     if args.outfile == "-":
         outfile = sys.stdout
     else:
-        print("Dumping sample ...")
+        print("Dumping sample ...", file=sys.stderr)
         outfile = open(args.outfile, "w")
-    json.dump(snapshot, outfile, separators=(",", ":"))
+    # ijson parses non-integer numbers as Decimal
+    json.dump(snapshot, outfile, separators=(",", ":"), default=float)
 
     if args.outfile != "-":
         outfile.close()
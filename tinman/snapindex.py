@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Sidecar index of a snapshot file.
+
+`tinman snapshot` writes `<snapshot>.index.json` next to the snapshot, so
+consumers can get the metadata and dynamic global properties without
+scanning, and jump straight to the accounts or witnesses.  It holds:
+
+- `metadata` and `dynamic_global_properties`, as in the snapshot
+- `accounts:offset` and `accounts:end` : the byte range of the accounts
+  array (of the account lines, for JSON Lines)
+- `witnesses:offset` : the byte offset of the witnesses array (of the
+  trailer line, for JSON Lines), and for JSON `witnesses:end`, where the
+  array ends
+- `snapshot:size` : the size of the snapshot, an index for a snapshot of
+  another size is stale and ignored
+"""
+
+import json
+import os
+import sys
+
+from . import __version__
+
+INDEX_SUFFIX = ".index.json"
+
+def index_path(snapshot_path):
+    return snapshot_path + INDEX_SUFFIX
+
+class OffsetWriter(object):
+    """ Wraps a text file, counting the bytes written to it """
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = 0
+        return
+
+    def write(self, s):
+        self.f.write(s)
+        self.offset += len(s.encode("utf-8"))
+        return
+
+    def flush(self):
+        self.f.flush()
+        return
+
+    def close(self):
+        self.f.close()
+        return
+
+class RangeReader(object):
+    """ Reads a binary file only from byte start up to byte stop """
+
+    def __init__(self, f, start, stop):
+        f.seek(start)
+        self.f = f
+        self.remaining = stop - start
+        return
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.f.read(size)
+        self.remaining -= len(data)
+        return data
+
+def write_index(snapshot_path, index):
+    index = dict(index)
+    index["index:semver"] = __version__
+    index["snapshot:size"] = os.path.getsize(snapshot_path)
+    path = index_path(snapshot_path)
+    with open(path + ".tmp", "w") as f:
+        # ijson parses non-integer numbers as Decimal
+        json.dump(index, f, separators=(",", ":"), sort_keys=True, default=float)
+    os.replace(path + ".tmp", path)
+    return
+
+def read_index(snapshot_path):
+    """ Returns the index of snapshot_path, or None if it has none or it is stale """
+    path = index_path(snapshot_path)
+    if not os.path.isfile(snapshot_path) or not os.path.isfile(path):
+        return None
+    with open(path, "r") as f:
+        index = json.load(f)
+    if index.get("snapshot:size") != os.path.getsize(snapshot_path):
+        print("WARNING: Ignoring stale snapshot index:", path, file=sys.stderr)
+        return None
+    return index
+
+def iterate_accounts(f, index, ijson):
+    """
+    Yields the accounts of the JSON snapshot open as binary file f, parsing
+    only the accounts array located by index.
+    """
+    yield from ijson.items(RangeReader(f, index["accounts:offset"], index["accounts:end"]), "item")
+
+def iterate_witnesses(f, index, ijson):
+    """
+    Yields the witnesses of the JSON snapshot open as binary file f, parsing
+    only the witnesses array located by index.
+    """
+    yield from ijson.items(RangeReader(f, index["witnesses:offset"], index["witnesses:end"]), "item")
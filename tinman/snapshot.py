@@ -7,14 +7,31 @@ https://github.com/steemit/tinman/issues/16
 
 import argparse
 import json
+import re
 import sys
 from simple_steem_client.client import SteemRemoteBackend, SteemInterface, SteemRPCException
 
 from . import __version__
+from . import colsnap
+from . import jsonlsnap
+from . import snapindex
+from . import txgen
+from . import util
 
 DATABASE_API_SINGLE_QUERY_LIMIT = 1000
 MAX_RETRY = 30
 
+ACCOUNT_NAME_PATTERN = re.compile(r"^[a-z][a-z0-9\-.]{2,15}$")
+
+# Named projections for --fields
+FIELD_PROFILES = {
+  "txgen" : txgen.SPILLED_ACCOUNT_FIELDS,
+}
+
+# Free text operation fields, never account names
+NON_ACCOUNT_FIELDS = {"permlink", "parent_permlink", "title", "body",
+  "json_metadata", "posting_json_metadata", "json", "memo", "id", "url"}
+
 # Whitelist of exceptions from transaction source (Mainnet).
 TRANSACTION_SOURCE_RETRYABLE_ERRORS = [
   "Unable to acquire database lock",
@@ -89,19 +106,47 @@ def list_all_witnesses(steemd):
 
 # Helper function to reuse code related to collection dump across different usecases
 def dump_collection(c, outfile):
-    """ Allows to dump collection into JSON string. """
+    """
+    Allows to dump collection into JSON string.  Returns the object count.
+    """
     outfile.write("[\n")
-    first = True
+    count = 0
     for o in c:
-        if not first:
+        if count > 0:
             outfile.write(",\n")
-        json.dump( o, outfile, separators=(",", ":"), sort_keys=True )
-        first = False
+        # ijson parses non-integer numbers as Decimal
+        outfile.write(json.dumps( o, separators=(",", ":"), sort_keys=True, default=float ))
+        count += 1
     outfile.write("\n]")
+    return count
+
+def parse_fields(fields):
+    """
+    Returns the account fields named by a profile of FIELD_PROFILES or by a
+    comma separated list, always including the name.
+
+    Example usage:
+
+    >>> snapshot.parse_fields("balance,memo_key")
+    ['name', 'balance', 'memo_key']
+    """
+    if fields in FIELD_PROFILES:
+        fields = list(FIELD_PROFILES[fields])
+    else:
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    if "name" not in fields:
+        fields.insert(0, "name")
+    return fields
+
+def project_accounts(accounts, fields=None):
+    """ Strips the accounts to the given fields, if any """
+    if fields is None:
+        return accounts
+    return ({k : a[k] for k in fields if k in a} for a in accounts)
 
-def dump_all_accounts(steemd, outfile):
+def dump_all_accounts(steemd, outfile, fields=None):
     """ Allows to dump into the snapshot all accounts provided by Steem Net"""
-    dump_collection(list_all_accounts(steemd), outfile)
+    return dump_collection(project_accounts(list_all_accounts(steemd), fields), outfile)
 
 def dump_all_witnesses(steemd, outfile):
     """ Allows to dump into the snapshot all witnesses provided by Steem Net"""
@@ -112,35 +157,278 @@ def dump_dgpo(steemd, outfile):
         provided by Steem Net
     """
     dgpo = steemd.database_api.get_dynamic_global_properties(x=None)
-    json.dump( dgpo, outfile, separators=(",", ":"), sort_keys=True )
+    outfile.write(json.dumps( dgpo, separators=(",", ":"), sort_keys=True ))
+    return dgpo
+
+def collect_account_names(value, names):
+    """ Adds every string in an operation's value that could be an account name to names """
+    if isinstance(value, str):
+        if ACCOUNT_NAME_PATTERN.match(value):
+            names.add(value)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            if k not in NON_ACCOUNT_FIELDS:
+                collect_account_names(v, names)
+    elif isinstance(value, list):
+        for v in value:
+            collect_account_names(v, names)
+    return names
+
+def iterate_virtual_operations(steemd, min_block_number, max_block_number):
+    """ Yields the virtual operations (rewards, interest, fills...) of a range of blocks """
+    for block_num in range(min_block_number, max_block_number):
+        result = steemd.account_history_api.get_ops_in_block(block_num=block_num, only_virtual=True)
+        for o in result["ops"]:
+            yield o["op"]
+
+def list_touched_accounts(steemd, min_block_number, max_block_number, virtual_ops=True, changed_proxy=None):
+    """
+    Returns the names of accounts named by the operations between two
+    blocks, anything that looks like a name counting.  Balances also change
+    through virtual operations, which require the node's
+    account_history_api.  The accounts that set their proxy are also added
+    to changed_proxy, if given.  See `add_proxies` for the accounts changed
+    without being named.
+    """
+    names = set()
+    for op in util.iterate_operations_from(steemd, True, min_block_number, max_block_number, set()):
+        collect_account_names(op["value"], names)
+        if changed_proxy is not None and op["type"] == "account_witness_proxy_operation":
+            changed_proxy.add(op["value"]["account"])
+    if virtual_ops:
+        for op in iterate_virtual_operations(steemd, min_block_number, max_block_number):
+            collect_account_names(op["value"], names)
+    return names
+
+def add_proxies(steemd, names):
+    """
+    Adds to the set names the proxies of their accounts, then the proxies
+    of those, and so on: their proxied_vsf_votes change with the votes of
+    the accounts proxying to them, although no operation names them.
+    Returns names.
+    """
+    pending = set(names)
+    while pending:
+        proxies = {a["proxy"] for a in find_accounts(steemd, pending) if a.get("proxy")}
+        pending = proxies - names
+        names |= pending
+    return names
+
+def find_accounts(steemd, names):
+    """ Generator function fetching the accounts with the given names, in name order """
+    names = sorted(names)
+    for start in range(0, len(names), DATABASE_API_SINGLE_QUERY_LIMIT):
+        result = steemd.database_api.find_accounts(accounts=names[start:start + DATABASE_API_SINGLE_QUERY_LIMIT])
+        yield from sorted(result["accounts"], key=lambda a : a["name"])
+
+def merge_accounts(old_accounts, new_accounts):
+    """
+    Merges two iterables of accounts sorted by name, an account of
+    new_accounts replacing the same named account of old_accounts.
+    """
+    old_accounts = iter(old_accounts)
+    old = next(old_accounts, None)
+    for a in new_accounts:
+        while old is not None and old["name"] < a["name"]:
+            yield old
+            old = next(old_accounts, None)
+        if old is not None and old["name"] == a["name"]:
+            old = next(old_accounts, None)
+        yield a
+    while old is not None:
+        yield old
+        old = next(old_accounts, None)
+
+def read_base_head_block_number(base_file):
+    try:
+        import ijson.backends.yajl2_cffi as ijson
+    except ImportError:
+        import ijson
+    
+    if colsnap.is_columnar(base_file):
+        raise RuntimeError("Snapshot to update must be JSON:", base_file)
+    index = snapindex.read_index(base_file)
+    if index is not None:
+        return index["dynamic_global_properties"].get("head_block_number")
+    if jsonlsnap.is_jsonl(base_file):
+        return jsonlsnap.read_header(base_file)["dynamic_global_properties"].get("head_block_number")
+    with open(base_file, "rb") as f:
+        return next(ijson.items(f, "dynamic_global_properties.head_block_number"), None)
+
+def read_base_metadata(base_file):
+    try:
+        import ijson.backends.yajl2_cffi as ijson
+    except ImportError:
+        import ijson
+    
+    index = snapindex.read_index(base_file)
+    if index is not None:
+        return index["metadata"]
+    if jsonlsnap.is_jsonl(base_file):
+        return jsonlsnap.read_header(base_file)["metadata"]
+    with open(base_file, "rb") as f:
+        return next(ijson.items(f, "metadata"), {})
+
+def check_base_fields(base_file, fields):
+    """
+    The accounts of an older snapshot are merged as they are, so it must have
+    been dumped with the same `--fields` (None meaning all fields)
+    """
+    base_fields = read_base_metadata(base_file).get("snapshot:fields")
+    if base_fields is None and fields is None:
+        return
+    if base_fields is None or fields is None or set(base_fields) != set(fields):
+        raise RuntimeError("Snapshot to update has other fields:", base_file, base_fields, fields)
+
+def iterate_base_accounts(base_file):
+    try:
+        import ijson.backends.yajl2_cffi as ijson
+    except ImportError:
+        import ijson
+    
+    if jsonlsnap.is_jsonl(base_file):
+        yield from jsonlsnap.iterate_accounts(base_file)
+        return
+    index = snapindex.read_index(base_file)
+    with open(base_file, "rb") as f:
+        if index is not None:
+            yield from snapindex.iterate_accounts(f, index, ijson)
+        else:
+            yield from ijson.items(f, "accounts.item")
+
+def read_base_proxies(base_file, names):
+    """ Returns the proxies, in an older snapshot, of the accounts named names """
+    return {a["proxy"] for a in iterate_base_accounts(base_file) if a["name"] in names and a.get("proxy")}
+
+def iterate_accounts_since(steemd, base_file, head_block_number, virtual_ops=True):
+    """
+    Generator function providing the accounts of an older snapshot,
+    refetching only those touched by blocks since that snapshot was taken
+    """
+    base_head_block_number = read_base_head_block_number(base_file)
+    if base_head_block_number is None:
+        raise RuntimeError("Snapshot has no head_block_number:", base_file)
+    
+    changed_proxy = set()
+    names = list_touched_accounts(steemd, base_head_block_number + 1, head_block_number + 1, virtual_ops, changed_proxy)
+    if changed_proxy:
+        # Their former proxies lost their votes
+        names |= read_base_proxies(base_file, changed_proxy)
+    add_proxies(steemd, names)
+    print("Accounts touched since block %d: %d" % (base_head_block_number, len(names)), file=sys.stderr)
+    
+    yield from merge_accounts(iterate_base_accounts(base_file), find_accounts(steemd, names))
+
+def dump_accounts_since(steemd, base_file, head_block_number, outfile, virtual_ops=True, fields=None):
+    """
+    Allows to dump into the snapshot the accounts of an older snapshot,
+    refetching only those touched by blocks since that snapshot was taken
+    """
+    accounts = iterate_accounts_since(steemd, base_file, head_block_number, virtual_ops)
+    return dump_collection(project_accounts(accounts, fields), outfile)
+
+def dump_jsonl(steemd, outfile, metadata, index, since=None, virtual_ops=True, fields=None):
+    """
+    Allows to dump the snapshot as JSON Lines, see `jsonlsnap`, filling in
+    index (outfile must be a `snapindex.OffsetWriter`)
+    """
+    dgpo = steemd.database_api.get_dynamic_global_properties(x=None)
+    jsonlsnap.write_header(outfile, metadata, dgpo)
+    index["metadata"] = dict(metadata, **{"snapshot:format" : jsonlsnap.FORMAT})
+    index["dynamic_global_properties"] = dgpo
+    if since is not None:
+        accounts = iterate_accounts_since(steemd, since, dgpo["head_block_number"], virtual_ops)
+    else:
+        accounts = list_all_accounts(steemd)
+    index["accounts:offset"] = outfile.offset
+    jsonlsnap.write_accounts(outfile, project_accounts(accounts, fields))
+    index["accounts:end"] = outfile.offset
+    index["witnesses:offset"] = outfile.offset
+    jsonlsnap.write_witnesses(outfile, list_all_witnesses(steemd))
+
+def dump_json(steemd, outfile, metadata, index, since=None, virtual_ops=True, fields=None):
+    """
+    Allows to dump the snapshot as a single JSON object, filling in index
+    (outfile must be a `snapindex.OffsetWriter`)
+    """
+    outfile.write("{\n")
+    outfile.write('"metadata":')
+    outfile.write(json.dumps( metadata, separators=(",", ":") ))
+    outfile.write(',\n"dynamic_global_properties":')
+    index["metadata"] = metadata
+    index["dynamic_global_properties"] = dgpo = dump_dgpo(steemd, outfile)
+    outfile.write(',\n"accounts":')
+    index["accounts:offset"] = outfile.offset
+    if since is not None:
+        dump_accounts_since(steemd, since, dgpo["head_block_number"], outfile, virtual_ops, fields)
+    else:
+        dump_all_accounts(steemd, outfile, fields)
+    index["accounts:end"] = outfile.offset
+    outfile.write(',\n"witnesses":')
+    index["witnesses:offset"] = outfile.offset
+    dump_all_witnesses(steemd, outfile)
+    index["witnesses:end"] = outfile.offset
+    outfile.write("\n}\n")
+
+def convert_main(argv):
+    """ Entry point of `tinman snapshot convert` """
+    parser = argparse.ArgumentParser(prog=argv[0], description="Convert a snapshot file to columnar form or JSON Lines")
+    parser.add_argument("-i", "--infile", default="snapshot.json", dest="infile", metavar="FILE", help="Specify input snapshot")
+    parser.add_argument("-o", "--outdir", default="snapshot.cols", dest="outdir", metavar="DIR", help="Specify output directory (or file, for JSON Lines)")
+    parser.add_argument("--format", default="columnar", choices=["columnar", jsonlsnap.FORMAT], dest="format", help="Specify output format")
+    args = parser.parse_args(argv[1:])
+
+    index = snapindex.read_index(args.infile)
+    if args.format == jsonlsnap.FORMAT:
+        with open(args.infile, "rb") as infile, open(args.outdir, "w") as outfile:
+            count = jsonlsnap.convert(infile, outfile, index)
+    elif jsonlsnap.is_jsonl(args.infile):
+        count = colsnap.convert_jsonl(args.infile, args.outdir)
+    else:
+        with open(args.infile, "rb") as infile:
+            count = colsnap.convert(infile, args.outdir, index)
+    print("Accounts converted:", count, file=sys.stderr)
+    return
 
 def main(argv):
     """ Tool entry point function """
+    if len(argv) > 1 and argv[1] == "convert":
+        return convert_main([argv[0] + " convert"] + argv[2:])
+
     parser = argparse.ArgumentParser(prog=argv[0], description="Create snapshot files for Steem")
     parser.add_argument("-s", "--server", default="http://127.0.0.1:8090", dest="server", metavar="URL", help="Specify mainnet steemd server")
     parser.add_argument("-o", "--outfile", default="-", dest="outfile", metavar="FILE", help="Specify output file, - means stdout")
+    parser.add_argument("--format", default="json", choices=["json", jsonlsnap.FORMAT], dest="format", help="Write a single JSON object, or JSON Lines with one account per line")
+    parser.add_argument("--fields", default=None, dest="fields", metavar="FIELDS", help="Only dump these comma separated account fields, or a profile: " + ", ".join(sorted(FIELD_PROFILES)))
+    parser.add_argument("--since", default=None, dest="since", metavar="FILE", help="Update this older snapshot with the accounts touched since it was taken")
+    parser.add_argument("--skip-virtual-ops", action="store_true", dest="skip_virtual_ops", help="With --since, only scan block transactions (for nodes without account_history_api)")
     args = parser.parse_args(argv[1:])
 
     if args.outfile == "-":
-        outfile = sys.stdout
+        outfile = snapindex.OffsetWriter(sys.stdout)
     else:
-        outfile = open(args.outfile, "w")
+        outfile = snapindex.OffsetWriter(open(args.outfile, "w"))
 
     backend = SteemRemoteBackend(nodes=[args.server], appbase=True)
     steemd = SteemInterface(backend)
 
-    outfile.write("{\n")
-    outfile.write('"metadata":{"snapshot:semver":"%s","snapshot:origin_api":"%s"}' % (__version__, args.server))
-    outfile.write(',\n"dynamic_global_properties":')
-    dump_dgpo(steemd, outfile)
-    outfile.write(',\n"accounts":')
-    dump_all_accounts(steemd, outfile)
-    outfile.write(',\n"witnesses":')
-    dump_all_witnesses(steemd, outfile)
-    outfile.write("\n}\n")
+    metadata = {"snapshot:semver" : __version__, "snapshot:origin_api" : args.server}
+    fields = None
+    if args.fields is not None:
+        fields = parse_fields(args.fields)
+        metadata["snapshot:fields"] = fields
+    if args.since is not None:
+        check_base_fields(args.since, fields)
+        metadata["snapshot:since_head_block_num"] = read_base_head_block_number(args.since)
+    index = {}
+    if args.format == jsonlsnap.FORMAT:
+        dump_jsonl(steemd, outfile, metadata, index, args.since, not args.skip_virtual_ops, fields)
+    else:
+        dump_json(steemd, outfile, metadata, index, args.since, not args.skip_virtual_ops, fields)
     outfile.flush()
     if args.outfile != "-":
         outfile.close()
+        snapindex.write_index(args.outfile, index)
     return
 
 if __name__ == "__main__":
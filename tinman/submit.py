@@ -61,6 +61,41 @@ class CachedDgpo(object):
             self.last_refresh = now
         return self.dgpo
 
+def sign_transaction(tx, signer, dgpo):
+    """
+    Sets the reference block and expiration of tx from dgpo, then replaces
+    its wif_sigs with signatures.  Returns tx.
+    """
+    tx["ref_block_num"] = dgpo["head_block_number"] & 0xFFFF
+    tx["ref_block_prefix"] = struct.unpack_from("<I", unhexlify(dgpo["head_block_id"]), 4)[0]
+    head_block_time = datetime.datetime.strptime(dgpo["time"], "%Y-%m-%dT%H:%M:%S")
+    expiration = head_block_time+datetime.timedelta(minutes=1)
+    expiration_str = expiration.strftime("%Y-%m-%dT%H:%M:%S")
+    tx["expiration"] = expiration_str
+
+    wif_sigs = tx["wif_sigs"]
+    del tx["wif_sigs"]
+
+    sigs = []
+    for wif in wif_sigs:
+        if not isinstance(wif_sigs, list):
+            raise RuntimeError("wif_sigs is not list")
+        result = signer.sign_transaction(tx, wif)
+        if "error" in result:
+            print("could not sign transaction", tx, "due to error:", result["error"])
+        else:
+            sigs.append(result["result"]["sig"])
+    tx["signatures"] = sigs
+    return tx
+
+def get_chain_id(chain_name="", chain_id=""):
+    """ The chain ID given, or derived from the chain name given, or None for the default """
+    if chain_id != "":
+        return chain_id.strip()
+    if chain_name != "":
+        return hashlib.sha256(str.encode(chain_name.strip())).digest().hex()
+    return None
+
 def wait_for_real_time(when):
     while True:
         rtc_now = datetime.datetime.utcnow()
@@ -112,20 +147,50 @@ def generate_blocks(steemd, args, cached_dgpo=None, now=None, produce_realtime=F
                )
     return
 
-def main(argv):
+def deduplicate_blocks(actions, last_block_num=None):
+    """
+    Drops the source blocks repeated in actions, such as those emitted again
+    by gatling after resuming from a state file behind what was submitted.
+    Once a `source_block` marker is seen (or from the start, given the
+    last_block_num submitted before a restart), the actions up to the next
+    one are held back, then passed on, followed by the marker, only if its
+    block is newer than every block seen before.  Streams without markers
+    pass through unchanged.
+    """
+    held = []
+    for action in actions:
+        cmd, args = action
+        if cmd == "source_block":
+            if last_block_num is None or args["block_num"] > last_block_num:
+                last_block_num = args["block_num"]
+                yield from held
+                yield action
+            held = []
+        elif last_block_num is None or cmd == "metadata":
+            yield action
+        else:
+            held.append(action)
+    yield from held
+    return
 
-    parser = argparse.ArgumentParser(prog=argv[0], description="Submit transactions to Steem")
+def add_arguments(parser):
+    """ Adds the options of `tinman submit`, other than its input, to parser """
     parser.add_argument("-t", "--testserver", default="http://127.0.0.1:8190", dest="testserver", metavar="URL", help="Specify testnet steemd server with debug enabled")
     parser.add_argument("--signer", default="sign_transaction", dest="sign_transaction_exe", metavar="FILE", help="Specify path to sign_transaction tool")
-    parser.add_argument("-i", "--input-file", default="-", dest="input_file", metavar="FILE", help="File to read transactions from")
     parser.add_argument("-f", "--fail-file", default="-", dest="fail_file", metavar="FILE", help="File to write failures, - for stdout, die to quit on failure")
     parser.add_argument("-n", "--chain-name", default="", dest="chain_name", metavar="CN", help="Specify chain name")
     parser.add_argument("-c", "--chain-id", default="", dest="chain_id", metavar="CID", help="Specify chain ID")
     parser.add_argument("-tpb", "--transactions-per-block", default="40", dest="transactions_per_block", metavar="INT", help="Transactions per block (default: 40)")
     parser.add_argument("--timeout", default=5.0, type=float, dest="timeout", metavar="SECONDS", help="API timeout")
     parser.add_argument("--realtime", dest="realtime", action="store_true", help="Wait when asked to produce blocks in the future")
-    args = parser.parse_args(argv[1:])
+    parser.add_argument("--state-file", default=None, dest="state_file", metavar="FILE", help="Save the last source block submitted in full (see gatling --state-file), and skip the blocks up to it")
+    return
 
+def submit_actions(actions, args):
+    """
+    Submits decoded actions (pairs of action name and arguments) to the
+    testnet, as configured by the options of `add_arguments`.
+    """
     die_on_fail = False
     if args.fail_file == "-":
         fail_file = sys.stdout
@@ -135,11 +200,6 @@ def main(argv):
     else:
         fail_file = open(args.fail_file, "w")
 
-    if args.input_file == "-":
-        input_file = sys.stdin
-    else:
-        input_file = open(args.input_file, "r")
-
     timeout = args.timeout
 
     backend = SteemRemoteBackend(nodes=[args.testserver], appbase=True, min_timeout=timeout, max_timeout=timeout)
@@ -149,23 +209,19 @@ def main(argv):
 
     cached_dgpo = CachedDgpo(steemd=steemd)
 
-    if args.chain_name != "":
-        chain_id = hashlib.sha256(str.encode(args.chain_name.strip())).digest().hex()
-    else:
-        chain_id = None
-
-    if args.chain_id != "":
-        chain_id = args.chain_id.strip()
+    chain_id = get_chain_id(args.chain_name, args.chain_id)
 
     transactions_per_block = int(args.transactions_per_block)
     transactions_count = 0
     signer = TransactionSigner(sign_transaction_exe=sign_transaction_exe, chain_id=chain_id)
     metadata = None
 
-    for line in input_file:
-        line = line.strip()
-        cmd, args = json.loads(line)
+    state_file = args.state_file
+    last_block_num = None
+    if state_file is not None:
+        last_block_num = util.load_cursor(state_file)
 
+    for cmd, args in deduplicate_blocks(actions, last_block_num):
         try:
             if cmd == "metadata":
                 metadata = args
@@ -199,29 +255,12 @@ def main(argv):
                         args["miss_blocks"] = metadata["recommend:miss_blocks"]
                 generate_blocks(steemd, args, cached_dgpo=cached_dgpo, produce_realtime=produce_realtime)
                 cached_dgpo.reset()
+            elif cmd == "source_block":
+                # Every action of the block was submitted before its marker
+                if state_file is not None:
+                    util.save_cursor(state_file, args["block_num"])
             elif cmd == "submit_transaction":
-                tx = args["tx"]
-                dgpo = cached_dgpo.get()
-                tx["ref_block_num"] = dgpo["head_block_number"] & 0xFFFF
-                tx["ref_block_prefix"] = struct.unpack_from("<I", unhexlify(dgpo["head_block_id"]), 4)[0]
-                head_block_time = datetime.datetime.strptime(dgpo["time"], "%Y-%m-%dT%H:%M:%S")
-                expiration = head_block_time+datetime.timedelta(minutes=1)
-                expiration_str = expiration.strftime("%Y-%m-%dT%H:%M:%S")
-                tx["expiration"] = expiration_str
-
-                wif_sigs = tx["wif_sigs"]
-                del tx["wif_sigs"]
-
-                sigs = []
-                for wif in wif_sigs:
-                    if not isinstance(wif_sigs, list):
-                        raise RuntimeError("wif_sigs is not list")
-                    result = signer.sign_transaction(tx, wif)
-                    if "error" in result:
-                        print("could not sign transaction", tx, "due to error:", result["error"])
-                    else:
-                        sigs.append(result["result"]["sig"])
-                tx["signatures"] = sigs
+                tx = sign_transaction(args["tx"], signer, cached_dgpo.get())
                 print("bcast:", json.dumps(tx, separators=(",", ":")))
 
                 steemd.network_broadcast_api.broadcast_transaction(trx=tx)
@@ -237,7 +276,20 @@ def main(argv):
             cached_dgpo.reset()
             if cmd == "wait_blocks" and args.get("count") == 1 and not args.get("miss_blocks"):
                 continue
-        
+
+def main(argv):
+
+    parser = argparse.ArgumentParser(prog=argv[0], description="Submit transactions to Steem")
+    parser.add_argument("-i", "--input-file", default="-", dest="input_file", metavar="FILE", help="File to read transactions from")
+    add_arguments(parser)
+    args = parser.parse_args(argv[1:])
+
+    if args.input_file == "-":
+        input_file = sys.stdin
+    else:
+        input_file = open(args.input_file, "r")
+
+    submit_actions((json.loads(line.strip()) for line in input_file), args)
 
 if __name__ == "__main__":
     main(sys.argv)
@@ -1,14 +1,18 @@
 #!/usr/bin/env python3
 
 import argparse
+import array
 import datetime
 import hashlib
+import collections
 import itertools
 import json
+import multiprocessing
 import os
 import os.path
 import random
 import sys
+import tempfile
 
 try:
     import ijson.backends.yajl2_cffi as ijson
@@ -17,9 +21,19 @@ try:
 except ImportError:
     import ijson
     YAJL2_CFFI_AVAILABLE = False
+
+try:
+    import numpy
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
     
 from . import __version__
+from . import colsnap
+from . import jsonlsnap
+from . import nameset
 from . import prockey
+from . import snapindex
 from . import util
 
 SNAPSHOT_MAJOR_VERSION_SUPPORTED = 0
@@ -33,6 +47,13 @@ DENOM = 10**12        # we need stupidly high precision because VESTS
 STEEM_BLOCKS_PER_DAY = 28800
 STEEM_ADDRESS_PREFIX = "TST"
 STEEM_INIT_MINER_NAME = "initminer"
+SPILL_READ_SIZE = 1 << 20
+SHARD_ACCOUNTS = 10000
+SHARDS_IN_FLIGHT_PER_JOB = 4
+
+# Only these account fields are read after the snapshot has been ingested
+SPILLED_ACCOUNT_FIELDS = ["name", "balance", "vesting_shares", "memo_key",
+  "owner", "active", "posting", "json_metadata"]
 
 def create_system_accounts(conf, keydb, name):
     steem_init_miner_name = conf.get("steem_init_miner_name", STEEM_INIT_MINER_NAME)
@@ -102,12 +123,12 @@ def update_witnesses(conf, keydb, name):
            "wif_sigs" : [keydb.get_privkey(name)]}
     return
 
-def build_setup_transactions(account_stats, conf, keydb, silent=True):
+def build_setup_transactions(account_stats, conf, keydb, silent=True, jobs=1):
     yield from create_system_accounts(conf, keydb, "init")
     yield from create_system_accounts(conf, keydb, "elector")
     yield from create_system_accounts(conf, keydb, "manager")
     yield from create_system_accounts(conf, keydb, "porter")
-    yield from port_snapshot(account_stats, conf, keydb, silent)
+    yield from port_snapshot(account_stats, conf, keydb, silent, jobs)
 
 def build_initminer_tx(conf, keydb):
     steem_init_miner_name = conf.get("steem_init_miner_name", STEEM_INIT_MINER_NAME)
@@ -150,35 +171,291 @@ def get_system_account_names(conf):
             yield name
     return
 
+def snapshot_header_from(snapshot_metadata, dgpo):
+    """ Picks what read_snapshot_header returns from already parsed metadata and dgpo """
+    metadata = {}
+    total_vesting_steem = None
+    for key in ["snapshot:origin_api", "snapshot:semver"]:
+        if key in snapshot_metadata:
+            metadata[key] = snapshot_metadata[key]
+    if "head_block_number" in dgpo:
+        metadata["snapshot:head_block_num"] = dgpo["head_block_number"]
+    if "total_vesting_fund_steem" in dgpo:
+        total_vesting_steem = satoshis(dgpo["total_vesting_fund_steem"])
+    return {
+      "metadata": metadata,
+      "total_vesting_steem": total_vesting_steem,
+      "fields": snapshot_metadata.get("snapshot:fields")
+    }
+
+def read_snapshot_header(conf):
+    """
+    Reads the snapshot metadata and the dynamic global properties needed by
+    txgen, and the account fields if the snapshot was dumped with `--fields`.
+    These precede the accounts, so the scan stops early, and the snapshot's
+    index spares even that.
+    """
+    metadata = {}
+    total_vesting_steem = None
+    fields = None
+    
+    if colsnap.is_columnar(conf["snapshot_file"]):
+        snapshot = colsnap.ColumnarSnapshot(conf["snapshot_file"])
+        return snapshot_header_from(snapshot.metadata, snapshot.dgpo)
+    
+    index = snapindex.read_index(conf["snapshot_file"])
+    if index is not None:
+        return snapshot_header_from(index["metadata"], index["dynamic_global_properties"])
+    
+    if jsonlsnap.is_jsonl(conf["snapshot_file"]):
+        header = jsonlsnap.read_header(conf["snapshot_file"])
+        return snapshot_header_from(header["metadata"], header["dynamic_global_properties"])
+    
+    with open(conf["snapshot_file"], "rb") as f:
+        for prefix, event, value in ijson.parse(f):
+            if prefix == "metadata.snapshot:origin_api":
+                metadata["snapshot:origin_api"] = value
+            if prefix == "metadata.snapshot:semver":
+                metadata["snapshot:semver"] = value
+            if prefix == "metadata.snapshot:fields" and event == "start_array":
+                fields = []
+            if prefix == "metadata.snapshot:fields.item":
+                fields.append(value)
+            if prefix == "dynamic_global_properties.head_block_number":
+                metadata["snapshot:head_block_num"] = value
+            if prefix == "dynamic_global_properties.total_vesting_fund_steem.amount" and total_vesting_steem is None:
+                total_vesting_steem = int(value)
+            
+            if not prefix == '' and not prefix.startswith("metadata") and not prefix.startswith("dynamic_global_properties"):
+                break
+    
+    return {
+      "metadata": metadata,
+      "total_vesting_steem": total_vesting_steem,
+      "fields": fields
+    }
+
+def check_snapshot_fields(header):
+    """ Snapshots dumped with `--fields` must still have what txgen reads """
+    if header["fields"] is None:
+        return
+    missing = [f for f in SPILLED_ACCOUNT_FIELDS if f not in header["fields"]]
+    if missing:
+        raise RuntimeError("Snapshot lacks account fields:", missing)
+
+def get_columnar_account_stats(conf, silent=True):
+    """
+    Columnar snapshots need no spill, the totals are sums over the amount
+    columns, less whatever the system accounts hold.
+    """
+    system_account_names = set(get_system_account_names(conf))
+    snapshot = colsnap.ColumnarSnapshot(conf["snapshot_file"])
+    header = read_snapshot_header(conf)
+    check_snapshot_fields(header)
+    names = nameset.NameSetBuilder()
+    excluded = set()
+    
+    for i, name in enumerate(snapshot.names()):
+        if name in system_account_names:
+            excluded.add(i)
+        else:
+            names.add(name)
+    account_names = names.build()
+    
+    # Shards are (start, stop, index of the first ported account)
+    shards = []
+    for start in range(0, len(snapshot), SHARD_ACCOUNTS):
+        first_index = start - sum(1 for i in excluded if i < start)
+        shards.append((start, min(start + SHARD_ACCOUNTS, len(snapshot)), first_index))
+    vesting_shares = snapshot.amounts["vesting_shares"]
+    balance = snapshot.amounts["balance"]
+    
+    if not silent:
+        print("Accounts read:", len(account_names))
+    
+    return {
+      "account_names": account_names,
+      "total_vests": snapshot.total("vesting_shares") - sum(vesting_shares[i] for i in excluded),
+      "total_steem": snapshot.total("balance") - sum(balance[i] for i in excluded),
+      "header": header,
+      "sorted": snapshot.header.get("accounts:sorted", False),
+      "columnar": snapshot,
+      "excluded": excluded,
+      "shards": shards,
+      "amounts": get_columnar_ported_amounts(snapshot, excluded)
+    }
+
+def get_columnar_ported_amounts(snapshot, excluded):
+    amounts = {}
+    for column in ["balance", "vesting_shares"]:
+        values = snapshot.amount_array(column)
+        if NUMPY_AVAILABLE:
+            keep = numpy.ones(len(values), dtype=bool)
+            keep[list(excluded)] = False
+            amounts[column] = values[keep]
+        else:
+            amounts[column] = array.array("q", (v for i, v in enumerate(values) if i not in excluded))
+    return amounts
+
+def get_jsonl_account_stats(conf, silent=True):
+    """
+    JSON Lines snapshots need no spill either, since their accounts are
+    already one per line.  Shards are byte ranges of the snapshot itself.
+    """
+    system_account_names = set(get_system_account_names(conf))
+    header = read_snapshot_header(conf)
+    check_snapshot_fields(header)
+    snapshot_file = open(conf["snapshot_file"], "rb")
+    start, stop = jsonlsnap.accounts_range(conf["snapshot_file"])
+    names = nameset.NameSetBuilder()
+    amounts = {"balance" : array.array("q"), "vesting_shares" : array.array("q")}
+    shard_starts = [start]
+    num_accounts = 0
+    vests = 0
+    total_steem = 0
+    pos = start
+    
+    for line in util.pread_lines(snapshot_file.fileno(), start, stop, SPILL_READ_SIZE):
+        pos += len(line) + 1
+        acc = json.loads(line)
+        if acc["name"] in system_account_names:
+            continue
+        
+        names.add(acc["name"])
+        num_accounts += 1
+        amounts["balance"].append(satoshis(acc["balance"]))
+        amounts["vesting_shares"].append(satoshis(acc["vesting_shares"]))
+        vests += amounts["vesting_shares"][-1]
+        total_steem += amounts["balance"][-1]
+        if num_accounts % SHARD_ACCOUNTS == 0:
+            shard_starts.append(min(pos, stop))
+        
+        if not silent:
+            if num_accounts % 100000 == 0:
+                print("Accounts read:", num_accounts)
+    
+    shard_starts.append(stop)
+    shards = [(begin, end, i * SHARD_ACCOUNTS) for i, (begin, end) in enumerate(zip(shard_starts, shard_starts[1:])) if begin < end]
+    
+    return {
+      "account_names": names.build(),
+      "total_vests": vests,
+      "total_steem": total_steem,
+      "header": header,
+      "sorted": names.is_sorted,
+      "jsonl_file": snapshot_file,
+      "accounts_range": (start, stop),
+      "system_account_names": system_account_names,
+      "shards": shards,
+      "amounts": amounts
+    }
+
 def get_account_stats(conf, silent=True):
+    """
+    Makes the only pass over the snapshot accounts.  Besides the totals, each
+    ported account is spilled, reduced to the fields txgen needs, to a
+    temporary file of JSON lines that later phases read back with
+    `iterate_accounts`.  The spill is cut into shards of SHARD_ACCOUNTS
+    accounts, recorded as byte ranges, for `txgen --jobs`.  The amounts are
+    also kept in arrays, for `allocate_balances`.
+    """
+    if colsnap.is_columnar(conf["snapshot_file"]):
+        return get_columnar_account_stats(conf, silent)
+    if jsonlsnap.is_jsonl(conf["snapshot_file"]):
+        return get_jsonl_account_stats(conf, silent)
+    
     system_account_names = set(get_system_account_names(conf))
     vests = 0
     total_steem = 0
-    account_names = set()
+    names = nameset.NameSetBuilder()
+    num_accounts = 0
+    accounts_file = tempfile.TemporaryFile()
+    shard_starts = [0]
+    amounts = {"balance" : array.array("q"), "vesting_shares" : array.array("q")}
     
     if not silent and not YAJL2_CFFI_AVAILABLE:
         print("Warning: could not load yajl, falling back to default backend for ijson.")
     
+    header = read_snapshot_header(conf)
+    check_snapshot_fields(header)
+    
     with open(conf["snapshot_file"], "rb") as f:
         for acc in ijson.items(f, "accounts.item"):
             if acc["name"] in system_account_names:
                 continue
             
-            account_names.add(acc["name"])
-            vests += satoshis(acc["vesting_shares"])
-            total_steem += satoshis(acc["balance"])
+            account = {k : acc[k] for k in SPILLED_ACCOUNT_FIELDS}
+            account["balance"] = satoshis(acc["balance"])
+            account["vesting_shares"] = satoshis(acc["vesting_shares"])
+            accounts_file.write(json.dumps(account, separators=(",", ":")).encode("utf-8"))
+            accounts_file.write(b"\n")
+            amounts["balance"].append(account["balance"])
+            amounts["vesting_shares"].append(account["vesting_shares"])
+            
+            names.add(acc["name"])
+            num_accounts += 1
+            if num_accounts % SHARD_ACCOUNTS == 0:
+                shard_starts.append(accounts_file.tell())
+            vests += account["vesting_shares"]
+            total_steem += account["balance"]
 
             if not silent:
-                n = len(account_names)
-                if n % 100000 == 0:
-                    print("Accounts read:", n)
+                if num_accounts % 100000 == 0:
+                    print("Accounts read:", num_accounts)
+    
+    accounts_file.flush()
+    account_names = names.build()
+    shard_starts.append(accounts_file.tell())
+    shards = [(start, stop, i * SHARD_ACCOUNTS) for i, (start, stop) in enumerate(zip(shard_starts, shard_starts[1:])) if start < stop]
     
     return {
       "account_names": account_names,
       "total_vests": vests,
-      "total_steem": total_steem
+      "total_steem": total_steem,
+      "header": header,
+      "sorted": names.is_sorted,
+      "accounts_file": accounts_file,
+      "shards": shards,
+      "amounts": amounts
     }
 
+def iterate_accounts(account_stats, shard=None):
+    """
+    Yields the accounts read by `get_account_stats`, in snapshot order, with
+    balance and vesting_shares as satoshis.  Several of these generators may
+    be consumed at once (even in forked processes), since each keeps its own
+    position in the file.  If shard is given, only the accounts of that entry
+    of `account_stats["shards"]` are yielded.
+    """
+    if "columnar" in account_stats:
+        snapshot = account_stats["columnar"]
+        excluded = account_stats["excluded"]
+        start, stop = shard[:2] if shard else (0, len(snapshot))
+        for i in range(start, stop):
+            if i in excluded:
+                continue
+            a = snapshot.account(i)
+            a["balance"] = satoshis(a["balance"])
+            a["vesting_shares"] = satoshis(a["vesting_shares"])
+            yield a
+        return
+    
+    if "jsonl_file" in account_stats:
+        system_account_names = account_stats["system_account_names"]
+        start, stop = shard[:2] if shard else account_stats["accounts_range"]
+        for line in util.pread_lines(account_stats["jsonl_file"].fileno(), start, stop, SPILL_READ_SIZE):
+            a = json.loads(line)
+            if a["name"] in system_account_names:
+                continue
+            a["balance"] = satoshis(a["balance"])
+            a["vesting_shares"] = satoshis(a["vesting_shares"])
+            yield a
+        return
+    
+    start, stop = shard[:2] if shard else (0, None)
+    for line in util.pread_lines(account_stats["accounts_file"].fileno(), start, stop, SPILL_READ_SIZE):
+        yield json.loads(line)
+
 def get_proportions(account_stats, conf, silent=True):
     """
     We have a fixed amount of STEEM to give out, specified by total_port_balance
@@ -193,11 +470,7 @@ def get_proportions(account_stats, conf, silent=True):
     account_names = account_stats["account_names"]
     num_accounts = len(account_names)
     
-    with open(conf["snapshot_file"], "rb") as f:
-        for prefix, event, value in ijson.parse(f):
-            if prefix == "dynamic_global_properties.total_vesting_fund_steem.amount":
-                total_vesting_steem = int(value)
-                break
+    total_vesting_steem = account_stats["header"]["total_vesting_steem"]
     
     min_vesting_per_account = satoshis(conf["min_vesting_per_account"])
     total_port_balance = satoshis(conf["total_port_balance"])
@@ -228,134 +501,252 @@ def get_proportions(account_stats, conf, silent=True):
         print("steem_conversion_factor:", steem_conversion_factor)
     
     return {
+      "total_port_balance": total_port_balance,
       "min_vesting_per_account": min_vesting_per_account,
       "vest_conversion_factor": vest_conversion_factor,
       "steem_conversion_factor": steem_conversion_factor
     }
 
-def create_accounts(account_stats, conf, keydb, silent=True):
-    steem_address_prefix = conf.get("steem_address_prefix", STEEM_ADDRESS_PREFIX)
-    system_account_names = set(get_system_account_names(conf))
+def scale_amounts(values, factor):
+    """
+    Computes `(v * factor) // DENOM` for each v, in int64 when no product
+    can overflow, otherwise in exact Python integers.
+    """
+    if not NUMPY_AVAILABLE:
+        return [(v * factor) // DENOM for v in values]
+    values = numpy.asarray(values, dtype=numpy.int64)
+    if len(values) == 0 or int(numpy.abs(values).max()) * abs(factor) < 2**63:
+        return (values * factor) // DENOM
+    return (values.astype(object) * factor) // DENOM
+
+def allocate_balances(account_stats, conf, silent=True):
+    """
+    Computes the testnet vesting and liquid grants of every ported account at
+    once, as arrays in `iterate_accounts` order, and checks that together
+    they do not exceed total_port_balance.  The result is kept in
+    account_stats, so it is only computed once.
+    """
+    allocation = account_stats.get("allocation")
+    if allocation is not None:
+        return allocation
+    
     proportions = get_proportions(account_stats, conf, silent)
+    amounts = account_stats["amounts"]
+    vesting = scale_amounts(amounts["vesting_shares"], proportions["vest_conversion_factor"])
+    liquid = scale_amounts(amounts["balance"], proportions["steem_conversion_factor"])
     min_vesting_per_account = proportions["min_vesting_per_account"]
-    vest_conversion_factor = proportions["vest_conversion_factor"]
-    steem_conversion_factor = proportions["steem_conversion_factor"]
+    
+    if NUMPY_AVAILABLE:
+        vesting = numpy.maximum(vesting, min_vesting_per_account)
+        total = int(vesting.sum(dtype=object)) + int(liquid.sum(dtype=object))
+    else:
+        vesting = [max(v, min_vesting_per_account) for v in vesting]
+        total = sum(vesting) + sum(liquid)
+    
+    if total > proportions["total_port_balance"]:
+        raise RuntimeError("Allocated balances exceed total_port_balance:", total)
+    
+    # Every grant is now known to fit in int64
+    if NUMPY_AVAILABLE:
+        vesting = vesting.astype(numpy.int64)
+        liquid = liquid.astype(numpy.int64)
+    else:
+        vesting = array.array("q", vesting)
+        liquid = array.array("q", liquid)
+    
+    allocation = {
+      "vesting": vesting,
+      "liquid": liquid,
+      "total": total
+    }
+    account_stats["allocation"] = allocation
+    
+    if not silent:
+        print("total_allocated:", total)
+    
+    return allocation
+
+def create_account_ops(a, vesting_amount, transfer_amount, conf):
+    steem_address_prefix = conf.get("steem_address_prefix", STEEM_ADDRESS_PREFIX)
+    porter = conf["accounts"]["porter"]["name"]
+    create_auth = {"account_auths" : [["porter", 1]], "key_auths" : [], "weight_threshold" : 1}
+    name = a["name"]
+    
+    ops = [{"type" : "account_create_operation", "value" : {
+      "fee" : {"amount" : "0", "precision" : 3, "nai" : "@@000000021"},
+      "creator" : porter,
+      "new_account_name" : name,
+      "owner" : create_auth,
+      "active" : create_auth,
+      "posting" : create_auth,
+      "memo_key" : steem_address_prefix + a["memo_key"][3:],
+      "json_metadata" : "",
+     }}, {"type" : "transfer_to_vesting_operation", "value" : {
+      "from" : porter,
+      "to" : name,
+      "amount" : amount(vesting_amount),
+     }}]
+    if transfer_amount > 0:
+        ops.append({"type" : "transfer_operation", "value" : {
+         "from" : porter,
+         "to" : name,
+         "amount" : amount(transfer_amount),
+         "memo" : "Ported balance",
+         }})
+    return ops
+
+def create_accounts(account_stats, conf, keydb, silent=True, shard=None):
+    allocation = allocate_balances(account_stats, conf, silent)
+    vesting_amounts = allocation["vesting"]
+    transfer_amounts = allocation["liquid"]
+    port_index = shard[2] if shard else 0
     account_names = account_stats["account_names"]
     num_accounts = len(account_names)
-    porter = conf["accounts"]["porter"]["name"]
     porter_wif = keydb.get_privkey("porter")
-    create_auth = {"account_auths" : [["porter", 1]], "key_auths" : [], "weight_threshold" : 1}
     accounts_created = 0
     
-    with open(conf["snapshot_file"], "rb") as f:
-        for a in ijson.items(f, "accounts.item"):
-            if a["name"] in system_account_names:
-                continue
-            
-            vesting_amount = (satoshis(a["vesting_shares"]) * vest_conversion_factor) // DENOM
-            transfer_amount = (satoshis(a["balance"]) * steem_conversion_factor) // DENOM
-            name = a["name"]
-            vesting_amount = max(vesting_amount, min_vesting_per_account)
-            
-            ops = [{"type" : "account_create_operation", "value" : {
-              "fee" : {"amount" : "0", "precision" : 3, "nai" : "@@000000021"},
-              "creator" : porter,
-              "new_account_name" : name,
-              "owner" : create_auth,
-              "active" : create_auth,
-              "posting" : create_auth,
-              "memo_key" : steem_address_prefix + a["memo_key"][3:],
-              "json_metadata" : "",
-             }}, {"type" : "transfer_to_vesting_operation", "value" : {
-              "from" : porter,
-              "to" : name,
-              "amount" : amount(vesting_amount),
-             }}]
-            if transfer_amount > 0:
-                ops.append({"type" : "transfer_operation", "value" : {
-                 "from" : porter,
-                 "to" : name,
-                 "amount" : amount(transfer_amount),
-                 "memo" : "Ported balance",
-                 }})
-            
-            accounts_created += 1
-            if not silent:
-                if accounts_created % 100000 == 0:
-                    print("Accounts created:", accounts_created)
-                    print("\t", '%.2f%% complete' % (accounts_created / num_accounts * 100.0))
+    for a in iterate_accounts(account_stats, shard):
+        vesting_amount = int(vesting_amounts[port_index])
+        transfer_amount = int(transfer_amounts[port_index])
+        port_index += 1
+        ops = create_account_ops(a, vesting_amount, transfer_amount, conf)
+        
+        accounts_created += 1
+        if not silent:
+            if accounts_created % 100000 == 0:
+                print("Accounts created:", accounts_created)
+                print("\t", '%.2f%% complete' % (accounts_created / num_accounts * 100.0))
 
-            yield {"operations" : ops, "wif_sigs" : [porter_wif]}
-            
+        yield {"operations" : ops, "wif_sigs" : [porter_wif]}
+        
     if not silent:
         print("Accounts created:", accounts_created)
         print("\t100.00%% complete")
 
-def update_accounts(account_stats, conf, keydb, silent=True):
+def update_account_op(a, account_names, system_account_names, conf):
+    """
+    Builds the account_update_operation that restores the authorities, memo
+    key and json_metadata of account a, which is modified in the process.
+    """
     steem_max_authority_membership = conf.get("steem_max_authority_membership", STEEM_MAX_AUTHORITY_MEMBERSHIP)
     steem_address_prefix = conf.get("steem_address_prefix", STEEM_ADDRESS_PREFIX)
+    tnman = conf["accounts"]["manager"]["name"]
+    
+    cur_owner_auth = a["owner"]
+    new_owner_auth = cur_owner_auth.copy()
+    cur_active_auth = a["active"]
+    new_active_auth = cur_active_auth.copy()
+    cur_posting_auth = a["posting"]
+    new_posting_auth = cur_posting_auth.copy()
+    
+    # filter to only include existing accounts
+    for aw in cur_owner_auth["account_auths"][:(steem_max_authority_membership - 1)]:
+        if (aw[0] not in account_names) or (aw[0] in system_account_names):
+            new_owner_auth["account_auths"].remove(aw)
+    for aw in cur_active_auth["account_auths"][:(steem_max_authority_membership - 1)]:
+        if (aw[0] not in account_names) or (aw[0] in system_account_names):
+            new_active_auth["account_auths"].remove(aw)
+    for aw in cur_posting_auth["account_auths"][:(steem_max_authority_membership - 1)]:
+        if (aw[0] not in account_names) or (aw[0] in system_account_names):
+            new_posting_auth["account_auths"].remove(aw)
+
+    # add tnman to account_auths
+    new_owner_auth["account_auths"].append([tnman, cur_owner_auth["weight_threshold"]])
+    new_active_auth["account_auths"].append([tnman, cur_active_auth["weight_threshold"]])
+    new_posting_auth["account_auths"].append([tnman, cur_posting_auth["weight_threshold"]])
+    
+    # substitute prefix for key_auths
+    new_owner_auth["key_auths"] = [[steem_address_prefix + k[3:], w] for k, w in new_owner_auth["key_auths"][:steem_max_authority_membership]]
+    new_active_auth["key_auths"] = [[steem_address_prefix + k[3:], w] for k, w in new_active_auth["key_auths"][:steem_max_authority_membership]]
+    new_posting_auth["key_auths"] = [[steem_address_prefix + k[3:], w] for k, w in new_posting_auth["key_auths"][:steem_max_authority_membership]]
+
+    return {"type" : "account_update_operation", "value" : {
+      "account" : a["name"],
+      "owner" : new_owner_auth,
+      "active" : new_active_auth,
+      "posting" : new_posting_auth,
+      "memo_key" : "TST"+a["memo_key"][3:],
+      "json_metadata" : a["json_metadata"],
+      }}
+
+def update_accounts(account_stats, conf, keydb, silent=True, shard=None):
     system_account_names = set(get_system_account_names(conf))
     account_names = account_stats["account_names"]
     num_accounts = len(account_names)
     porter_wif = keydb.get_privkey("porter")
-    tnman = conf["accounts"]["manager"]["name"]
     accounts_updated = 0
 
-    with open(conf["snapshot_file"], "rb") as f:
-        for a in ijson.items(f, "accounts.item"):
-            if a["name"] in system_account_names:
-                continue
-            
-            cur_owner_auth = a["owner"]
-            new_owner_auth = cur_owner_auth.copy()
-            cur_active_auth = a["active"]
-            new_active_auth = cur_active_auth.copy()
-            cur_posting_auth = a["posting"]
-            new_posting_auth = cur_posting_auth.copy()
-            
-            # filter to only include existing accounts
-            for aw in cur_owner_auth["account_auths"][:(steem_max_authority_membership - 1)]:
-                if (aw[0] not in account_names) or (aw[0] in system_account_names):
-                    new_owner_auth["account_auths"].remove(aw)
-            for aw in cur_active_auth["account_auths"][:(steem_max_authority_membership - 1)]:
-                if (aw[0] not in account_names) or (aw[0] in system_account_names):
-                    new_active_auth["account_auths"].remove(aw)
-            for aw in cur_posting_auth["account_auths"][:(steem_max_authority_membership - 1)]:
-                if (aw[0] not in account_names) or (aw[0] in system_account_names):
-                    new_posting_auth["account_auths"].remove(aw)
-
-            # add tnman to account_auths
-            new_owner_auth["account_auths"].append([tnman, cur_owner_auth["weight_threshold"]])
-            new_active_auth["account_auths"].append([tnman, cur_active_auth["weight_threshold"]])
-            new_posting_auth["account_auths"].append([tnman, cur_posting_auth["weight_threshold"]])
-            
-            # substitute prefix for key_auths
-            new_owner_auth["key_auths"] = [[steem_address_prefix + k[3:], w] for k, w in new_owner_auth["key_auths"][:steem_max_authority_membership]]
-            new_active_auth["key_auths"] = [[steem_address_prefix + k[3:], w] for k, w in new_active_auth["key_auths"][:steem_max_authority_membership]]
-            new_posting_auth["key_auths"] = [[steem_address_prefix + k[3:], w] for k, w in new_posting_auth["key_auths"][:steem_max_authority_membership]]
-
-            ops = [{"type" : "account_update_operation", "value" : {
-              "account" : a["name"],
-              "owner" : new_owner_auth,
-              "active" : new_active_auth,
-              "posting" : new_posting_auth,
-              "memo_key" : "TST"+a["memo_key"][3:],
-              "json_metadata" : a["json_metadata"],
-              }}]
-
-            accounts_updated += 1
-            if not silent:
-                if accounts_updated % 100000 == 0:
-                    print("Accounts updated:", accounts_updated)
-                    print("\t", '%.2f%% complete' % (accounts_updated / num_accounts * 100.0))
-            
-            yield {"operations" : ops, "wif_sigs" : [porter_wif]}
+    for a in iterate_accounts(account_stats, shard):
+        ops = [update_account_op(a, account_names, system_account_names, conf)]
+
+        accounts_updated += 1
+        if not silent:
+            if accounts_updated % 100000 == 0:
+                print("Accounts updated:", accounts_updated)
+                print("\t", '%.2f%% complete' % (accounts_updated / num_accounts * 100.0))
+        
+        yield {"operations" : ops, "wif_sigs" : [porter_wif]}
     
     if not silent:
         print("Accounts updated:", accounts_updated)
         print("\t100.00%% complete")
 
-def port_snapshot(account_stats, conf, keydb, silent=True):
+# Set in the parent before forking the workers of port_accounts_parallel
+_shard_state = None
+
+def port_shard(task):
+    """
+    Worker of port_accounts_parallel, returns the number of accounts in the
+    shard and their serialized actions.
+    """
+    phase, shard = task
+    account_stats, conf = _shard_state
+    keydb = prockey.ProceduralKeyDatabase()
+    if phase == "create":
+        txs = create_accounts(account_stats, conf, keydb, True, shard)
+    else:
+        txs = update_accounts(account_stats, conf, keydb, True, shard)
+    lines = [util.action_to_str(["submit_transaction", {"tx" : tx}]) for tx in txs]
+    return len(lines), "\n".join(lines)
+
+def port_accounts_parallel(account_stats, conf, jobs, silent=True):
+    """
+    Creates and updates the accounts in a pool of jobs worker processes, each
+    generating and serializing the actions of one shard at a time.  Shards
+    are yielded as text in snapshot order, so the output is the same as
+    create_accounts followed by update_accounts.
+    """
+    global _shard_state
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise RuntimeError("Parallel txgen requires the fork start method")
+    
+    # Allocate before forking, so workers share the result, and report it
+    # once here since workers are silent
+    allocate_balances(account_stats, conf, silent)
+    _shard_state = (account_stats, conf)
+    tasks = [(phase, shard) for phase in ["create", "update"] for shard in account_stats["shards"]]
+    counts = {"create" : 0, "update" : 0}
+    
+    with multiprocessing.get_context("fork").Pool(jobs) as pool:
+        pending = collections.deque()
+        tasks = iter(tasks)
+        while True:
+            for task in itertools.islice(tasks, jobs * SHARDS_IN_FLIGHT_PER_JOB - len(pending)):
+                pending.append((task[0], pool.apply_async(port_shard, (task,))))
+            if len(pending) == 0:
+                break
+            phase, result = pending.popleft()
+            count, text = result.get()
+            counts[phase] += count
+            if count > 0:
+                yield text
+    
+    _shard_state = None
+    if not silent:
+        print("Accounts created:", counts["create"])
+        print("Accounts updated:", counts["update"])
+
+def port_snapshot(account_stats, conf, keydb, silent=True, jobs=1):
     steem_init_miner_name = conf.get("steem_init_miner_name", STEEM_INIT_MINER_NAME)
     porter = conf["accounts"]["porter"]["name"]
 
@@ -368,12 +759,35 @@ def port_snapshot(account_stats, conf, keydb, silent=True):
       }}],
        "wif_sigs" : [keydb.get_privkey(steem_init_miner_name)]}
 
-    yield from create_accounts(account_stats, conf, keydb, silent)
-    yield from update_accounts(account_stats, conf, keydb, silent)
+    if jobs > 1:
+        yield from port_accounts_parallel(account_stats, conf, jobs, silent)
+    else:
+        yield from create_accounts(account_stats, conf, keydb, silent)
+        yield from update_accounts(account_stats, conf, keydb, silent)
     
     return
 
-def build_actions(conf, silent=True):
+def check_snapshot_semver(metadata, silent=True):
+    semver = metadata.get("snapshot:semver", '0.0')
+    major_version, minor_version = semver.split('.')
+    major_version = int(major_version)
+    minor_version = int(minor_version)
+    
+    if major_version == SNAPSHOT_MAJOR_VERSION_SUPPORTED:
+        if not silent:
+            print("metadata:", metadata)
+    else:
+        raise RuntimeError("Unsupported snapshot:", metadata)
+    
+    if minor_version < SNAPSHOT_MINOR_VERSION_SUPPORTED:
+        print("WARNING: Older snapshot encountered.", file=sys.stderr)
+
+def build_actions(conf, silent=True, jobs=1):
+    """
+    Yields the actions to port the snapshot.  With jobs > 1, the ported
+    accounts' transactions are generated in parallel and come already
+    serialized, as strings of newline separated actions.
+    """
     keydb = prockey.ProceduralKeyDatabase()
     account_stats_start = datetime.datetime.utcnow()
     account_stats = get_account_stats(conf, silent)
@@ -417,33 +831,11 @@ def build_actions(conf, silent=True):
       "recommend:miss_blocks": miss_blocks
     }
 
-    with open(conf["snapshot_file"], "rb") as f:
-        for prefix, event, value in ijson.parse(f):
-            if prefix == "metadata.snapshot:origin_api":
-                metadata["snapshot:origin_api"] = value
-            if prefix == "metadata.snapshot:semver":
-                metadata["snapshot:semver"] = value
-            if prefix == "dynamic_global_properties.head_block_number":
-                metadata["snapshot:head_block_num"] = value
-            
-            if not prefix == '' and not prefix.startswith("metadata") and not prefix.startswith("dynamic_global_properties"):
-                break
+    metadata.update(account_stats["header"]["metadata"])
     
-    semver = metadata.get("snapshot:semver", '0.0')
-    major_version, minor_version = semver.split('.')
-    major_version = int(major_version)
-    minor_version = int(minor_version)
+    check_snapshot_semver(metadata, silent)
     backfill_file = conf.get("backfill_file", None)
     
-    if major_version == SNAPSHOT_MAJOR_VERSION_SUPPORTED:
-        if not silent:
-            print("metadata:", metadata)
-    else:
-        raise RuntimeError("Unsupported snapshot:", metadata)
-    
-    if minor_version < SNAPSHOT_MINOR_VERSION_SUPPORTED:
-        print("WARNING: Older snapshot encountered.", file=sys.stderr)
-    
     if backfill_file and os.path.exists(backfill_file) and os.path.isfile(backfill_file):
         with open(backfill_file, "r") as f:
             num_lines = sum(1 for line in f)
@@ -458,8 +850,11 @@ def build_actions(conf, silent=True):
     yield ["metadata", metadata]
     yield ["wait_blocks", {"count" : 1, "miss_blocks" : miss_blocks}]
     yield ["submit_transaction", {"tx" : build_initminer_tx(conf, keydb)}]
-    for b in util.batch(build_setup_transactions(account_stats, conf, keydb, silent), transactions_per_block):
-        for tx in b:
+    # Shards ported in parallel come serialized, as newline separated actions
+    for tx in build_setup_transactions(account_stats, conf, keydb, silent, jobs):
+        if isinstance(tx, str):
+            yield tx
+        else:
             yield ["submit_transaction", {"tx" : tx}]
     
     if has_backfill:
@@ -477,6 +872,161 @@ def build_actions(conf, silent=True):
     yield ["wait_blocks", {"count" : conf.get("num_blocks_to_clear_witness_round", NUM_BLOCKS_TO_CLEAR_WITNESS_ROUND)}]
     return
 
+def iterate_accounts_by_name(account_stats):
+    """
+    Yields (position, account) for the accounts of `iterate_accounts`, in
+    name order.  Snapshots taken by `tinman snapshot` are sorted already,
+    others are sorted in memory.
+    """
+    accounts = enumerate(iterate_accounts(account_stats))
+    if account_stats["sorted"]:
+        return accounts
+    print("WARNING: Snapshot is not sorted by name, sorting in memory.", file=sys.stderr)
+    return iter(sorted(accounts, key=lambda e : e[1]["name"]))
+
+def plan_delta(account_stats, base_stats, conf, silent=True):
+    """
+    Walks the base and new snapshots in lockstep by name to find what a
+    testnet ported from the base needs to match the new snapshot: accounts to
+    create, vesting and liquid top-ups, and accounts whose update operation
+    changed.  Accounts are identified by position in the new snapshot.
+    
+    Grants keep the base snapshot's conversion factors, so an account only
+    gets a top-up when its own mainnet balance grew.
+    """
+    proportions = get_proportions(base_stats, conf, silent)
+    min_vesting_per_account = proportions["min_vesting_per_account"]
+    base_allocation = allocate_balances(base_stats, conf, True)
+    amounts = account_stats["amounts"]
+    vesting = scale_amounts(amounts["vesting_shares"], proportions["vest_conversion_factor"])
+    liquid = scale_amounts(amounts["balance"], proportions["steem_conversion_factor"])
+    system_account_names = set(get_system_account_names(conf))
+    creates = set()
+    topups = {}
+    updates = set()
+    funding = 0
+    
+    base_accounts = iterate_accounts_by_name(base_stats)
+    base = next(base_accounts, None)
+    for i, a in iterate_accounts_by_name(account_stats):
+        while base is not None and base[1]["name"] < a["name"]:
+            base = next(base_accounts, None)
+        new_vesting = max(int(vesting[i]), min_vesting_per_account)
+        new_liquid = int(liquid[i])
+        
+        if base is None or base[1]["name"] != a["name"]:
+            creates.add(i)
+            updates.add(i)
+            funding += new_vesting + new_liquid
+            continue
+        
+        j, b = base
+        topup = (max(new_vesting - int(base_allocation["vesting"][j]), 0),
+                 max(new_liquid - int(base_allocation["liquid"][j]), 0))
+        if topup != (0, 0):
+            topups[i] = topup
+            funding += sum(topup)
+        
+        if update_account_op(a, account_stats["account_names"], system_account_names, conf) != \
+           update_account_op(b, base_stats["account_names"], system_account_names, conf):
+            updates.add(i)
+    
+    if not silent:
+        print("Accounts to create:", len(creates))
+        print("Accounts to top up:", len(topups))
+        print("Accounts to update:", len(updates))
+    
+    return {
+      "vesting": vesting,
+      "liquid": liquid,
+      "min_vesting_per_account": min_vesting_per_account,
+      "creates": creates,
+      "topups": topups,
+      "updates": updates,
+      "funding": funding
+    }
+
+def build_delta_transactions(account_stats, plan, conf, keydb):
+    steem_init_miner_name = conf.get("steem_init_miner_name", STEEM_INIT_MINER_NAME)
+    porter = conf["accounts"]["porter"]["name"]
+    porter_wif = keydb.get_privkey("porter")
+    system_account_names = set(get_system_account_names(conf))
+    creates = plan["creates"]
+    topups = plan["topups"]
+    updates = plan["updates"]
+    
+    if plan["funding"] > 0:
+        yield {"operations" : [
+          {"type" : "transfer_operation",
+          "value" : {"from" : steem_init_miner_name,
+           "to" : porter,
+           "amount" : amount(plan["funding"]),
+           "memo" : "Fund porting balances",
+          }}],
+           "wif_sigs" : [keydb.get_privkey(steem_init_miner_name)]}
+    
+    for i, a in enumerate(iterate_accounts(account_stats)):
+        if i in creates:
+            vesting_amount = max(int(plan["vesting"][i]), plan["min_vesting_per_account"])
+            ops = create_account_ops(a, vesting_amount, int(plan["liquid"][i]), conf)
+        elif i in topups:
+            vesting_amount, transfer_amount = topups[i]
+            ops = []
+            if vesting_amount > 0:
+                ops.append({"type" : "transfer_to_vesting_operation", "value" : {
+                  "from" : porter,
+                  "to" : a["name"],
+                  "amount" : amount(vesting_amount),
+                  }})
+            if transfer_amount > 0:
+                ops.append({"type" : "transfer_operation", "value" : {
+                  "from" : porter,
+                  "to" : a["name"],
+                  "amount" : amount(transfer_amount),
+                  "memo" : "Ported balance top-up",
+                  }})
+        else:
+            continue
+        yield {"operations" : ops, "wif_sigs" : [porter_wif]}
+    
+    # Updates follow all creates, since authorities may name new accounts
+    for i, a in enumerate(iterate_accounts(account_stats)):
+        if i in updates:
+            ops = [update_account_op(a, account_stats["account_names"], system_account_names, conf)]
+            yield {"operations" : ops, "wif_sigs" : [porter_wif]}
+    
+    return
+
+def build_delta_actions(conf, base_snapshot_file, silent=True):
+    """
+    Yields the actions that bring a testnet ported from base_snapshot_file up
+    to date with the snapshot in conf, rather than porting every account.
+    """
+    keydb = prockey.ProceduralKeyDatabase()
+    account_stats = get_account_stats(conf, silent)
+    base_conf = dict(conf)
+    base_conf["snapshot_file"] = base_snapshot_file
+    base_stats = get_account_stats(base_conf, True)
+    plan = plan_delta(account_stats, base_stats, conf, silent)
+    
+    metadata = {
+      "txgen:semver": __version__,
+      "txgen:transactions_per_block": conf["transactions_per_block"],
+      "epoch:created": str(datetime.datetime.utcnow()),
+      "actions:count": (1 if plan["funding"] > 0 else 0) + len(plan["creates"]) + len(plan["topups"]) + len(plan["updates"]),
+    }
+    metadata.update(account_stats["header"]["metadata"])
+    base_metadata = base_stats["header"]["metadata"]
+    if "snapshot:head_block_num" in base_metadata:
+        metadata["txgen:base_head_block_num"] = base_metadata["snapshot:head_block_num"]
+    check_snapshot_semver(metadata, silent)
+    check_snapshot_semver(base_metadata, True)
+    
+    yield ["metadata", metadata]
+    for tx in build_delta_transactions(account_stats, plan, conf, keydb):
+        yield ["submit_transaction", {"tx" : tx}]
+    return
+
 def log_config(conf, file):
     keys = ["transactions_per_block", "steem_block_interval",
       "num_blocks_to_clear_witness_round", "transaction_witness_setup_pad",
@@ -492,8 +1042,13 @@ def main(argv):
     parser = argparse.ArgumentParser(prog=argv[0], description="Generate transactions for Steem testnet")
     parser.add_argument("-c", "--conffile", default="txgen.conf", dest="conffile", metavar="FILE", help="Specify configuration file")
     parser.add_argument("-o", "--outfile", default="-", dest="outfile", metavar="FILE", help="Specify output file, - means stdout")
+    parser.add_argument("-b", "--base", default=None, dest="base", metavar="FILE", help="Only generate the changes since the testnet was ported from this older snapshot")
+    parser.add_argument("-j", "--jobs", default=1, type=int, dest="jobs", metavar="N", help="Generate account transactions in N worker processes")
     args = parser.parse_args(argv[1:])
 
+    if args.base is not None and args.jobs != 1:
+        raise RuntimeError("--jobs cannot be used with --base")
+
     with open(args.conffile, "r") as f:
         conf = json.load(f)
         log_config(conf, args.conffile)
@@ -503,7 +1058,12 @@ def main(argv):
     else:
         outfile = open(args.outfile, "w")
 
-    for action in build_actions(conf, args.outfile == "-"):
+    if args.base is not None:
+        actions = build_delta_actions(conf, args.base, args.outfile == "-")
+    else:
+        actions = build_actions(conf, args.outfile == "-", args.jobs)
+
+    for action in actions:
         outfile.write(util.action_to_str(action))
         outfile.write("\n")
 
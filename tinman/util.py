@@ -1,11 +1,15 @@
 
 # Utility functions
 
+import codecs
+import io
 import itertools
 import json
+import os
+import select
+import sys
 
 from . import prockey
-from simple_steem_client.client import SteemRemoteBackend, SteemInterface
 
 def tag_escape_sequences(s, esc):
     """
@@ -35,6 +39,122 @@ def batch(it, size=1):
         yield b
     return
 
+def read_chunks(input_file, output_file=None, size=1 << 20):
+    """
+    Yields text read from input_file in chunks of up to size bytes.
+
+    When input_file is backed by a file descriptor, each chunk is whatever
+    is available (so a live pipe is never waited on for a full chunk), and
+    output_file is flushed before any read that would block.
+    """
+    try:
+        fd = input_file.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        fd = None
+
+    if fd is None:
+        while True:
+            chunk = input_file.read(size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        while True:
+            if output_file is not None and not select.select([fd], [], [], 0)[0]:
+                output_file.flush()
+            data = os.read(fd, size)
+            if not data:
+                break
+            yield decoder.decode(data)
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            yield tail
+    return
+
+def transform_lines(input_file, output_file, transform):
+    """
+    Streams each line of input_file through transform into output_file.
+
+    The transform is called with each line (newline removed) and returns the
+    replacement line, or None to drop it.  Results are written once per input
+    chunk rather than per line, and output_file is only flushed when the input
+    is idle or exhausted.
+    """
+    pending = ""
+    for chunk in read_chunks(input_file, output_file):
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        result = []
+        for line in lines:
+            line = transform(line)
+            if line is not None:
+                result.append(line)
+                result.append("\n")
+        if result:
+            output_file.write("".join(result))
+    if pending:
+        line = transform(pending)
+        if line is not None:
+            output_file.write(line)
+            output_file.write("\n")
+    output_file.flush()
+    return
+
+def read_lines(input_file, output_file=None):
+    """
+    Yields each line of input_file (newline removed), reading it as
+    `read_chunks` does, so output_file is flushed before a read would block.
+    """
+    pending = ""
+    for chunk in read_chunks(input_file, output_file):
+        lines = (pending + chunk).split("\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+    return
+
+def pread_lines(fd, start=0, stop=None, size=1 << 20):
+    """
+    Yields the lines (as bytes, newline removed) of file descriptor fd from
+    byte start up to byte stop (or the end).  Reading with pread keeps no
+    file position, so any number of readers may share fd, even across forks.
+    """
+    pos = start
+    pending = b""
+    while stop is None or pos < stop:
+        chunk = os.pread(fd, size if stop is None else min(size, stop - pos), pos)
+        if not chunk:
+            break
+        pos += len(chunk)
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+    return
+
+def action_name(line):
+    """
+    Cheaply extracts the action name from a serialized action without decoding it.
+    Returns None if the line does not begin like a simple action.
+
+    Example usage:
+
+    >>> util.action_name('["submit_transaction",{"tx":{}}]')
+    'submit_transaction'
+    """
+    if not line.startswith('["'):
+        return None
+    end = line.find('"', 2)
+    if end < 0:
+        return None
+    name = line[2:end]
+    if "\\" in name:
+        return None
+    return name
+
 def find_non_substr(s, alphabet="abcdefghijklmnopqrstuvwxyz", start=""):
     """
     Find a string composed of characters from alphabet that does not occur in s.
@@ -87,6 +207,116 @@ def find_non_substr(s, alphabet="abcdefghijklmnopqrstuvwxyz", start=""):
 
     return result
 
+STRUCT_FORMATS = {1 : "B", 2 : "H", 4 : "I", 8 : "Q"}
+
+def pack_grams(data, k, step, width):
+    """
+    Packs the length k substrings of data starting every step bytes into
+    little chunks of width bytes, and returns them viewed as integers.
+    """
+    count = (len(data) - k) // step + 1
+    packed = bytearray(width * count)
+    for j in range(k):
+        packed[j::width] = data[j::step][:count]
+    return memoryview(packed).cast(STRUCT_FORMATS[width])
+
+def shortest_non_substr(s, alphabet="abcdefghijklmnopqrstuvwxyz"):
+    """
+    Find the shortest string composed of characters from alphabet that does not
+    occur in s.  Among strings of that length, the first in alphabet order wins.
+    The alphabet must be ASCII.
+
+    For each candidate length k, the set of length k substrings of s is
+    collected in one pass, and the candidates are then checked against it in
+    alphabet order.  Both steps work on substrings packed into fixed-width
+    integers by slice assignment, so no Python code runs per character or
+    per candidate.  The set has at most len(s) members, so k never exceeds
+    log(len(s)) / log(len(alphabet)) + 1.
+
+    Example usage:
+
+    >>> util.shortest_non_substr('steemian bob can do fun things')
+    'j'
+    """
+    data = s.encode("utf-8")
+    k = 1
+    while True:
+        width = 1 if k == 1 else 2 if k == 2 else 4 if k <= 4 else 8
+        # Substrings running off the end are padded with zeros, so they
+        # never match a candidate.
+        padded = data + bytes(k)
+        present = set()
+        for offset in range(min(k, len(data))):
+            present.update(pack_grams(padded[offset:len(data)+k-1], k, k, width))
+        # Candidates are checked in blocks sharing their first character
+        suffixes = "".join(map("".join, itertools.product(alphabet, repeat=k-1))).encode("ascii")
+        count = len(alphabet) ** (k - 1)
+        block = bytearray(k * count)
+        for j in range(1, k):
+            block[j::k] = suffixes[j-1::k-1]
+        for c in alphabet:
+            block[0::k] = c.encode("ascii") * count
+            missing = next(itertools.filterfalse(present.__contains__, pack_grams(block, k, k, width)), None)
+            if missing is not None:
+                return missing.to_bytes(width, sys.byteorder)[:k].decode("ascii")
+        k += 1
+
+def load_cursor(path):
+    """ Returns the last block number saved in the state file path, or None if there is none """
+    if not os.path.isfile(path):
+        return None
+    with open(path, "r") as f:
+        return int(json.load(f)["block_num"])
+
+def save_cursor(path, block_num):
+    """ Saves block_num to the state file path, atomically, so a crash leaves the old or the new one """
+    with open(path + ".tmp", "w") as f:
+        json.dump({"block_num" : block_num}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    return
+
+def get_block(steemd, is_appbase, block_num):
+    """ Returns provided node's block block_num, or None if it does not have it yet """
+    if is_appbase:
+        another_block = steemd.block_api.get_block(block_num=block_num)
+        if not another_block:
+            return None
+        return another_block.get("block")
+    another_block = steemd.block_api.get_block(block_num)
+    if not another_block:
+        return None
+    return another_block
+
+def iterate_block_transactions_from(steemd, is_appbase, min_block_number, max_block_number):
+    """
+    Yields a (block_num, transactions) pair for each of provided node's
+    blocks, in the [min_block_number, max_block_number) range.  Stops early
+    at the first block the node does not return.
+    """
+    # A SteemInterface, or another source of blocks such as a blocklog.BlockLogReader
+    assert hasattr(steemd, "block_api")
+    assert isinstance(is_appbase, bool)
+    assert isinstance(min_block_number, int)
+    assert isinstance(max_block_number, int)
+    for block_num in range(min_block_number, max_block_number):
+        block = get_block(steemd, is_appbase, block_num)
+        if block is None:
+            print("No block retrieved when requested block no "+str(block_num), file=sys.stderr)
+            return
+        yield block_num, block["transactions"]
+    return
+
+def iterate_transactions_from(steemd, is_appbase, min_block_number, max_block_number):
+    """
+    Yields the transactions of provided node's blocks, in the
+    [min_block_number, max_block_number) range.
+    """
+    for block_num, block_transactions in iterate_block_transactions_from(steemd, is_appbase, min_block_number, max_block_number):
+        yield from block_transactions
+    return
+
 def iterate_operations_from(steemd, is_appbase, min_block_number, max_block_number, searched_operation_names):
     """
     Yields operations iterated from provided node's blocks.
@@ -98,42 +328,60 @@ def iterate_operations_from(steemd, is_appbase, min_block_number, max_block_numb
     >>> iterate_operations_from(steemd, True, 1102, 1103, set())
     ['pow', OrderedDict([('worker_account', 'steemit11'), ('block_id', '0000044df0f062c0504a8e37288a371ada63a1c7'), ('nonce', 33097), ('work', OrderedDict([('worker', 'STM65wH1LZ7BfSHcK69SShnqCAH5xdoSZpGkUjmzHJ5GCuxEK9V5G'), ('input', '45a3824498b87e41129f6fef17be276af6ff87d1e859128f28aaa9c08208871d'), ('signature', '1f93a52c4f794803b2563845b05b485e3e5f4c075ddac8ea8cffb988a1ffcdd1055590a3d5206a3be83cab1ea548fc52889d43bdbd7b74d62f87fb8e2166145a5d'), ('work', '00003e554a58830e7e01669796f40d1ce85c7eb979e376cb49e83319c2688c7e')])), ('props', OrderedDict([('account_creation_fee', '100.000 STEEM'), ('maximum_block_size', 131072), ('sbd_interest_rate', 1000)]))])]
     """
-    assert isinstance(steemd, SteemInterface)
+    # A SteemInterface, or another source of blocks such as a blocklog.BlockLogReader
+    assert hasattr(steemd, "block_api")
     assert isinstance(is_appbase, bool)
     assert isinstance(min_block_number, int)
     assert isinstance(max_block_number, int)
     assert isinstance(searched_operation_names, set)
     filter_operation = len(searched_operation_names) > 0
-    for block_num in range(min_block_number, max_block_number):
-        if is_appbase:
-            another_block = steemd.block_api.get_block(block_num=block_num)
-            if not another_block:
-                print("No block retrieved when requested block no "+str(block_num))
-                return
-            actual_block = another_block["block"]
-            block_transactions = actual_block["transactions"]
-        else:
-            another_block = steemd.block_api.get_block(block_num)
-            if not another_block:
-                print("No block retrieved when requested block no "+str(block_num))
-                return
-            block_transactions = another_block["transactions"]
-        for another_transaction in block_transactions:
-            transaction_operations = another_transaction["operations"]
-            for another_operation in transaction_operations:
-                if not filter_operation or another_operation['type'] in searched_operation_names:
-                    yield another_operation
+    for another_transaction in iterate_transactions_from(steemd, is_appbase, min_block_number, max_block_number):
+        transaction_operations = another_transaction["operations"]
+        for another_operation in transaction_operations:
+            if not filter_operation or another_operation['type'] in searched_operation_names:
+                yield another_operation
     return
 
+ESC_ALPHABET = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+# Control characters are always \u-escaped by json.dumps, so these mark where
+# the escape goes in the serialized action.
+KEY_MARK = "\x00"
+KEY_MARK_JSON = "\\u0000"
+ESC_MARK = "\x01"
+ESC_MARK_JSON = "\\u0001"
+
+def action_json(action):
+    """ The compact JSON of action, as `action_to_str` writes it """
+    return json.dumps(action, separators=(",", ":"), sort_keys=True)
+
 def action_to_str(action):
     """
     This serializes actions, picking a string that does not occur in the JSON
     serialization to escape public/private key notes.
+
+    The action is encoded once with marks in place of the escape, which is
+    then chosen and spliced in.  If the action's own data happens to contain
+    a mark, it is encoded again with the escape instead.
+
+    Actions that are already serialized (strings) are returned as is.
     """
+    if isinstance(action, str):
+        return action
     if action and action[1] and  "esc" in action[1]:
-        return json.dumps(action, separators=(",", ":"), sort_keys=True)
+        return action_json(action)
+    
+    serializer = prockey.PubkeySerializer(esc=KEY_MARK)
+    action[1]["esc"] = ESC_MARK
+    json_marked = json.dumps(action, separators=(",", ":"), default=serializer, sort_keys=True)
+    parts = json_marked.split(KEY_MARK_JSON)
+    if len(parts) == 2 * serializer.count + 1 and json_marked.count(ESC_MARK_JSON) == 1:
+        esc = shortest_non_substr("".join(parts).replace(ESC_MARK_JSON, ""), ESC_ALPHABET)
+        action[1]["esc"] = esc
+        return esc.join(parts).replace(ESC_MARK_JSON, esc)
     
+    del action[1]["esc"]
     json_empty_esc = json.dumps(action, separators=(",", ":"), default=prockey.PubkeySerializer(esc=""), sort_keys=True)
-    esc = find_non_substr(json_empty_esc, "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ")
+    esc = shortest_non_substr(json_empty_esc, ESC_ALPHABET)
     action[1]["esc"] = esc
     return json.dumps(action, separators=(",", ":"), default=prockey.PubkeySerializer(esc=esc), sort_keys=True)